@@ -0,0 +1 @@
+# Benchmarks package for HS Chatbot
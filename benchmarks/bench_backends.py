@@ -0,0 +1,133 @@
+"""Compare the Chroma and NumPy vector backends on the real catalog.
+
+Each backend runs in its own subprocess so that startup time and peak RSS
+are measured in isolation. Recall@k is computed against exact float32
+brute-force search over the same embeddings.
+
+Usage: python -m benchmarks.bench_backends [--k 5] [--repeat 20]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import SAMPLE_QUERIES, load_catalog, rss_mb, summarize_latencies, temporary_directory, time_calls
+
+BACKENDS = [
+    ('chroma', None),
+    ('numpy', 'float16'),
+    ('numpy', 'int8'),
+]
+
+# The backends are compared on vector search alone, without BM25 fusion
+VECTOR_ONLY = {'hybrid': False}
+
+
+def run_worker(backend: str, quantization: str, index_dir: str, k: int, repeat: int) -> dict:
+    """Open a prebuilt index, query it and report timings (runs in a subprocess)."""
+    from utils.vector_db import VectorDatabase
+    
+    start = time.perf_counter()
+    vector_db = VectorDatabase(persist_directory=index_dir, backend=backend, quantization=quantization or 'int8',
+                               retrieval_config=VECTOR_ONLY)
+    startup_s = time.perf_counter() - start
+    
+    embeddings = {query: vector_db.embed_query(query) for query in SAMPLE_QUERIES}
+    top_ids = {
+        query: [result['id'] for result in vector_db.search_similar(query, n_results=k, query_embedding=embeddings[query])]
+        for query in SAMPLE_QUERIES
+    }
+    latencies = time_calls(
+        lambda query: vector_db.search_similar(query, n_results=k, query_embedding=embeddings[query]),
+        SAMPLE_QUERIES,
+        repeat=repeat
+    )
+    return {
+        'startup_s': startup_s,
+        'latency': summarize_latencies(latencies),
+        'peak_rss_mb': rss_mb(),
+        'top_ids': top_ids
+    }
+
+
+def build_index(backend: str, quantization: str, index_dir: str) -> float:
+    """Build an index for a backend and return the build time in seconds."""
+    from utils.vector_db import VectorDatabase
+    
+    products_df, services_df = load_catalog()
+    vector_db = VectorDatabase(persist_directory=index_dir, backend=backend, quantization=quantization or 'int8',
+                               retrieval_config=VECTOR_ONLY)
+    start = time.perf_counter()
+    vector_db.initialize_database(products_df, services_df)
+    return time.perf_counter() - start
+
+
+def exact_top_ids(k: int) -> dict:
+    """Exact float32 cosine top-k ids for each sample query."""
+    from utils.vector_db import VectorDatabase
+    
+    products_df, services_df = load_catalog()
+    vector_db = VectorDatabase(persist_directory=temporary_directory(), backend='numpy')
+    ids, documents = [], []
+    for builder, df in ((vector_db._build_product_records, products_df), (vector_db._build_service_records, services_df)):
+        record_ids, record_documents, _ = builder(df)
+        ids.extend(record_ids)
+        documents.extend(record_documents)
+    
+    matrix = np.asarray(vector_db.embedding_model.encode(documents, convert_to_numpy=True), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    truth = {}
+    for query in SAMPLE_QUERIES:
+        vector = np.asarray(vector_db.embed_query(query), dtype=np.float32)
+        scores = matrix @ (vector / np.linalg.norm(vector))
+        truth[query] = [ids[i] for i in np.argsort(-scores)[:k]]
+    return truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--worker', nargs=3, metavar=('BACKEND', 'QUANTIZATION', 'INDEX_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        backend, quantization, index_dir = args.worker
+        print(json.dumps(run_worker(backend, None if quantization == '-' else quantization, index_dir, args.k, args.repeat)))
+        return
+    
+    truth = exact_top_ids(args.k)
+    report = {'k': args.k, 'queries': len(SAMPLE_QUERIES), 'backends': {}}
+    
+    for backend, quantization in BACKENDS:
+        label = backend if quantization is None else f"{backend}-{quantization}"
+        index_dir = temporary_directory()
+        build_s = build_index(backend, quantization, index_dir)
+        
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_backends', '--k', str(args.k), '--repeat', str(args.repeat),
+             '--worker', backend, quantization or '-', index_dir],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        
+        recalls = [
+            len(set(result['top_ids'][query]) & set(truth[query])) / float(args.k)
+            for query in SAMPLE_QUERIES
+        ]
+        report['backends'][label] = {
+            'build_s': build_s,
+            'startup_s': result['startup_s'],
+            'latency': result['latency'],
+            'peak_rss_mb': result['peak_rss_mb'],
+            f'recall@{args.k}': sum(recalls) / len(recalls)
+        }
+    
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Throughput of search_similar_many against a loop of search_similar calls.
+
+The query cache is cleared before each run so both sides pay for encoding.
+
+Usage: python -m benchmarks.bench_batch_search [--queries 500] [--batch-size 64]
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import SAMPLE_QUERIES, load_catalog, temporary_directory
+from utils.vector_db import VectorDatabase
+
+
+def make_queries(count: int):
+    """Distinct query variants built from the sample questions."""
+    return [f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} {i}" for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--n-results', type=int, default=5)
+    parser.add_argument('--backend', default='chroma', choices=VectorDatabase.BACKENDS)
+    args = parser.parse_args()
+    
+    products_df, services_df = load_catalog()
+    vector_db = VectorDatabase(persist_directory=temporary_directory(), backend=args.backend)
+    vector_db.initialize_database(products_df, services_df)
+    queries = make_queries(args.queries)
+    vector_db.search_similar(queries[0], n_results=args.n_results)
+    
+    vector_db.query_cache.clear()
+    start = time.perf_counter()
+    looped = [vector_db.search_similar(query, n_results=args.n_results) for query in queries]
+    loop_s = time.perf_counter() - start
+    
+    vector_db.query_cache.clear()
+    start = time.perf_counter()
+    batched = vector_db.search_similar_many(queries, n_results=args.n_results, batch_size=args.batch_size)
+    batch_s = time.perf_counter() - start
+    
+    same_order = all(
+        [result['id'] for result in a] == [result['id'] for result in b]
+        for a, b in zip(looped, batched)
+    )
+    print(json.dumps({
+        'backend': args.backend,
+        'queries': len(queries),
+        'batch_size': args.batch_size,
+        'loop_qps': len(queries) / loop_s,
+        'batch_qps': len(queries) / batch_s,
+        'speedup': loop_s / batch_s,
+        'identical_results': same_order
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
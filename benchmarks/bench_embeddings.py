@@ -0,0 +1,111 @@
+"""Compare the torch and quantized ONNX embedding engines.
+
+Each engine runs in its own subprocess (fresh imports, isolated RSS). The
+report includes load time, query latency, peak RSS, the cosine similarity
+between the two engines' document embeddings and the overlap of their
+top-k catalog results for the sample queries.
+
+Export the ONNX model first:
+    python -m utils.onnx_embeddings --output models/onnx/all-MiniLM-L6-v2
+
+Usage: python -m benchmarks.bench_embeddings [--k 5] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import SAMPLE_QUERIES, load_catalog, rss_mb, summarize_latencies, temporary_directory, time_calls
+
+ENGINES = ['torch', 'onnx']
+
+
+def catalog_documents():
+    """Product and service documents exactly as they are indexed."""
+    from utils.vector_db import VectorDatabase
+    
+    products_df, services_df = load_catalog()
+    vector_db = VectorDatabase(persist_directory=temporary_directory(), backend='numpy')
+    documents = []
+    for builder, df in ((vector_db._build_product_records, products_df), (vector_db._build_service_records, services_df)):
+        documents.extend(builder(df)[1])
+    return documents
+
+
+def run_worker(engine: str, output_path: str, repeat: int) -> dict:
+    """Load one engine, embed the catalog and queries, and time query encoding."""
+    from utils import embeddings
+    
+    embeddings.configure(engine=engine)
+    start = time.perf_counter()
+    model = embeddings.get_embedding_model()
+    load_s = time.perf_counter() - start
+    
+    documents = catalog_documents()
+    start = time.perf_counter()
+    document_matrix = model.encode(documents, convert_to_numpy=True)
+    index_s = time.perf_counter() - start
+    query_matrix = model.encode(SAMPLE_QUERIES, convert_to_numpy=True)
+    np.savez(output_path, documents=document_matrix, queries=query_matrix)
+    
+    latencies = time_calls(lambda query: model.encode([query], convert_to_numpy=True), SAMPLE_QUERIES, repeat=repeat)
+    return {
+        'load_s': load_s,
+        'index_docs_per_s': len(documents) / index_s if index_s else 0.0,
+        'query_latency': summarize_latencies(latencies),
+        'peak_rss_mb': rss_mb(),
+        'torch_imported': 'torch' in sys.modules
+    }
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--worker', nargs=2, metavar=('ENGINE', 'OUTPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        print(json.dumps(run_worker(args.worker[0], args.worker[1], args.repeat)))
+        return
+    
+    scratch = temporary_directory()
+    report = {'k': args.k, 'engines': {}}
+    matrices = {}
+    for engine in ENGINES:
+        output_path = os.path.join(scratch, f"{engine}.npz")
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_embeddings', '--repeat', str(args.repeat), '--worker', engine, output_path],
+            check=True, capture_output=True, text=True
+        ).stdout
+        report['engines'][engine] = json.loads(output.strip().splitlines()[-1])
+        matrices[engine] = np.load(output_path)
+    
+    torch_docs, onnx_docs = (_normalize(matrices[engine]['documents']) for engine in ENGINES)
+    torch_queries, onnx_queries = (_normalize(matrices[engine]['queries']) for engine in ENGINES)
+    document_cosine = (torch_docs * onnx_docs).sum(axis=1)
+    
+    overlaps = []
+    for i in range(len(SAMPLE_QUERIES)):
+        torch_top = set(np.argsort(-(torch_docs @ torch_queries[i]))[:args.k])
+        onnx_top = set(np.argsort(-(onnx_docs @ onnx_queries[i]))[:args.k])
+        overlaps.append(len(torch_top & onnx_top) / float(args.k))
+    
+    report['quality'] = {
+        'document_cosine_mean': float(document_cosine.mean()),
+        'document_cosine_min': float(document_cosine.min()),
+        f'top{args.k}_overlap_mean': float(np.mean(overlaps))
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Bytes and frames per conversation: legacy events against the envelope protocol.
+
+A scripted conversation (welcome, catalog answer, streamed answers, a
+human-contact offer and a WhatsApp redirect) is sent the way ``main.py``
+sends it: the legacy events send every streamed chunk, the envelope
+protocol coalesces chunks arriving within ``--interval-ms`` with
+``DeltaBatcher``. Every event is serialized into its Socket.IO websocket frame(s),
+and each stream of frames is measured raw and after permessage-deflate
+(one zlib stream with context takeover, as browsers negotiate it). The
+msgpack variant needs the optional ``msgpack`` package; binary Socket.IO
+events take two frames (a placeholder and the attachment).
+
+Usage: python -m benchmarks.bench_envelope [--chunk 40] [--interval-ms 30]
+"""
+import argparse
+import json
+import zlib
+
+from utils import envelope
+
+WHATSAPP_LINK = "https://api.whatsapp.com/message/ZREQ73H3OQTRJ1?autoload=1&app_absent=0&text=Bonjour"
+PHONE = "+212671506013"
+
+CONVERSATION = [
+    # (parts, streamed)
+    ([('text', "Bonjour! Je suis votre assistant HS Traiteur. Comment puis-je vous aider aujourd'hui?", {})], False),
+    ([('text', "Le Buffet de soutenance Convivial est à 6 000 MAD pour 40 personnes. Il est disponible à la commande.", {})], False),
+    ([('text', "Pour un mariage de 200 invités, nous proposons plusieurs formules : un buffet marocain traditionnel "
+               "avec pastilla, méchoui et tajines, un buffet international, ou une formule mixte. Chaque formule "
+               "inclut le service, la vaisselle et la décoration de table. Le prix dépend du menu choisi et des "
+               "options (boissons chaudes, pâtisseries fines, animation). Souhaitez-vous que je vous détaille "
+               "la formule marocaine ?", {})], True),
+    ([('text', "Un devis personnalisé est nécessaire pour un événement de cette taille avec service complet en extérieur.", {}),
+      ('human_contact_offer', "Souhaitez-vous être mis en relation avec un conseiller pour une assistance plus personnalisée?",
+       {'whatsapp_link': WHATSAPP_LINK, 'phone_number': PHONE})], True),
+    ([('text', "C'est noté (invités : 200). Quel est votre budget approximatif ?", {})], False),
+    ([('human_contact', "Il semble que votre demande nécessite l'attention d'un conseiller. Souhaitez-vous discuter "
+                        "directement avec un membre de notre équipe ?",
+       {'whatsapp_link': WHATSAPP_LINK, 'phone_number': PHONE})], False),
+]
+
+
+def socketio_frames(event: str, payload):
+    """Websocket frames of one Socket.IO event (bytes each)."""
+    if isinstance(payload, (bytes, bytearray)):
+        placeholder = json.dumps([event, {'_placeholder': True, 'num': 0}], separators=(',', ':'))
+        return [f"451-{placeholder}".encode('utf-8'), bytes(payload)]
+    return [f"42{json.dumps([event, payload], separators=(',', ':'))}".encode('utf-8')]
+
+
+def deflated_size(frames) -> int:
+    """Size after permessage-deflate with context takeover (trailing 4 bytes stripped per frame)."""
+    compressor = zlib.compressobj(wbits=-15)
+    total = 0
+    for frame in frames:
+        total += len(compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return total
+
+
+def conversation_frames(fmt, chunk: int, interval_s: float):
+    """All frames of the conversation; ``fmt`` None sends the legacy events."""
+    frames = []
+    now = [0.0]
+    
+    def send(parts, message_id=None, sender='assistant'):
+        frame = envelope.build(parts, message_id=message_id, sender=sender, timestamp=1792411200000)
+        if fmt is None:
+            for event, data in envelope.to_legacy(frame):
+                frames.extend(socketio_frames(event, data))
+        else:
+            frames.extend(socketio_frames(envelope.EVENT, envelope.encode(frame, fmt)))
+    
+    for turn, (parts, streamed) in enumerate(CONVERSATION):
+        message_id = f"{turn:032x}" if turn else None
+        if streamed:
+            def send_delta(delta, message_id=message_id):
+                send([envelope.part('delta', delta)], message_id=message_id, sender=None)
+            on_delta = send_delta if fmt is None else envelope.DeltaBatcher(send_delta, clock=lambda: now[0]).add
+            text = parts[0][1]
+            for start in range(0, len(text), chunk):
+                on_delta(text[start:start + chunk])
+                now[0] += interval_s
+        send([envelope.part(kind, content, **fields) for kind, content, fields in parts], message_id=message_id)
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chunk', type=int, default=40, help="characters per streamed chunk")
+    parser.add_argument('--interval-ms', type=float, default=30.0, help="time between streamed chunks")
+    args = parser.parse_args()
+    
+    report = {}
+    for name, fmt in (('legacy', None), ('envelope_json', 'json'), ('envelope_msgpack', 'msgpack')):
+        if fmt and fmt not in envelope.available_formats():
+            report[name] = "msgpack not installed"
+            continue
+        frames = conversation_frames(fmt, args.chunk, args.interval_ms / 1000.0)
+        report[name] = {'frames': len(frames), 'bytes': sum(len(frame) for frame in frames),
+                        'bytes_deflate': deflated_size(frames)}
+    legacy = report['legacy']
+    for name, result in report.items():
+        if isinstance(result, dict) and name != 'legacy':
+            result['bytes_saved'] = round(1.0 - result['bytes'] / legacy['bytes'], 3)
+            result['bytes_deflate_saved'] = round(1.0 - result['bytes_deflate'] / legacy['bytes'], 3)
+    legacy['bytes_deflate_saved'] = round(1.0 - legacy['bytes_deflate'] / legacy['bytes'], 3)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Direct-answer rate, accuracy and latency of the FAQ matcher.
+
+Runs the labeled queries in benchmarks/data/faq_queries_fr.json through
+FAQAgent's routing decision (no LLM is called) and reports, per direct
+answer threshold, how many queries are answered from the stored FAQ,
+how many would go to the LLM, and how often a direct answer is the
+expected FAQ. Queries labeled ``null`` are off-topic or span several FAQs
+and should not get a direct answer.
+
+Usage: python -m benchmarks.bench_faq [--repeat 20]
+"""
+import argparse
+import json
+import os
+from collections import Counter
+
+from benchmarks.common import summarize_latencies, temporary_directory, time_calls
+from models.agents.faq_agent import FAQAgent
+
+FAQ_QUERIES = os.path.join(os.path.dirname(__file__), 'data', 'faq_queries_fr.json')
+THRESHOLDS = [0.6, 0.65, 0.7, 0.75, 0.8, 0.85]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    with open(FAQ_QUERIES, 'r', encoding='utf-8') as f:
+        labeled = json.load(f)
+    agent = FAQAgent(llm=None, index_dir=temporary_directory())
+    queries = [item['query'] for item in labeled]
+    
+    by_threshold = {}
+    for threshold in THRESHOLDS:
+        agent.direct_answer_threshold = threshold
+        outcomes = Counter()
+        correct = 0
+        for item in labeled:
+            outcome, matches = agent.match(item['query'])
+            outcomes[outcome] += 1
+            if outcome == 'direct':
+                correct += matches[0]['id'] == item['faq']
+        by_threshold[str(threshold)] = {
+            'direct_answer_rate': outcomes['direct'] / len(labeled),
+            'llm_rate': outcomes['llm'] / len(labeled),
+            'no_match_rate': outcomes['no_match'] / len(labeled),
+            'direct_answer_precision': correct / outcomes['direct'] if outcomes['direct'] else 0.0
+        }
+    
+    agent.direct_answer_threshold = FAQAgent.DIRECT_ANSWER_THRESHOLD
+    report = {
+        'queries': len(labeled),
+        'faqs': len(agent.faq_index.faqs),
+        'by_threshold': by_threshold,
+        'match_latency': summarize_latencies(time_calls(agent.match, queries, repeat=args.repeat))
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
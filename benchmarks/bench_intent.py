@@ -0,0 +1,68 @@
+"""Accuracy and latency of the local intent classifier.
+
+Evaluates on the held-out labeled set in benchmarks/data/labeled_intents_fr.json
+(the classifier is trained on data/intent_examples.json) and reports the
+share of queries that would fall back to the LLM at each confidence
+threshold.
+
+Usage: python -m benchmarks.bench_intent [--repeat 50] [--threshold 0.6]
+"""
+import argparse
+import json
+import os
+from collections import Counter
+
+from benchmarks.common import summarize_latencies, time_calls
+from utils.intent_classifier import get_intent_classifier
+
+LABELED_INTENTS = os.path.join(os.path.dirname(__file__), 'data', 'labeled_intents_fr.json')
+THRESHOLDS = [0.4, 0.5, 0.6, 0.7, 0.8]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--threshold', type=float, default=0.6)
+    parser.add_argument('--verbose', action='store_true', help="list misclassified queries")
+    args = parser.parse_args()
+
+    with open(LABELED_INTENTS, 'r', encoding='utf-8') as f:
+        labeled = json.load(f)
+    classifier = get_intent_classifier()
+    queries = [item['query'] for item in labeled]
+
+    predictions = [classifier.predict(query) for query in queries]
+    correct = [intent == item['intent'] for (intent, _), item in zip(predictions, labeled)]
+
+    confusion = Counter(
+        f"{item['intent']} -> {intent}"
+        for (intent, _), item, ok in zip(predictions, labeled, correct) if not ok
+    )
+    fallback = {}
+    for threshold in THRESHOLDS:
+        kept = [ok for (_, confidence), ok in zip(predictions, correct) if confidence >= threshold]
+        fallback[str(threshold)] = {
+            'llm_fallback_rate': 1.0 - len(kept) / len(predictions),
+            'local_accuracy': sum(kept) / len(kept) if kept else 0.0
+        }
+
+    report = {
+        'queries': len(labeled),
+        'accuracy': sum(correct) / len(correct),
+        'threshold': args.threshold,
+        'at_threshold': fallback.get(str(args.threshold)),
+        'by_threshold': fallback,
+        'errors': dict(confusion),
+        'predict_latency': summarize_latencies(time_calls(classifier.predict, queries, repeat=args.repeat)),
+        'classify_latency': summarize_latencies(time_calls(classifier.classify, queries, repeat=args.repeat))
+    }
+    if args.verbose:
+        report['misclassified'] = [
+            {'query': item['query'], 'expected': item['intent'], 'predicted': intent, 'confidence': confidence}
+            for (intent, confidence), item, ok in zip(predictions, labeled, correct) if not ok
+        ]
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
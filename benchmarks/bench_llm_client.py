@@ -0,0 +1,117 @@
+"""Tail latency and failure handling of the LLM client against a stub model.
+
+The stub sleeps for a log-normal latency, with a share of very slow
+"straggler" calls and of retryable 503 errors, like a browned-out upstream.
+The same workload is run with a bare call, with deadlines and retries, and
+with hedging on top; then a hard outage shows the circuit breaker failing
+fast. Latencies are scaled down (``--scale``) so the run takes seconds.
+
+Usage: python -m benchmarks.bench_llm_client [--calls 300] [--scale 0.01]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from benchmarks.common import summarize_latencies
+from utils.llm_client import LLMClient
+
+
+class ServiceUnavailable(Exception):
+    """Stands in for google.api_core.exceptions.ServiceUnavailable."""
+    code = 503
+
+
+class StubModel:
+    """Local stand-in for the model API with controllable latency and errors."""
+    
+    def __init__(self, median_s: float = 1.2, straggler_rate: float = 0.05, straggler_s: float = 15.0,
+                 error_rate: float = 0.03, scale: float = 0.01, seed: int = 7):
+        self.median_s = median_s
+        self.straggler_rate = straggler_rate
+        self.straggler_s = straggler_s
+        self.error_rate = error_rate
+        self.scale = scale
+        self.down = False
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+    
+    def generate(self, prompt: str) -> str:
+        with self._lock:
+            self.requests += 1
+            roll = self._rng.random()
+            latency = self._rng.lognormvariate(0, 0.3) * self.median_s
+        if self.down:
+            time.sleep(0.5 * self.scale)
+            raise ServiceUnavailable("upstream unavailable")
+        if roll < self.error_rate:
+            time.sleep(latency * self.scale / 4)
+            raise ServiceUnavailable("upstream overloaded")
+        if roll < self.error_rate + self.straggler_rate:
+            latency = self.straggler_s
+        time.sleep(latency * self.scale)
+        return f"réponse à: {prompt}"
+
+
+def run_workload(call, calls: int, scale: float):
+    latencies, errors = [], 0
+    for i in range(calls):
+        start = time.perf_counter()
+        try:
+            call(f"question {i}")
+        except Exception:
+            errors += 1
+        # Report in unscaled milliseconds
+        latencies.append((time.perf_counter() - start) * 1000.0 / scale)
+    return {'latency': summarize_latencies(latencies), 'error_rate': errors / calls}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--scale', type=float, default=0.01, help="multiplier applied to every stub latency")
+    args = parser.parse_args()
+    scale = args.scale
+    
+    def client(**settings):
+        # Deadlines and backoffs are expressed in unscaled seconds like the stub latencies
+        return LLMClient(
+            name='stub',
+            deadline_seconds=settings.pop('deadline_seconds', 8.0) * scale,
+            backoff_seconds=0.3 * scale,
+            max_backoff_seconds=2.0 * scale,
+            hedge_min_delay=settings.pop('hedge_min_delay', 1.0) * scale,
+            reset_timeout=30.0 * scale,
+            **settings
+        )
+    
+    report = {}
+    model = StubModel(scale=scale)
+    report['bare'] = run_workload(model.generate, args.calls, scale)
+    
+    model = StubModel(scale=scale)
+    guarded = client(hedge=False)
+    report['deadline_and_retries'] = {**run_workload(lambda prompt: guarded.call(model.generate, prompt), args.calls, scale),
+                                      'upstream_requests': model.requests}
+    
+    model = StubModel(scale=scale)
+    hedged = client(hedge=True)
+    report['hedged'] = {**run_workload(lambda prompt: hedged.call(model.generate, prompt), args.calls, scale),
+                        'upstream_requests': model.requests,
+                        'stats': {key: hedged.get_stats()[key] for key in ('hedges', 'hedge_wins', 'retries', 'timeouts')}}
+    
+    # Hard outage: the breaker opens and later calls fail without reaching the upstream
+    model = StubModel(scale=scale)
+    model.down = True
+    breaker = client(hedge=False)
+    outage = run_workload(lambda prompt: breaker.call(model.generate, prompt, fallback=lambda error: "réponse de secours"),
+                          50, scale)
+    report['outage'] = {**outage, 'upstream_requests': model.requests, 'circuit': breaker.breaker.state,
+                        'rejected': breaker.get_stats()['rejected']}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Per-message logging overhead in the request thread: before and after.
+
+Each simulated message emits the records the hot path used to log: the
+WhatsApp link and full response dict, the catalog entities and the
+keyword match, as eagerly formatted f-strings through ``basicConfig``
+(a synchronous file write per record). The same events are then logged
+with ``%``-style arguments through ``utils.logging_setup`` (queue,
+background writer, sampling), as text and as JSON. Only the time spent in
+the caller is measured; the writer thread drains the queue afterwards.
+Every write to the log file pays ``--sink-latency-us``, the way a
+container log pipe or a terminal blocks the writer; 0 writes to the
+page cache only.
+
+Usage: python -m benchmarks.bench_logging [--messages 5000] [--sink-latency-us 100]
+"""
+import argparse
+import json
+import logging
+import os
+import time
+import urllib.parse
+
+from benchmarks.common import summarize_latencies, temporary_directory
+from utils.logging_setup import set_request_id, setup_logging, shutdown_logging
+
+QUERY = "Bonjour, je voudrais parler à un conseiller pour un mariage de 200 invités avec décoration"
+LINK = "https://api.whatsapp.com/message/ZREQ73H3OQTRJ1?autoload=1&app_absent=0&text=" + urllib.parse.quote(QUERY)
+RESPONSE = {"type": "whatsapp_redirect", "message": "Il semble que votre demande nécessite l'attention d'un conseiller.",
+            "whatsapp_link": LINK, "phone_number": "+212600000000"}
+ENTITIES = {'produit': "Méchoui Royal", 'nombre_personnes': 200, 'evenement': 'mariage', 'budget': {'max': 20000.0}}
+
+router = logging.getLogger('models.agents.whatsapp_router')
+orchestrator = logging.getLogger('models.agents.orchestrator')
+
+
+class SlowSink:
+    """File stream whose writes block for a fixed time."""
+    
+    def __init__(self, stream, latency_s: float):
+        self.stream = stream
+        self.latency_s = latency_s
+    
+    def write(self, text: str):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return self.stream.write(text)
+    
+    def flush(self):
+        self.stream.flush()
+
+
+def eager_message():
+    orchestrator.info(f"Detected human contact request (rule human_request, keyword 'conseiller') for query: {QUERY}")
+    orchestrator.info(f"Catalog fast path answered: {ENTITIES}")
+    router.info(f"Generated WhatsApp link: {LINK} for query: {QUERY}")
+    router.info(f"WhatsAppRouterAgent returning response: {RESPONSE}")
+
+
+def lazy_message():
+    orchestrator.info("Detected human contact request (rule %s, keyword '%s')", 'human_request', 'conseiller')
+    orchestrator.info("Catalog fast path answered: %s", ENTITIES)
+    router.debug("Generated WhatsApp link (%d chars)", len(LINK))
+    router.info("Redirecting to WhatsApp")
+
+
+def run(emit, messages: int):
+    latencies = []
+    for i in range(messages):
+        set_request_id(f"msg{i}")
+        start = time.perf_counter()
+        emit()
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return summarize_latencies(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--sink-latency-us', type=float, default=100.0)
+    args = parser.parse_args()
+    latency_s = args.sink_latency_us / 1e6
+    directory = temporary_directory("hs_bench_logging_")
+    report = {}
+    
+    # Before: synchronous handler on the root logger, as with logging.basicConfig
+    path = os.path.join(directory, 'sync.log')
+    with open(path, 'w', encoding='utf-8') as stream:
+        handler = logging.StreamHandler(SlowSink(stream, latency_s))
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(logging.INFO)
+        report['sync_eager'] = {**run(eager_message, args.messages), 'log_bytes': None}
+        root.removeHandler(handler)
+    report['sync_eager']['log_bytes'] = os.path.getsize(path)
+    
+    for name, json_output, sampling in (
+        ('queued_lazy_text', False, {}),
+        ('queued_lazy_json', True, {}),
+        ('queued_lazy_json_sampled', True, {'models.agents.orchestrator': 0.1, 'models.agents.whatsapp_router': 0.1}),
+    ):
+        path = os.path.join(directory, f'{name}.log')
+        with open(path, 'w', encoding='utf-8') as stream:
+            setup_logging(level='INFO', json_output=json_output, sampling=sampling, stream=SlowSink(stream, latency_s))
+            report[name] = run(lazy_message, args.messages)
+            # Drain the queue before measuring the output
+            shutdown_logging()
+        report[name]['log_bytes'] = os.path.getsize(path)
+    
+    baseline = report['sync_eager']['mean_ms']
+    for name, result in report.items():
+        result['per_message_us'] = round(result['mean_ms'] * 1000.0, 2)
+        result['overhead_removed'] = round(1.0 - result['mean_ms'] / baseline, 3) if baseline else 0.0
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
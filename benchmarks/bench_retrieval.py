@@ -0,0 +1,41 @@
+"""Benchmark per-turn retrieval: two sequential type-filtered queries vs one multi-type search.
+
+Usage: python -m benchmarks.bench_retrieval [--repeat 20]
+"""
+import argparse
+import json
+
+from benchmarks.common import SAMPLE_QUERIES, load_catalog, summarize_latencies, temporary_directory, time_calls
+from utils.vector_db import VectorDatabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    products_df, services_df = load_catalog()
+    vector_db = VectorDatabase(persist_directory=temporary_directory())
+    vector_db.initialize_database(products_df, services_df)
+    
+    # Embeddings are cached, so both modes measure retrieval only
+    embeddings = {query: vector_db.embed_query(query) for query in SAMPLE_QUERIES}
+    
+    def sequential(query):
+        vector_db.search_products(query, n_results=3, query_embedding=embeddings[query])
+        vector_db.search_services(query, n_results=2, query_embedding=embeddings[query])
+    
+    def combined(query):
+        vector_db.search_by_types(query, {'product': 3, 'service': 2}, query_embedding=embeddings[query])
+    
+    report = {
+        'documents': vector_db.collection.count(),
+        'sequential': summarize_latencies(time_calls(sequential, SAMPLE_QUERIES, repeat=args.repeat)),
+        'combined': summarize_latencies(time_calls(combined, SAMPLE_QUERIES, repeat=args.repeat)),
+    }
+    report['speedup_mean'] = report['sequential']['mean_ms'] / max(report['combined']['mean_ms'], 1e-9)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
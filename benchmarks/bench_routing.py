@@ -0,0 +1,74 @@
+"""Routing rules engine against the former per-keyword substring loop.
+
+Synthetic rule sets of growing size are compiled into the Aho-Corasick
+engine; the legacy approach lowercases the text and tests every keyword
+with ``in``. The engine's per-message cost should stay flat as rules grow.
+
+Usage: python -m benchmarks.bench_routing [--rules 10 100 1000] [--repeat 200]
+"""
+import argparse
+import json
+import random
+
+from benchmarks.common import summarize_latencies, time_calls
+from utils.routing_rules import DEFAULT_RULES, RoutingRulesEngine
+
+MESSAGES = [
+    ("Bonjour, je voudrais un buffet pour une soutenance de 40 personnes la semaine prochaine",
+     "Avec plaisir ! Notre buffet de soutenance chic standard convient pour 40 personnes, à 6000 MAD."),
+    ("Je veux parler à un humain s'il vous plaît", None),
+    ("Est-ce que la pastilla duo est disponible pour samedi ?",
+     "Désolé, je n'ai pas cette information. Je vous invite à contacter un conseiller."),
+    ("Combien coûte le méchoui royal pour un mariage de 200 invités avec décoration et service complet ?",
+     "Le méchoui royal est à 1500 MAD par plateau. Pour 200 invités, comptez une dizaine de plateaux."),
+]
+
+
+def synthetic_rules(count: int, seed: int = 7):
+    """The default rules plus ``count`` extra rules of random French-like keywords."""
+    rng = random.Random(seed)
+    syllables = ['ba', 'ri', 'ton', 'lu', 'me', 'sa', 'cor', 'di', 'van', 'pel', 'tro', 'gue']
+    rules = list(DEFAULT_RULES)
+    for i in range(count):
+        keywords = [' '.join(''.join(rng.choice(syllables) for _ in range(3)) for _ in range(rng.randint(1, 2)))
+                    for _ in range(5)]
+        rules.append({'name': f'rule_{i}', 'applies_to': rng.choice(['query', 'response']),
+                      'target': 'synthetic', 'priority': rng.randint(0, 99), 'keywords': keywords})
+    return rules
+
+
+def legacy_classify(rules):
+    """The former approach: lowercase and test every keyword with ``in``."""
+    def classify(message):
+        query, response = message
+        query_lower, response_lower = query.lower(), (response or '').lower()
+        for rule in sorted(rules, key=lambda rule: rule.get('priority', 0), reverse=True):
+            text = query_lower if rule.get('applies_to', 'query') == 'query' else response_lower
+            if any(keyword in text for keyword in rule['keywords']):
+                return rule['name']
+        return None
+    return classify
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rules', type=int, nargs='+', default=[0, 10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    
+    report = []
+    for count in args.rules:
+        rules = synthetic_rules(count)
+        engine = RoutingRulesEngine(rules)
+        keywords = sum(len(rule['keywords']) for rule in rules)
+        report.append({
+            'rules': len(rules),
+            'keywords': keywords,
+            'engine': summarize_latencies(time_calls(lambda message: engine.classify(*message), MESSAGES, repeat=args.repeat)),
+            'legacy_substring': summarize_latencies(time_calls(legacy_classify(rules), MESSAGES, repeat=args.repeat))
+        })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from utils.data_loader import DataLoader
+
+# Typical customer questions used when no labeled query set is needed
+SAMPLE_QUERIES = [
+    "Buffet pour une soutenance de 40 personnes",
+    "combien coûte le Buffet de soutenance Convivial ?",
+    "Ginger Cocktails",
+    "cuisine marocaine pour un mariage",
+    "pastilla aux fruits de mer",
+    "décoration et matériel pour un anniversaire",
+    "buffet pas cher pour étudiants",
+    "service traiteur pour entreprise",
+    "gâteaux et pâtisserie fine",
+    "location de buffet naissance",
+]
+
+
+def load_catalog(data_dir: str = "data"):
+    """Load the real products and services catalog."""
+    data_loader = DataLoader(data_dir)
+    return data_loader.load_products(), data_loader.load_services()
+
+
+def temporary_directory(prefix: str = "hs_bench_") -> str:
+    """Create a scratch directory for benchmark indexes."""
+    return tempfile.mkdtemp(prefix=prefix)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize_latencies(latencies_ms: List[float]) -> Dict[str, float]:
+    """Summarize latencies in milliseconds."""
+    return {
+        'count': len(latencies_ms),
+        'mean_ms': statistics.fmean(latencies_ms) if latencies_ms else 0.0,
+        'p50_ms': percentile(latencies_ms, 50),
+        'p95_ms': percentile(latencies_ms, 95),
+        'p99_ms': percentile(latencies_ms, 99),
+    }
+
+
+def time_calls(func: Callable[[Any], Any], inputs: List[Any], repeat: int = 1, warmup: int = 1) -> List[float]:
+    """Time ``func`` over the inputs and return per-call latencies in milliseconds."""
+    for item in inputs[:warmup]:
+        func(item)
+    
+    latencies = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            func(item)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+    return latencies
+
+
+def rss_mb() -> float:
+    """Peak resident set size of the current process in MB."""
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return usage / (1024.0 * 1024.0) if os.uname().sysname == 'Darwin' else usage / 1024.0
+    except Exception:
+        return 0.0
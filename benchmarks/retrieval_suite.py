@@ -0,0 +1,214 @@
+"""Retrieval benchmark and quality suite for VectorDatabase backends.
+
+Indexes the real catalog (``--scales real``) or synthetic catalogs scaled to
+a number of products (e.g. ``--scales 10000 100000 1000000``) through
+VectorDatabase, then measures:
+
+- indexing throughput (documents/s),
+- query latency percentiles,
+- peak RSS and on-disk index size,
+- recall@k and MRR on the labeled French query set.
+
+Synthetic catalogs keep every real product and service, so the labeled
+queries stay valid while the distractors grow. Each scale runs in its own
+subprocess and the machine-readable report is written as JSON.
+
+Usage:
+    python -m benchmarks.retrieval_suite --backend numpy --scales real 10000 --output report.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from benchmarks.common import load_catalog, rss_mb, summarize_latencies, temporary_directory, time_calls
+
+SUITE_VERSION = 1
+LABELED_QUERIES = os.path.join(os.path.dirname(__file__), 'data', 'labeled_queries_fr.json')
+
+# Vocabulary used to generate plausible synthetic catalog items
+DISHES = ['Tajine', 'Couscous', 'Pastilla', 'Briouates', 'Harira', 'Méchoui', 'Rfissa', 'Seffa', 'Zaalouk',
+          'Mini pizzas', 'Quiches', 'Verrines', 'Macarons', 'Cornes de gazelle', 'Chebakia', 'Msemen',
+          'Salade niçoise', 'Plateau de fromages', 'Brochettes', 'Tartelettes']
+STYLES = ['royal', 'traditionnel', 'du chef', 'festif', 'prestige', 'classique', 'gourmand', 'végétarien',
+          'aux épices', 'à la marocaine', 'fusion', 'maison']
+OCCASIONS = ['Mariage et fiançialle', 'Buffet', 'Buffet > Buffet de soutenance', 'Pâtisserie',
+             'Cuisine marocaine et internationale', 'Anniversaire, naissance et baptème']
+TIERS = [(0, 300, 'économique'), (300, 2000, 'moyen_gamme'), (2000, 15000, 'premium')]
+
+
+def synthetic_catalog(products_df: pd.DataFrame, size: int, seed: int = 42) -> pd.DataFrame:
+    """Extend the real products with synthetic items up to ``size`` rows."""
+    extra = max(0, size - len(products_df))
+    if extra == 0:
+        return products_df
+    
+    rng = random.Random(seed)
+    rows = []
+    for i in range(extra):
+        name = f"{rng.choice(DISHES)} {rng.choice(STYLES)} n°{i}"
+        low, high, tier = rng.choice(TIERS)
+        price = round(rng.uniform(max(low, 20), high), 0)
+        category = rng.choice(OCCASIONS)
+        available = rng.random() > 0.1
+        description = (
+            f"{name} préparé pour {rng.randint(5, 200)} personnes, idéal pour "
+            f"{category.lower()}. Servi {rng.choice(STYLES)}."
+        )
+        rows.append({
+            'ID': 1_000_000 + i,
+            'Type': 'simple',
+            'Name': name,
+            'Categories': category,
+            'Tags': '',
+            'Description': description,
+            'Regular price': price,
+            'Regular price_numeric': price,
+            'is_available': available,
+            'price_tier': tier,
+            'rag_description': (
+                f"Produit: {name} | Type: simple | Catégories: {category} | Tarification: {price} MAD | "
+                f"Détails: {description} | Disponibilité: {'En stock' if available else 'Rupture'}"
+            )
+        })
+    return pd.concat([products_df, pd.DataFrame(rows)], ignore_index=True)
+
+
+def load_labeled_queries() -> List[Dict[str, Any]]:
+    with open(LABELED_QUERIES, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def directory_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total / (1024.0 * 1024.0)
+
+
+def quality_metrics(ranked_ids: List[List[str]], labeled: List[Dict[str, Any]], k: int) -> Dict[str, float]:
+    """Recall@k and MRR of ranked results against the labeled relevant ids."""
+    recalls, reciprocal_ranks = [], []
+    for ids, item in zip(ranked_ids, labeled):
+        relevant = set(item['relevant'])
+        recalls.append(len(relevant & set(ids[:k])) / float(min(len(relevant), k)))
+        rank = next((position for position, doc_id in enumerate(ids, start=1) if doc_id in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {
+        f'recall@{k}': sum(recalls) / len(recalls),
+        'mrr': sum(reciprocal_ranks) / len(reciprocal_ranks)
+    }
+
+
+def run_scale(scale: str, backend: str, quantization: str, k: int, repeat: int, hybrid: bool) -> Dict[str, Any]:
+    """Index one catalog size and measure it (runs in a subprocess)."""
+    from utils.vector_db import VectorDatabase
+    
+    products_df, services_df = load_catalog()
+    if scale != 'real':
+        products_df = synthetic_catalog(products_df, int(scale))
+    
+    index_dir = temporary_directory()
+    vector_db = VectorDatabase(
+        persist_directory=index_dir,
+        backend=backend,
+        quantization=quantization,
+        retrieval_config={'hybrid': hybrid}
+    )
+    
+    start = time.perf_counter()
+    vector_db.initialize_database(products_df, services_df)
+    index_s = time.perf_counter() - start
+    documents = vector_db.collection.count()
+    
+    labeled = load_labeled_queries()
+    queries = [item['query'] for item in labeled]
+    vector_db.search_similar_many(queries, n_results=k)
+    
+    # Latency of the per-turn path, embeddings already cached
+    latencies = time_calls(lambda query: vector_db.search_similar(query, n_results=k), queries, repeat=repeat)
+    
+    vector_db.query_cache.clear()
+    ranked = [[result['id'] for result in results] for results in vector_db.search_similar_many(queries, n_results=k)]
+    
+    return {
+        'scale': scale,
+        'documents': documents,
+        'indexing': {'seconds': index_s, 'docs_per_s': documents / index_s if index_s else 0.0},
+        'latency': summarize_latencies(latencies),
+        'memory': {'peak_rss_mb': rss_mb(), 'index_disk_mb': directory_size_mb(index_dir)},
+        'quality': quality_metrics(ranked, labeled, k)
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return ''
+
+
+def main():
+    from utils import embeddings
+    from utils.vector_db import VectorDatabase
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default='chroma', choices=VectorDatabase.BACKENDS)
+    parser.add_argument('--quantization', default='int8')
+    parser.add_argument('--scales', nargs='+', default=['real'])
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-hybrid', action='store_true', help="vector search only (BM25 is costly at 1M items)")
+    parser.add_argument('--output', default=None, help="write the JSON report to this file")
+    parser.add_argument('--worker', metavar='SCALE', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        print(json.dumps(run_scale(args.worker, args.backend, args.quantization, args.k, args.repeat, not args.no_hybrid)))
+        return
+    
+    report = {
+        'suite_version': SUITE_VERSION,
+        'timestamp': datetime.now().isoformat(),
+        'git_commit': git_commit(),
+        'environment': {'python': platform.python_version(), 'machine': platform.machine()},
+        'config': {
+            'backend': args.backend,
+            'quantization': args.quantization if args.backend == 'numpy' else None,
+            'embedding_model': embeddings.DEFAULT_MODEL_NAME,
+            'embedding_engine': embeddings.get_stats()['engine'],
+            'hybrid': not args.no_hybrid,
+            'k': args.k
+        },
+        'results': []
+    }
+    
+    for scale in args.scales:
+        command = [
+            sys.executable, '-m', 'benchmarks.retrieval_suite', '--worker', scale,
+            '--backend', args.backend, '--quantization', args.quantization,
+            '--k', str(args.k), '--repeat', str(args.repeat)
+        ]
+        if args.no_hybrid:
+            command.append('--no-hybrid')
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        report['results'].append(json.loads(output.strip().splitlines()[-1]))
+    
+    serialized = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(serialized)
+    print(serialized)
+
+
+if __name__ == '__main__':
+    main()
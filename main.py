@@ -1,16 +1,26 @@
+# PROFILE_STARTUP=1 times every import below; installed before them on purpose
+from utils import startup_profiler
+startup_profiler.enable_from_env()
+
 from flask import Flask, render_template, request, jsonify
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 import os
 import json
 import logging
-import pandas as pd
+import contextvars
+import queue
+import threading
+import uuid
 from datetime import datetime
 from dotenv import load_dotenv
 
-# Import only essential utility classes
-from utils.data_loader import DataLoader
+# Import only light utility classes; pandas, embeddings and the Gemini SDK load on first use or at warm-up
 from utils.session_manager import SessionManager
+from utils.conversation_store import ConversationStore
+from utils.llm_client import get_all_stats as get_llm_stats
+from utils.logging_setup import set_request_id, setup_logging
+from utils import envelope
 
 # Load environment variables
 load_dotenv()
@@ -21,43 +31,165 @@ app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
 
 # Initialize extensions
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Long frames are compressed: HTTP long-polling responses above the threshold, and websocket
+# frames through the permessage-deflate extension the eventlet server negotiates with browsers
+socketio = SocketIO(app, cors_allowed_origins="*", http_compression=True,
+                    compression_threshold=int(os.getenv('COMPRESSION_THRESHOLD', '1024')))
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Setup logging: records are queued and written by a background thread (see utils/logging_setup.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Global variables for components
 data_loader = None
 session_manager = None
+conversation_store = None
+orchestrator = None
+suggestion_service = None
+# Wire format ('json' or 'msgpack') of clients using the envelope protocol, by socket id
+client_formats = {}
+_components_lock = threading.Lock()
+
+# How often the message handler checks for streamed deltas from the routing thread (seconds)
+DELTA_POLL_INTERVAL = float(os.getenv('DELTA_POLL_INTERVAL', '0.02'))
+
+def _env_flag(name: str, default: str = 'false') -> bool:
+    """Read a boolean feature flag from the environment."""
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+def _off_hub(load):
+    """Run blocking work (imports, CSV and model loads) in an OS thread.
+    
+    Under eventlet every greenlet runs in the main thread and the stdlib is
+    not monkey-patched, so blocking there would stall all connections; the
+    calling greenlet waits cooperatively for the worker thread instead.
+    """
+    if _on_hub():
+        from eventlet import tpool
+        # Log records of the work keep the caller's request id
+        return tpool.execute(contextvars.copy_context().run, load)
+    return load()
+
+def _on_hub() -> bool:
+    return socketio.async_mode == 'eventlet' and threading.current_thread() is threading.main_thread()
+
+def _off_hub_streaming(work, send):
+    """Run ``work(on_delta)`` off the hub; the deltas it reports go through ``send``.
+    
+    The worker thread cannot emit (the request context and the eventlet hub
+    belong to the calling greenlet), so it queues the deltas and the calling
+    greenlet sends them as they arrive, sleeping cooperatively in between so
+    each frame is flushed while the reply is still being generated.
+    """
+    if not _on_hub():
+        return work(send)
+    import eventlet
+    deltas = queue.Queue()
+    job = eventlet.spawn(_off_hub, lambda: work(deltas.put))
+    while True:
+        # Checked before draining, so deltas queued just before the end are still sent
+        finished = job.dead
+        while not deltas.empty():
+            send(deltas.get_nowait())
+        if finished:
+            return job.wait()
+        socketio.sleep(DELTA_POLL_INTERVAL)
+
+def _load_orchestrator():
+    global orchestrator
+    with _components_lock:
+        if orchestrator is None:
+            with startup_profiler.step('orchestrator'):
+                from models.agents.orchestrator import Orchestrator
+                orchestrator = Orchestrator(
+                    structured_output=_env_flag('STRUCTURED_OUTPUT', 'true'),
+                    session_manager=session_manager,
+                    conversations=conversation_store
+                )
+
+def get_orchestrator():
+    """Orchestrator shared by all requests, created on first use."""
+    if orchestrator is None:
+        _off_hub(_load_orchestrator)
+    return orchestrator
+
+def _load_data_loader():
+    global data_loader
+    with _components_lock:
+        if data_loader is None:
+            with startup_profiler.step('data_loader'):
+                from utils.data_loader import DataLoader
+                loader = DataLoader()
+                products_df = loader.load_products()
+                services_df = loader.load_services()
+                logger.info(f"✅ Loaded {len(products_df)} products and {len(services_df)} services")
+                data_loader = loader
+
+def get_data_loader():
+    """Catalog data loader (pulls in pandas), created on first use."""
+    if data_loader is None:
+        _off_hub(_load_data_loader)
+    return data_loader
+
+def _load_suggestion_service():
+    global suggestion_service
+    with _components_lock:
+        if suggestion_service is None:
+            with startup_profiler.step('suggestions'):
+                from utils.suggestion_tables import SuggestionService
+                suggestion_service = SuggestionService.from_config()
+
+def get_suggestion_service():
+    """Precomputed product suggestions, loaded (or built for a new catalog) on first use."""
+    if suggestion_service is None:
+        _off_hub(_load_suggestion_service)
+    return suggestion_service
 
 def initialize_components():
-    """Initialize essential components only."""
-    global data_loader, session_manager
+    """Initialize the components needed to accept connections; heavy ones are deferred."""
+    global session_manager, conversation_store
     
     try:
         logger.info("Initializing components...")
         
-        # Initialize data loader
-        data_loader = DataLoader()
-        products_df = data_loader.load_products()
-        services_df = data_loader.load_services()
-        
         # Initialize session manager
-        session_manager = SessionManager()
-        
-        logger.info(f"✅ Loaded {len(products_df)} products and {len(services_df)} services")
+        with startup_profiler.step('session_manager'):
+            session_manager = SessionManager()
+            conversation_store = ConversationStore.from_config(session_manager)
         
     except Exception as e:
         logger.error(f"❌ Error initializing components: {str(e)}")
         raise
 
+def warm_up_components():
+    """Load the deferred components ahead of the first message that needs them."""
+    try:
+        get_data_loader()
+        get_orchestrator()
+        get_suggestion_service()
+        # Optionally load the shared embedding model as well
+        if _env_flag('WARMUP_EMBEDDINGS'):
+            with startup_profiler.step('embeddings'):
+                from utils.embeddings import warm_up
+                warm_up()
+        logger.info("✅ Components warmed up")
+    except Exception as e:
+        logger.error(f"❌ Error warming up components: {str(e)}")
+    startup_profiler.log_report()
+
 # Initialize components before serving routes
 initialize_components()
 
+# Warm up in an OS thread so the server accepts connections (and answers /api/health) right away;
+# a Socket.IO background task would be a greenlet and block the eventlet hub while it loads
+if _env_flag('WARMUP_ON_START', 'true'):
+    threading.Thread(target=warm_up_components, name='warm-up', daemon=True).start()
+
+@app.before_request
+def tag_request():
+    """Give the log records of each HTTP request a common id."""
+    set_request_id()
+
 # Routes
 @app.route('/')
 def index():
@@ -79,21 +211,22 @@ def health_check():
 @app.route('/api/products')
 def get_products():
     """Get all products."""
-    if data_loader:
+    if get_data_loader():
         try:
+            import pandas as pd
             products = data_loader.load_products()
             # Convert DataFrame to a simple list of dictionaries with proper null handling
             products_list = products.replace({pd.NA: None}).to_dict('records')
             return jsonify(products_list)
         except Exception as e:
-            logger.error(f"Error serving products API: {str(e)}")
+            logger.error("Error serving products API: %s", e)
             return jsonify({"error": str(e)}), 500
     return jsonify([])
 
 @app.route('/api/services')
 def get_services():
     """Get all services."""
-    if data_loader:
+    if get_data_loader():
         services = data_loader.load_services()
         return jsonify(services.to_dict('records'))
     return jsonify([])
@@ -101,11 +234,11 @@ def get_services():
 @app.route('/api/stats')
 def get_stats():
     """Get application statistics."""
-    if data_loader:
+    if get_data_loader():
         products_df = data_loader.load_products()
         services_df = data_loader.load_services()
         
-        return jsonify({
+        stats = {
             'products': {
                 'total_products': len(products_df),
                 'available_products': len(products_df[products_df['is_available'] == True]) if 'is_available' in products_df.columns else len(products_df)
@@ -113,27 +246,53 @@ def get_stats():
             'services': {
                 'total_services': len(services_df)
             },
-            'sessions': session_manager.get_session_stats() if session_manager else {'total': 0}
-        })
+            'sessions': session_manager.get_session_stats() if session_manager else {'total': 0},
+            'llm': get_llm_stats(),
+            'suggestions': suggestion_service.get_stats() if suggestion_service else None
+        }
+        if startup_profiler.enabled():
+            stats['startup'] = startup_profiler.report()
+        return jsonify(stats)
     return jsonify({'error': 'Data not loaded'})
 
 # WebSocket events
+def send_envelope(parts, message_id=None, sender='assistant'):
+    """Send message parts to the current client in one frame, or as legacy events."""
+    frame = envelope.build(parts, message_id=message_id, sender=sender)
+    fmt = client_formats.get(request.sid)
+    if fmt is None:
+        # Clients without the envelope protocol get one event per part, as before
+        for event, data in envelope.to_legacy(frame):
+            emit(event, data)
+    else:
+        emit(envelope.EVENT, envelope.encode(frame, fmt))
+
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     """Handle client connection."""
-    logger.info("✅ Client connected")
-    emit('message', {
-        'type': 'text',
-        'content': 'Bonjour! Je suis votre assistant HS Traiteur. Comment puis-je vous aider aujourd\'hui?',
-        'sender': 'assistant',
-        'timestamp': datetime.now().isoformat()
-    })
+    fmt = envelope.negotiate(auth)
+    if fmt is not None:
+        client_formats[request.sid] = fmt
+    logger.info("✅ Client connected (protocol: %s)", fmt or 'legacy')
+    send_envelope([envelope.part('text', 'Bonjour! Je suis votre assistant HS Traiteur. Comment puis-je vous aider aujourd\'hui?')])
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection."""
+    client_formats.pop(request.sid, None)
+    if suggestion_service is not None:
+        suggestion_service.forget(request.sid)
     logger.info("❌ Client disconnected")
 
+def _record_turn(session_id, user_message, reply):
+    """Add both sides of the exchange to the in-memory history Gemini reads; the session file is saved in the background."""
+    if conversation_store is None:
+        return
+    try:
+        conversation_store.record_turn(session_id, user_message, reply)
+    except Exception as e:
+        logger.warning("Could not record conversation turn: %s", e)
+
 @socketio.on('message')
 def handle_message(data):
     """Handle incoming messages."""
@@ -144,71 +303,84 @@ def handle_message(data):
         if not user_message:
             return
         
-        # Import AI components
-        import google.generativeai as genai
-        from models.agents.orchestrator import Orchestrator
+        # Utiliser l'orchestrateur directement (sans passer de LLM)
+        orchestrator = get_orchestrator()
         
-        # Configure Gemini (only for API key verification)
-        genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+        # Stream the answer text as it is generated; the final message replaces it
+        message_id = uuid.uuid4().hex
+        # Log records of this message carry its id, like the events sent to the client
+        set_request_id(message_id)
+        sid = request.sid
         
-        # Utiliser l'orchestrateur directement (sans passer de LLM)
-        orchestrator = Orchestrator()
-        result = orchestrator.route_query(user_message)
+        # Routing waits on the LLM scheduler, retries and the stream queue, so it runs off the hub
+        if _env_flag('STREAM_REPLIES', 'true'):
+            def route(send_delta):
+                # Chunks arriving close together are sent as one frame
+                on_delta = envelope.DeltaBatcher(send_delta).add
+                return orchestrator.route_query(user_message, on_delta=on_delta, session_id=sid)
+            
+            result = _off_hub_streaming(
+                route,
+                lambda text: send_envelope([envelope.part('delta', text)], message_id=message_id, sender=None)
+            )
+        else:
+            result = _off_hub(lambda: orchestrator.route_query(user_message, session_id=sid))
         
         # Vérifier si la réponse suggère un contact humain
         if isinstance(result, dict) and result.get('offer_human_contact'):
             ai_response = result['message']
+            _record_turn(request.sid, user_message, ai_response)
             
-            # Envoyer d'abord la réponse de l'IA
-            emit('message', {
-                'type': 'text',
-                'content': ai_response,
-                'sender': 'assistant',
-                'timestamp': datetime.now().isoformat()
-            })
-            
-            # Puis proposer le contact humain
-            emit('message', {
-                'type': 'human_contact_offer',
-                'content': "Souhaitez-vous être mis en relation avec un conseiller pour une assistance plus personnalisée?",
-                'whatsapp_link': result.get('whatsapp_link', ''),
-                'phone_number': result.get('phone_number', ''),
-                'sender': 'assistant',
-                'timestamp': datetime.now().isoformat()
-            })
+            # La réponse de l'IA puis la proposition de contact humain, dans une seule trame
+            send_envelope([
+                envelope.part('text', ai_response),
+                envelope.part(
+                    'human_contact_offer',
+                    "Souhaitez-vous être mis en relation avec un conseiller pour une assistance plus personnalisée?",
+                    whatsapp_link=result.get('whatsapp_link', ''),
+                    phone_number=result.get('phone_number', '')
+                )
+            ], message_id=message_id)
             return
         elif isinstance(result, dict) and result.get('type') == 'whatsapp_redirect':
             # Redirection directe vers WhatsApp
-            emit('message', {
-                'type': 'human_contact',
-                'content': result.get('message', "Je vous mets en relation avec un conseiller..."),
-                'whatsapp_link': result.get('whatsapp_link', ''),
-                'phone_number': result.get('phone_number', ''),
-                'sender': 'assistant',
-                'timestamp': datetime.now().isoformat()
-            })
+            _record_turn(request.sid, user_message, result.get('message', ''))
+            send_envelope([
+                envelope.part(
+                    'human_contact',
+                    result.get('message', "Je vous mets en relation avec un conseiller..."),
+                    whatsapp_link=result.get('whatsapp_link', ''),
+                    phone_number=result.get('phone_number', '')
+                )
+            ], message_id=message_id)
             return
         else:
             # Réponse normale
-            ai_response = result if isinstance(result, str) else str(result)
+            ai_response = result.get('message', '') if isinstance(result, dict) else str(result)
+            _record_turn(request.sid, user_message, ai_response)
         
         # Send AI response
-        emit('message', {
-            'type': 'text',
-            'content': ai_response,
-            'sender': 'assistant',
-            'timestamp': datetime.now().isoformat()
-        })
+        send_envelope([envelope.part('text', ai_response)], message_id=message_id)
         
     except Exception as e:
-        logger.error(f"❌ Error generating AI response: {str(e)}")
+        logger.error("❌ Error generating AI response: %s", e)
         # Fallback response
-        emit('message', {
-            'type': 'text',
-            'content': "Désolé, je rencontre une difficulté technique. Pouvez-vous reformuler votre question?",
-            'sender': 'assistant',
-            'timestamp': datetime.now().isoformat()
-        })
+        send_envelope([envelope.part('text', "Désolé, je rencontre une difficulté technique. Pouvez-vous reformuler votre question?")])
+
+@socketio.on('get_suggestions')
+def handle_get_suggestions(data):
+    """Suggest products for the client's preferences (category, event_type, price_range)."""
+    try:
+        preferences = (data or {}).get('preferences') or {}
+        if session_manager is not None:
+            session_manager.update_user_context(request.sid, {'preferences': preferences})
+        sid = request.sid
+        # Ranking reads the index and the catalog, so it runs off the hub like message routing
+        products = _off_hub(lambda: get_suggestion_service().suggest(preferences, session_id=sid))
+        emit('suggestions', {'products': products})
+    except Exception as e:
+        logger.error("❌ Error suggesting products: %s", e)
+        emit('suggestions', {'products': []})
 
 @app.errorhandler(404)
 def not_found(error):
@@ -223,10 +395,7 @@ def internal_error(error):
 
 if __name__ == '__main__':
     try:
-        # Initialize components
-        initialize_components()
-        
-        # Run the application
+        # Run the application (components were initialized at import)
         port = int(os.getenv('PORT', 5000))
         debug = os.getenv('ENVIRONMENT', 'development') == 'development'
         
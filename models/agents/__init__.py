@@ -1,6 +1,5 @@
 # Agents module initialization
 import logging
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured by the application (utils/logging_setup.py), not on import
 logger = logging.getLogger(__name__)
@@ -0,0 +1,210 @@
+import logging
+import re
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from utils.entity_extractors import extract_date, normalize
+from utils.lexical_index import STOPWORDS, fold_text, tokenize
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_PRICE_QUESTION = re.compile(r'\b(?:combien|prix|tarifs?|coute|coutent|cout|couts|montant|cher)\b')
+_AVAILABILITY_QUESTION = re.compile(r'\b(?:disponibles?|dispo|disponibilite|en\s+stock|rupture)\b')
+
+# Share of a product name's terms that must appear in the question
+MIN_NAME_COVERAGE = 0.75
+
+
+def _name_terms(text: str) -> set:
+    """Terms of a catalog name; keeps "avec" to tell "- Avec" / "- Sans" variations apart."""
+    return {term for term in fold_text(text).split() if term not in STOPWORDS or term == 'avec'}
+
+
+def _format_mad(value: float) -> str:
+    amount = f"{value:,.0f}" if float(value).is_integer() else f"{value:,.2f}"
+    return f"{amount.replace(',', ' ')} MAD"
+
+
+def _positive(value: Any) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    # NaN (an empty cell) is not > 0 either
+    return value if value > 0 else None
+
+
+class CatalogAgent:
+    """Answers price and availability questions straight from the catalog.
+    
+    The product or service is resolved by matching the question against
+    catalog names; the answer is a French template with exact prices in MAD.
+    ``run`` returns None when the question is not factual or the item is
+    ambiguous, so the caller can fall back to the LLM.
+    """
+    
+    def __init__(self, data_dir: str = "data"):
+        # Imported here so loading this module does not pull in pandas
+        from utils.data_loader import DataLoader
+        data_loader = DataLoader(data_dir)
+        self.products = self._index_products(data_loader.load_products())
+        self.services = self._index_services(data_loader.load_services())
+        logger.info(f"CatalogAgent indexed {len(self.products)} products and {len(self.services)} services")
+    
+    @staticmethod
+    def _index_products(products_df: 'pd.DataFrame') -> List[Dict[str, Any]]:
+        """One entry per product name; variations sharing a name are merged."""
+        products = {}
+        for _, row in products_df.iterrows():
+            name = str(row.get('Name', '')).strip()
+            if not name:
+                continue
+            entry = products.setdefault(name.lower(), {
+                'name': name,
+                'terms': _name_terms(name),
+                # "Menu complet classique - table de 10 personnes" can be asked for as "menu complet classique"
+                'head_terms': _name_terms(name.split(' - ')[0]) if ' - ' in name else set(),
+                'prices': [],
+                'regular_prices': [],
+                'available': False
+            })
+            regular = _positive(row.get('Regular price_numeric'))
+            sale = _positive(row.get('Sale price_numeric')) if row.get('has_sale') else None
+            if regular or sale:
+                entry['prices'].append(sale or regular)
+                entry['regular_prices'].append(regular or sale)
+            entry['available'] = entry['available'] or bool(row.get('is_available', False))
+        return [entry for entry in products.values() if entry['terms']]
+    
+    @staticmethod
+    def _index_services(services_df: 'pd.DataFrame') -> List[Dict[str, Any]]:
+        services = []
+        for _, row in services_df.iterrows():
+            name = str(row.get('nom_service', '')).strip('[] ')
+            terms = set(tokenize(name))
+            if not terms:
+                continue
+            services.append({
+                'name': name,
+                'terms': terms,
+                'min_price': _positive(row.get('prix_minimum')),
+                'max_price': _positive(row.get('prix_maximum')),
+                'status': str(row.get('statut_disponibilité', '')),
+                'available_count': int(row.get('produits_disponibles', 0) or 0),
+                'total_count': int(row.get('total_produits', 0) or 0)
+            })
+        return services
+    
+    def _resolve_product(self, query_terms: set) -> Optional[Dict[str, Any]]:
+        """Best matching product, or None if no name matches or several match equally."""
+        scored = []
+        for product in self.products:
+            coverage = len(product['terms'] & query_terms) / len(product['terms'])
+            if len(product['head_terms']) >= 2 and product['head_terms'] <= query_terms:
+                coverage = max(coverage, 1.0)
+            if coverage >= MIN_NAME_COVERAGE and (coverage == 1.0 or len(product['terms']) > 2):
+                scored.append((coverage, product))
+        if not scored:
+            return None
+        
+        best_coverage = max(coverage for coverage, _ in scored)
+        best = [product for coverage, product in scored if coverage == best_coverage]
+        # "X - Avec" / "X - Sans" are reported as variations of X, not as rivals
+        names = {product['name'] for product in best}
+        best = [product for product in best if product['name'].split(' - ')[0] not in names - {product['name']}]
+        best.sort(key=lambda product: len(product['terms']), reverse=True)
+        # A longer name wins only if it is a refinement of every other candidate
+        if all(product['terms'] <= best[0]['terms'] for product in best[1:]):
+            prefix = f"{best[0]['name']} - "
+            variants = [product for product in self.products if product['name'].startswith(prefix)]
+            return {**best[0], 'variants': variants}
+        return None
+    
+    def _resolve_service(self, query_terms: set) -> Optional[Dict[str, Any]]:
+        matches = [service for service in self.services if service['terms'] <= query_terms]
+        return matches[0] if len(matches) == 1 else None
+    
+    def _product_price(self, product: Dict[str, Any]) -> str:
+        name = product['name']
+        variants = [variant for variant in product['variants'] if variant['prices']]
+        if len(variants) > 1:
+            prices = [price for variant in variants for price in variant['prices']]
+            lines = [f"{name} est proposé de {_format_mad(min(prices))} à {_format_mad(max(prices))} selon la formule :"]
+            for variant in sorted(variants, key=lambda variant: min(variant['prices'])):
+                lines.append(f"- {variant['name']} : {_format_mad(min(variant['prices']))}")
+            return "\n".join(lines)
+        
+        if not product['prices']:
+            return f"Le prix de {name} est établi sur devis. Un conseiller peut vous préparer une offre personnalisée."
+        low, high = min(product['prices']), max(product['prices'])
+        if low != high:
+            return f"{name} est proposé de {_format_mad(low)} à {_format_mad(high)} selon la formule choisie."
+        regular = max(product['regular_prices'])
+        if regular > low:
+            return f"{name} est actuellement en promotion à {_format_mad(low)} au lieu de {_format_mad(regular)}."
+        return f"{name} est à {_format_mad(low)}."
+    
+    @staticmethod
+    def _product_availability(product: Dict[str, Any]) -> str:
+        if product['available'] or any(variant['available'] for variant in product['variants']):
+            return f"Oui, {product['name']} est disponible."
+        return f"{product['name']} est malheureusement en rupture de stock pour le moment."
+    
+    @staticmethod
+    def _service_price(service: Dict[str, Any]) -> str:
+        low, high = service['min_price'], service['max_price']
+        if low and high and low != high:
+            return f"Nos prestations {service['name']} vont de {_format_mad(low)} à {_format_mad(high)}."
+        if low or high:
+            return f"Nos prestations {service['name']} sont à partir de {_format_mad(low or high)}."
+        return f"Les tarifs de nos prestations {service['name']} sont établis sur devis."
+    
+    @staticmethod
+    def _service_availability(service: Dict[str, Any]) -> str:
+        counts = f"{service['available_count']} formule(s) disponible(s) sur {service['total_count']}"
+        if service['available_count'] == 0:
+            return f"Nos prestations {service['name']} ne sont pas disponibles pour le moment."
+        if service['status'] in ('limitée', 'faible'):
+            return f"La disponibilité de nos prestations {service['name']} est actuellement limitée ({counts})."
+        return f"Oui, nos prestations {service['name']} sont disponibles ({counts})."
+    
+    def run(self, query: str) -> Optional[Dict[str, Any]]:
+        """Templated answer for a price or availability question, or None."""
+        folded = normalize(query)
+        asks_price = bool(_PRICE_QUESTION.search(folded))
+        asks_availability = bool(_AVAILABILITY_QUESTION.search(folded))
+        if not (asks_price or asks_availability):
+            return None
+        # Availability for a date is a scheduling question, not a stock lookup
+        if asks_availability and extract_date(query):
+            return None
+        
+        query_terms = _name_terms(query)
+        product = self._resolve_product(query_terms)
+        service = None if product else self._resolve_service(query_terms)
+        if not (product or service):
+            return None
+        
+        parts = []
+        if product:
+            if asks_availability:
+                parts.append(self._product_availability(product))
+            if asks_price:
+                parts.append(self._product_price(product))
+        else:
+            if asks_availability:
+                parts.append(self._service_availability(service))
+            if asks_price:
+                parts.append(self._service_price(service))
+        
+        return {
+            "message": " ".join(parts) if all('\n' not in part for part in parts) else "\n".join(parts),
+            "intent": 'prix' if asks_price else 'disponibilité',
+            "entities": {
+                "produit": product['name'] if product else None,
+                "service": service['name'] if service else None
+            },
+            "offer_human_contact": False
+        }
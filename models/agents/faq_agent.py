@@ -1,75 +1,111 @@
-from langchain.chains import RetrievalQA
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.schema import Document
+import json
 import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List
+
+from utils.faq_index import DEFAULT_FAQ_INDEX_DIR, DEFAULT_FAQ_PATH, FAQIndex
 
 logger = logging.getLogger(__name__)
 
 class FAQAgent:
-    def __init__(self, llm):
-        """Initialize the FAQ agent with the provided LLM."""
+    # Similarity above which the stored answer is returned without calling the LLM
+    DIRECT_ANSWER_THRESHOLD = 0.75
+    # FAQs below this similarity are not passed to the LLM at all
+    CONTEXT_THRESHOLD = 0.45
+    # Minimum lead over the second FAQ; closer matches are treated as a multi-FAQ question
+    AMBIGUITY_MARGIN = 0.1
+    
+    def __init__(self, llm, faq_path: str = DEFAULT_FAQ_PATH, index_dir: str = DEFAULT_FAQ_INDEX_DIR,
+                 config_path: str = "config.json"):
+        """Initialize the FAQ agent with the provided LLM.
+        
+        FAQs are matched in-process against a precomputed embedding matrix
+        (see ``utils.faq_index``). A confident, unambiguous match is answered
+        with the stored answer; the LLM only handles low-confidence questions
+        and questions spanning several FAQs.
+        """
         self.llm = llm
+        self.direct_answer_threshold = self.DIRECT_ANSWER_THRESHOLD
+        self.context_threshold = self.CONTEXT_THRESHOLD
+        self.ambiguity_margin = self.AMBIGUITY_MARGIN
+        self.top_k = 3
         try:
-            # Create embeddings for FAQ data
-            self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-            
-            # Load FAQ data and create a vector store
-            self.faq_db = self._initialize_faq_database()
-            
-            # Setup FAQ retrieval chain
-            self.faq_chain = RetrievalQA.from_chain_type(
-                llm=self.llm,
-                chain_type="stuff",
-                retriever=self.faq_db.as_retriever(search_kwargs={"k": 3})
-            )
-            logger.info("FAQ Agent initialized successfully")
+            with open(config_path, 'r', encoding='utf-8') as f:
+                faq_config = json.load(f).get('faq_config', {})
+            self.direct_answer_threshold = faq_config.get('direct_answer_threshold', self.direct_answer_threshold)
+            self.context_threshold = faq_config.get('context_threshold', self.context_threshold)
+            self.ambiguity_margin = faq_config.get('ambiguity_margin', self.ambiguity_margin)
+            self.top_k = faq_config.get('top_k', self.top_k)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read faq_config from {config_path}: {e}")
+        
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+        try:
+            self.faq_index = FAQIndex.load(faq_path, index_dir)
+            logger.info(f"FAQ Agent initialized successfully with {len(self.faq_index.faqs)} FAQs")
         except Exception as e:
             logger.error(f"Failed to initialize FAQ Agent: {e}")
-            self.faq_chain = None
+            self.faq_index = None
+    
+    def _count(self, outcome: str):
+        with self._stats_lock:
+            self._stats[outcome] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Query counts per outcome and the share answered without the LLM."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        total = sum(stats.values())
+        return {
+            'queries': total,
+            'outcomes': stats,
+            'direct_answer_rate': stats.get('direct', 0) / total if total else 0.0,
+            'llm_rate': stats.get('llm', 0) / total if total else 0.0
+        }
     
-    def _initialize_faq_database(self) -> Chroma:
-        """Initialize the FAQ database with common questions and answers."""
-        # In a real implementation, this would load from a database or structured file
-        faqs = [
-            Document(
-                page_content="Q: What types of events do you organize? A: We organize various events including weddings, corporate gatherings, birthday parties, anniversaries, and other special occasions.",
-                metadata={"type": "faq", "category": "services"}
-            ),
-            Document(
-                page_content="Q: How far in advance should I book your services? A: We recommend booking at least 3-6 months in advance for large events like weddings, and 1-2 months for smaller events.",
-                metadata={"type": "faq", "category": "booking"}
-            ),
-            Document(
-                page_content="Q: Do you offer cancellation policies? A: Yes, we offer flexible cancellation policies. Full refunds are available up to 30 days before the event, and partial refunds up to 14 days before.",
-                metadata={"type": "faq", "category": "policies"}
-            ),
-            Document(
-                page_content="Q: Can I customize my event package? A: Absolutely! We offer fully customizable packages to meet your specific needs and preferences.",
-                metadata={"type": "faq", "category": "services"}
-            ),
-            Document(
-                page_content="Q: What is the payment schedule? A: We typically require a 25% deposit to secure your date, with 50% due one month before the event and the remaining balance due one week before.",
-                metadata={"type": "faq", "category": "payment"}
-            )
-        ]
+    def _ask_llm(self, query: str, matches: List[Dict[str, Any]]) -> str:
+        faq_context = "\n".join(f"Q: {match['questions'][0]} A: {match['answer']}" for match in matches)
+        prompt = (
+            "Answer the customer's question using only these FAQ entries. "
+            "If they do not cover it, say so.\n\n"
+            f"{faq_context}\n\nQuestion: {query}"
+        )
+        response = self.llm.invoke(prompt)
+        return getattr(response, 'content', response)
+    
+    def match(self, query: str):
+        """Decide how a query is answered: ('direct' | 'llm' | 'no_match', matching FAQs)."""
+        matches = [match for match in self.faq_index.search(query, k=self.top_k)
+                   if match['score'] >= self.context_threshold]
+        if not matches:
+            return 'no_match', matches
         
-        # Create vector store from FAQs
-        return Chroma.from_documents(faqs, self.embeddings)
+        # One confident match well ahead of the others: the stored answer is the answer
+        top = matches[0]
+        runner_up = matches[1]['score'] if len(matches) > 1 else 0.0
+        if top['score'] >= self.direct_answer_threshold and top['score'] - runner_up >= self.ambiguity_margin:
+            return 'direct', matches[:1]
+        # Low confidence or several close FAQs: let the LLM combine them
+        return 'llm', matches
     
     def run(self, query: str) -> str:
         """Process the FAQ query and provide a relevant answer."""
         try:
-            if self.faq_chain is None:
+            if self.faq_index is None:
                 return "I'm sorry, but I'm having trouble accessing our FAQ database at the moment. Please try again later."
             
-            # Create a prompt that focuses on finding FAQ matches
-            faq_prompt = f"Based on our FAQ database, answer the following question: {query}"
-            
-            # Get response from FAQ chain
-            response = self.faq_chain.run(faq_prompt)
-            return response
+            outcome, matches = self.match(query)
+            self._count(outcome)
+            if outcome == 'no_match':
+                return "I apologize, but I couldn't find specific information about that in our FAQs. Would you like me to connect you with a team member who can help?"
+            if outcome == 'direct':
+                logger.debug("FAQ direct answer %s (%.2f)", matches[0]['id'], matches[0]['score'])
+                return matches[0]['answer']
+            return self._ask_llm(query, matches)
             
         except Exception as e:
+            self._count('error')
             logger.error(f"Error in FAQ query: {e}")
             return "I apologize, but I couldn't find specific information about that in our FAQs. Would you like me to connect you with a team member who can help?"
@@ -1,21 +1,47 @@
 import logging
-import google.generativeai as genai
 import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from utils.conversation_store import ConversationStore
+from utils.intent_classifier import INTENTS, get_intent_classifier
+from utils.llm_client import CircuitOpenError, LLMError, get_llm_client, sdk_timeout
+from utils.llm_scheduler import PRIORITY_NORMAL
+from utils.streaming_json import StreamingFieldParser, parse_json_object
 
 logger = logging.getLogger(__name__)
 
+# Output contract of the combined mode; "reply" comes first so it can be streamed
+STRUCTURED_INSTRUCTIONS = """Réponds UNIQUEMENT avec un objet JSON valide, sans texte autour, de la forme:
+{"reply": "ta réponse au client", "intent": "information|commande|suggestion|prix|disponibilité|autre", "entities": {"produit": null, "service": null, "evenement": null, "budget": null, "nombre_personnes": null, "date": null}, "needs_human": false}
+Mets "needs_human" à true seulement si tu ne peux pas répondre avec les informations disponibles, si la demande est une réclamation ou si elle nécessite un devis personnalisé."""
+
+# Answer served when Gemini cannot be reached and nothing is cached for the question
+UNAVAILABLE_REPLY = "Désolé, je n'ai pas pu traiter votre demande. Veuillez réessayer ou contacter un conseiller."
+
 class GeminiAgent:
     """Agent qui utilise directement l'API Gemini sans RAG."""
     
-    def __init__(self):
-        """Initialiser l'agent Gemini."""
+    # Recent answers kept to reply while the upstream is unavailable
+    ANSWER_CACHE_SIZE = 256
+    # Shorter answers asked for when the scheduler downgrades a request under quota pressure
+    DOWNGRADE = {'generation_config': {'max_output_tokens': 200}}
+    
+    def __init__(self, session_manager=None, conversations: Optional[ConversationStore] = None):
+        """Initialiser l'agent Gemini.
+        
+        Le prompt système est passé une fois comme ``system_instruction`` du
+        modèle ; l'historique de chaque session vient de ``conversations``
+        (créé à partir de ``session_manager`` s'il n'est pas fourni).
+        """
         try:
             api_key = os.getenv('GOOGLE_API_KEY')
             if not api_key:
                 raise ValueError("GOOGLE_API_KEY n'est pas défini dans les variables d'environnement")
             
+            # Imported here so loading this module does not pull in the SDK
+            import google.generativeai as genai
             genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel(model_name="gemini-1.5-flash")
             
             # Charger le prompt système
             system_prompt_path = os.path.join('data', 'prompt_templates', 'system_prompt.txt')
@@ -30,19 +56,124 @@ class GeminiAgent:
                 IMPORTANT: Affiche TOUJOURS les prix en dirhams (MAD). Par exemple, si un produit coûte 1500, 
                 tu dois écrire "1500 dirhams" ou "1500 MAD". N'utilise JAMAIS une autre devise."""
             
+            self.model = genai.GenerativeModel(model_name="gemini-1.5-flash", system_instruction=self.system_prompt)
+            self.structured_model = genai.GenerativeModel(
+                model_name="gemini-1.5-flash",
+                system_instruction=f"{self.system_prompt}\n\n{STRUCTURED_INSTRUCTIONS}"
+            )
+            self.conversations = conversations or ConversationStore.from_config(session_manager)
+            self.llm_client = get_llm_client('gemini')
+            self._answers = OrderedDict()
+            self._answers_lock = threading.Lock()
+            
             logger.info("GeminiAgent initialisé avec succès")
         except Exception as e:
             logger.error(f"Échec de l'initialisation de GeminiAgent: {e}")
             raise
     
-    def run(self, query: str):
+    @staticmethod
+    def _cache_key(query: str, session_id: Optional[str]) -> Tuple[Optional[str], str]:
+        return session_id, " ".join(query.lower().split())
+    
+    def _remember(self, query: str, answer: Any, contents: List[Dict[str, Any]], session_id: Optional[str]):
+        """Keep an answer for outages; one that saw a conversation history is only reused in that session."""
+        key = self._cache_key(query, session_id if len(contents) > 1 else None)
+        with self._answers_lock:
+            self._answers[key] = answer
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.ANSWER_CACHE_SIZE:
+                self._answers.popitem(last=False)
+    
+    def _recall(self, query: str, error: Exception, session_id: Optional[str]) -> Optional[Any]:
+        """Previous answer to the same question, served while Gemini is unavailable.
+        
+        The session's own answer comes first, then one given without any history.
+        """
+        with self._answers_lock:
+            answer = self._answers.get(self._cache_key(query, session_id)) if session_id is not None else None
+            if answer is None:
+                answer = self._answers.get(self._cache_key(query, None))
+        if isinstance(error, CircuitOpenError):
+            logger.warning("Gemini circuit open, %s", 'serving cached answer' if answer else 'no cached answer')
+        else:
+            logger.error(f"Erreur lors de la génération de réponse avec Gemini: {error}")
+        return answer
+    
+    def _contents(self, query: str, session_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Trimmed history of the session followed by the new question."""
+        contents = self.conversations.history(session_id)
+        if contents and contents[-1]['role'] == 'user':
+            # The previous question got no recorded answer; send both as one turn
+            contents[-1]['parts'][0] += f"\n{query}"
+            return contents
+        return contents + [{'role': 'user', 'parts': [query]}]
+    
+    @staticmethod
+    def _unavailable() -> Dict[str, Any]:
+        return {'reply': UNAVAILABLE_REPLY, 'intent': 'autre', 'entities': {}, 'needs_human': True}
+    
+    def run_structured(self, query: str, on_delta: Optional[Callable[[str], None]] = None,
+                       priority: int = PRIORITY_NORMAL, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Answer, intent, entities and ``needs_human`` from a single generation.
+        
+        When ``on_delta`` is given the reply is streamed and the text of the
+        "reply" field is passed to it as it arrives. ``priority`` is the
+        scheduling priority of the request (see ``utils.llm_scheduler``) and
+        ``session_id`` selects the conversation history sent with it.
+        """
+        contents = self._contents(query, session_id)
+        parser = StreamingFieldParser('reply')
+        try:
+            if on_delta:
+                for chunk in self.llm_client.stream(self.structured_model.generate_content, contents, stream=True,
+                                                    priority=priority, downgrade=self.DOWNGRADE,
+                                                    request_timeout=sdk_timeout):
+                    delta = parser.feed(chunk.text)
+                    if delta:
+                        on_delta(delta)
+                raw = parser.buffer
+            else:
+                raw = self.llm_client.call(self.structured_model.generate_content, contents, priority=priority,
+                                           downgrade=self.DOWNGRADE, request_timeout=sdk_timeout).text
+        except LLMError as e:
+            return self._recall(query, e, session_id) or self._unavailable()
+        except Exception as e:
+            logger.error(f"Erreur lors de la génération de réponse avec Gemini: {e}")
+            return self._unavailable()
+        
+        local = get_intent_classifier().classify(query)
+        try:
+            data = parse_json_object(raw)
+        except ValueError:
+            logger.warning("Structured reply is not JSON, using it as plain text")
+            data = {'reply': parser.text or raw}
+        
+        # Rule-based entities fill whatever the model left out
+        entities = data.get('entities') if isinstance(data.get('entities'), dict) else {}
+        result = {
+            'reply': str(data.get('reply') or parser.text or raw).strip(),
+            'intent': data.get('intent') if data.get('intent') in INTENTS else local['intent'],
+            'entities': {**local['entities'], **{key: value for key, value in entities.items() if value}},
+            'needs_human': data.get('needs_human') is True
+        }
+        self._remember(query, result, contents, session_id)
+        return result
+    
+    def run(self, query: str, priority: int = PRIORITY_NORMAL, session_id: Optional[str] = None):
         """Obtenir une réponse directement de Gemini."""
+        contents = self._contents(query, session_id)
         try:
-            chat = self.model.start_chat(history=[])
-            response = chat.send_message(
-                f"[Instructions système]: {self.system_prompt}\n\n[Question client]: {query}"
+            response = self.llm_client.call(
+                self.model.generate_content,
+                contents,
+                priority=priority,
+                downgrade=self.DOWNGRADE,
+                request_timeout=sdk_timeout
             )
+            self._remember(query, response.text, contents, session_id)
             return response.text
+        except LLMError as e:
+            return self._recall(query, e, session_id) or UNAVAILABLE_REPLY
         except Exception as e:
             logger.error(f"Erreur lors de la génération de réponse avec Gemini: {e}")
-            return "Désolé, je n'ai pas pu traiter votre demande. Veuillez réessayer ou contacter un conseiller."
+            return UNAVAILABLE_REPLY
@@ -1,77 +1,267 @@
-from langchain.agents import initialize_agent, AgentType
-from langchain.tools import Tool
 import logging
+import re
+import time
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.entity_extractors import (
+    extract_budget, extract_buffet_style, extract_cuisine, extract_date, extract_event_type,
+    extract_guest_count, extract_option, extract_service_level, extract_venue, extract_yes_no, normalize
+)
+from utils.intent_classifier import get_intent_classifier
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_QUESTIONS_PATH = 'data/prompt_templates/qualification_questions.txt'
+COMMON_SECTION = 'communes'
+DEFAULT_SECTION = 'buffet'
+
+# Slot asked by a question, recognized from the (folded) question text
+QUESTION_SLOTS = [
+    (re.compile(r'type\s+d\s*evenement'), 'evenement'),
+    (re.compile(r'\bdate\b'), 'date'),
+    (re.compile(r'\b(?:invites|personnes)\b'), 'nombre_personnes'),
+    (re.compile(r'\bbudget\b'), 'budget'),
+    (re.compile(r'\b(?:cuisine|culinaires?)\b'), 'cuisine'),
+    (re.compile(r'\bdecoration\b'), 'decoration'),
+    (re.compile(r'\bvegetariennes?\b'), 'vegetarien'),
+    (re.compile(r'\bsucre\b'), 'type_buffet'),
+    (re.compile(r'\bmateriel\b'), 'materiel'),
+    (re.compile(r'\bboissons\s+chaudes\b'), 'boissons_chaudes'),
+    (re.compile(r'\bservice\s+complet\b'), 'formule'),
+    (re.compile(r'\b(?:interieur|exterieur)\b'), 'lieu'),
+]
+
+# Yes/no slots and the words that mention them in a free-form message
+OPTION_SLOTS = {
+    'decoration': r'decor\w*|deco\b',
+    'vegetarien': r'vegetarien\w*|vegan\w*',
+    'materiel': r'materiel|tables?\b|chaises?\b',
+    'boissons_chaudes': r'boissons?\s+chaudes?|the\b|cafe\b',
+}
+
+# Slots with unambiguous values, read from every message
+VALUE_EXTRACTORS: Dict[str, Callable[[str], Any]] = {
+    'evenement': extract_event_type,
+    'nombre_personnes': extract_guest_count,
+    'budget': extract_budget,
+    'date': extract_date,
+    'cuisine': extract_cuisine,
+    'type_buffet': extract_buffet_style,
+    'formule': extract_service_level,
+    'lieu': extract_venue,
+}
+
+SLOT_LABELS = {
+    'evenement': "événement",
+    'nombre_personnes': "invités",
+    'budget': "budget",
+    'date': "date",
+    'cuisine': "cuisine",
+    'type_buffet': "buffet",
+    'formule': "formule",
+    'lieu': "lieu",
+    'decoration': "décoration",
+    'vegetarien': "options végétariennes",
+    'materiel': "matériel",
+    'boissons_chaudes': "boissons chaudes",
+}
+
+_BARE_NUMBER = re.compile(r'^\D*?(\d{1,3}(?:[ .]\d{3})+|\d+)\D*$')
+
+
+def load_questions(path: str = DEFAULT_QUESTIONS_PATH) -> Dict[str, List[Tuple[str, str]]]:
+    """Questions per section as (slot, question); questions without a known slot are skipped."""
+    sections: Dict[str, List[Tuple[str, str]]] = {}
+    current = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            header = re.match(r'QUESTIONS\s+POUR\s+(.+):$|QUESTIONS\s+(COMMUNES):$', line)
+            if header:
+                current = sections.setdefault(normalize(header.group(1) or header.group(2)), [])
+            elif line.startswith('-') and current is not None:
+                question = line.lstrip('- ').strip()
+                slot = next((slot for pattern, slot in QUESTION_SLOTS if pattern.search(normalize(question))), None)
+                if slot and slot not in (existing for existing, _ in current):
+                    current.append((slot, question))
+    return sections
+
+
+def _format_value(slot: str, value: Any) -> str:
+    if isinstance(value, bool):
+        return "oui" if value else "non"
+    if slot == 'budget':
+        amounts = {key: f"{value[key]:,.0f}".replace(',', ' ') for key in ('min', 'max') if key in value}
+        if len(amounts) == 2:
+            return f"entre {amounts['min']} et {amounts['max']} MAD"
+        if 'max' in amounts:
+            return f"jusqu'à {amounts['max']} MAD"
+        return f"à partir de {amounts['min']} MAD"
+    if slot == 'date':
+        try:
+            return date.fromisoformat(value).strftime('%d/%m/%Y')
+        except ValueError:
+            return value
+    return str(value)
+
+
 class LeadQualifierAgent:
-    def __init__(self, llm):
-        """Initialize the lead qualifier agent with the provided LLM."""
+    """Per-session slot filling for event requests.
+    
+    The questions come from ``qualification_questions.txt`` (common questions,
+    then those of the event's section). Each message is parsed with the local
+    extractors of ``utils.entity_extractors``, the slots are stored in the
+    session's ``user_context['lead']`` and the next missing question is asked.
+    No LLM is needed; if one is given it is called at most once per turn, to
+    rephrase the templated reply.
+    """
+    
+    def __init__(self, llm=None, session_manager=None, questions_path: str = DEFAULT_QUESTIONS_PATH,
+                 start_threshold: float = 0.6):
+        """Initialize the lead qualifier agent with an optional LLM for phrasing."""
         self.llm = llm
-        self.collected_info = {}
+        self.session_manager = session_manager
+        self.questions = load_questions(questions_path)
+        # Confidence of the local 'commande' intent needed to start qualifying
+        self.start_threshold = start_threshold
+        self.intent_classifier = get_intent_classifier()
+    
+    def _load_state(self, session_id: Optional[str]) -> Dict[str, Any]:
+        if self.session_manager is None or session_id is None:
+            return {'slots': {}, 'pending': None, 'complete': False, 'completed_at': None}
+        lead = self.session_manager.get_user_context(session_id).get('lead') or {}
+        return {'slots': dict(lead.get('slots', {})), 'pending': lead.get('pending'), 'complete': lead.get('complete', False),
+                'completed_at': lead.get('completed_at')}
+    
+    def _save_state(self, session_id: Optional[str], state: Dict[str, Any]):
+        if self.session_manager is not None and session_id is not None:
+            # order_in_progress also gives this session priority for LLM calls, only until the lead is complete
+            self.session_manager.update_user_context(session_id, {'lead': state, 'order_in_progress': not state['complete']})
+    
+    def _release(self, session_id: Optional[str]):
+        """The customer moved on to another request: the lead keeps its slots but loses its LLM priority."""
+        if self.session_manager is not None and session_id is not None and \
+                self.session_manager.get_user_context(session_id).get('order_in_progress'):
+            self.session_manager.update_user_context(session_id, {'order_in_progress': False})
+    
+    def _plan(self, slots: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """Questions for this lead in order: common ones, then the event's section."""
+        section = normalize(slots.get('evenement') or '')
+        if section not in self.questions or section == COMMON_SECTION:
+            section = DEFAULT_SECTION
+        plan = []
+        for slot, question in self.questions.get(COMMON_SECTION, []) + self.questions.get(section, []):
+            if slot not in (existing for existing, _ in plan):
+                plan.append((slot, question))
+        return plan
+    
+    def extract_slots(self, query: str, pending: Optional[str] = None) -> Dict[str, Any]:
+        """Slots found in a message; short answers count for the ``pending`` slot."""
+        slots = {}
+        for slot, extractor in VALUE_EXTRACTORS.items():
+            value = extractor(query)
+            if value is not None:
+                slots[slot] = value
+        for slot, keyword in OPTION_SLOTS.items():
+            value = extract_option(query, keyword)
+            if value is not None:
+                slots[slot] = value
         
-        # Define tools to collect user info
-        tools = [
-            Tool(
-                name="collect_budget",
-                func=self._collect_budget,
-                description="Collect budget information from the user"
-            ),
-            Tool(
-                name="collect_event_type",
-                func=self._collect_event_type,
-                description="Collect event type information from the user"
-            ),
-            Tool(
-                name="collect_contact_info",
-                func=self._collect_contact_info,
-                description="Collect contact information from the user"
-            )
-        ]
+        if pending and pending not in slots:
+            if pending in OPTION_SLOTS:
+                answer = extract_yes_no(query)
+                if answer is not None:
+                    slots[pending] = answer
+            elif pending in ('nombre_personnes', 'budget'):
+                match = _BARE_NUMBER.match(normalize(query))
+                if match:
+                    amount = int(re.sub(r'[ .]', '', match.group(1)))
+                    slots[pending] = amount if pending == 'nombre_personnes' else {'max': float(amount)}
+            elif pending == 'evenement' and len(query.strip()) <= 40 and '?' not in query:
+                # Event types outside the known list are kept as the customer wrote them
+                slots[pending] = query.strip().rstrip('.!?')
+        return slots
+    
+    def handles(self, query: str, session_id: Optional[str] = None) -> bool:
+        """Whether this message belongs to the qualification flow.
         
-        # Initialize agent with the LLM
-        self.agent = initialize_agent(
-            tools,
-            self.llm,
-            agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            verbose=True,
-            handle_parsing_errors=True
-        )
-
-    def _collect_budget(self, context: str) -> str:
-        """Extract budget information from the context or ask for it."""
-        # In a real implementation, this would be more sophisticated
-        return "Budget information collected. Please provide your budget range for the event."
+        True when the message is an order/booking request, or while a
+        question is pending and the message answers a slot without being
+        confidently classified as another intent (a date or a number inside
+        an unrelated question is not an answer).
+        """
+        state = self._load_state(session_id)
+        intent, confidence = self.intent_classifier.predict(query)
+        if intent == 'commande':
+            if confidence >= self.start_threshold:
+                return True
+        elif confidence >= self.start_threshold:
+            if state['pending'] and not state['complete']:
+                self._release(session_id)
+            return False
+        return bool(state['pending'] and not state['complete'] and self.extract_slots(query, state['pending']))
+    
+    def qualify(self, query: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Update the session's slots from the message and pick the next question."""
+        state = self._load_state(session_id)
+        if state['complete']:
+            # A new request after a finished qualification starts a new lead
+            state = {'slots': {}, 'pending': None, 'complete': False, 'completed_at': None}
+        
+        found = self.extract_slots(query, state['pending'])
+        new_slots = {slot: value for slot, value in found.items() if state['slots'].get(slot) != value}
+        state['slots'].update(found)
+        
+        missing = [(slot, question) for slot, question in self._plan(state['slots']) if slot not in state['slots']]
+        state['pending'] = missing[0][0] if missing else None
+        state['complete'] = not missing
+        state['completed_at'] = time.time() if state['complete'] else None
+        self._save_state(session_id, state)
+        
+        return {
+            'slots': state['slots'],
+            'new_slots': new_slots,
+            'next_question': missing[0][1] if missing else None,
+            'missing': [slot for slot, _ in missing],
+            'complete': state['complete']
+        }
     
-    def _collect_event_type(self, context: str) -> str:
-        """Extract event type information from the context or ask for it."""
-        return "Event type information collected. Please specify what type of event you're planning."
+    def _template_reply(self, result: Dict[str, Any]) -> str:
+        parts = []
+        if result['new_slots']:
+            noted = ", ".join(f"{SLOT_LABELS[slot]} : {_format_value(slot, value)}" for slot, value in result['new_slots'].items())
+            parts.append(f"C'est noté ({noted}).")
+        if result['complete']:
+            summary = "\n".join(f"- {SLOT_LABELS[slot]} : {_format_value(slot, value)}" for slot, value in result['slots'].items())
+            parts.append(f"Merci ! Voici le récapitulatif de votre demande :\n{summary}\n"
+                         "Un conseiller va vous préparer un devis personnalisé.")
+        else:
+            parts.append(result['next_question'])
+        return " ".join(parts)
     
-    def _collect_contact_info(self, context: str) -> str:
-        """Extract contact information from the context or ask for it."""
-        return "Contact information collected. Please provide your contact details for follow-up."
-
-    def run(self, query: str) -> str:
+    def _rephrase(self, query: str, reply: str) -> str:
+        """One LLM call to make the templated reply sound natural; the template is kept on failure."""
+        prompt = (
+            "Reformule ce message d'un assistant traiteur de façon chaleureuse et concise, en français, "
+            "sans changer les informations ni la question posée.\n\n"
+            f"Message du client : {query}\nMessage à reformuler : {reply}"
+        )
+        try:
+            response = self.llm.invoke(prompt)
+            return getattr(response, 'content', response) or reply
+        except Exception as e:
+            logger.warning("Could not rephrase lead qualification reply: %s", e)
+            return reply
+    
+    def run(self, query: str, session_id: Optional[str] = None) -> str:
         """Process the lead qualification query."""
         try:
-            # Create a structured prompt for lead qualification
-            lead_prompt = f"""
-            You are a lead qualification assistant. Your goal is to gather important information 
-            about the customer's event planning needs. Based on the following query, determine 
-            what information you need to collect and provide a helpful response.
-            
-            Customer Query: {query}
-            
-            Focus on collecting:
-            1. Budget range
-            2. Event type and size
-            3. Date and location preferences
-            4. Contact information
-            
-            Provide a friendly response that moves the conversation forward:
-            """
-            
-            return self.agent.run(lead_prompt)
+            result = self.qualify(query, session_id)
+            reply = self._template_reply(result)
+            if result['complete']:
+                logger.info("Lead qualified for session %s: %s", session_id, sorted(result['slots']))
+            return self._rephrase(query, reply) if self.llm is not None else reply
         except Exception as e:
-            logger.error(f"Error in lead qualification: {e}")
-            return "I'd be happy to help you plan your event! Could you tell me more about what type of event you're planning and your budget range?"
+            logger.error("Error in lead qualification: %s", e)
+            return "Je serais ravi de vous aider à organiser votre événement ! Quel type d'événement préparez-vous et quel est votre budget ?"
@@ -1,31 +1,82 @@
 import logging
+from typing import Callable, Optional
 from .whatsapp_router import WhatsAppRouterAgent
 from .gemini_agent import GeminiAgent
+from .catalog_agent import CatalogAgent
+from .lead_qualifier import LeadQualifierAgent
+from utils.routing_rules import get_routing_engine
+from utils.llm_scheduler import PRIORITY_NORMAL, session_priority
 
 logger = logging.getLogger(__name__)
 
 class Orchestrator:
-    def __init__(self, llm=None):
-        """Initialize the orchestrator with the Gemini agent."""
+    # Queries longer than this are considered complex enough to offer a human
+    LONG_QUERY_CHARS = 150
+    
+    def __init__(self, llm=None, structured_output: bool = True, session_manager=None, conversations=None):
+        """Initialize the orchestrator with the Gemini agent.
+        
+        With ``structured_output`` a single generation returns the answer
+        together with the intent, entities and an explicit ``needs_human``
+        flag, which replaces the keyword heuristics on the answer.
+        ``session_manager`` stores the per-session state of lead qualification;
+        ``conversations`` (a ``ConversationStore``) holds the history sent to Gemini.
+        """
+        self.structured_output = structured_output
+        self.session_manager = session_manager
         try:
             # Nous ignorons le paramètre llm car nous utilisons directement l'API Gemini
-            self.gemini_agent = GeminiAgent()
+            self.gemini_agent = GeminiAgent(session_manager=session_manager, conversations=conversations)
             self.whatsapp_agent = WhatsAppRouterAgent()
+            # Keyword rules from config.json, compiled once per process
+            self.routing_rules = get_routing_engine()
+            # Price and availability questions answered from the catalog without the LLM
+            self.catalog_agent = CatalogAgent()
+            # Order and booking requests are qualified slot by slot without the LLM
+            self.lead_qualifier = LeadQualifierAgent(session_manager=session_manager)
             
             logger.info("Orchestrator initialized successfully with Gemini only")
         except Exception as e:
             logger.error(f"Failed to initialize orchestrator: {e}")
             raise
-
-    def route_query(self, query: str):
-        """Route the query to the appropriate agent based on intent detection."""
+    
+    def route_query(self, query: str, on_delta: Optional[Callable[[str], None]] = None,
+                    session_id: Optional[str] = None):
+        """Route the query to the appropriate agent based on intent detection.
+        
+        ``on_delta`` receives the answer text as it streams (structured mode only).
+        ``session_id`` identifies the customer for lead qualification and
+        the conversation history.
+        """
         try:
             # Vérifier si l'utilisateur veut contacter un humain
             if self._wants_human_contact(query):
                 return self.whatsapp_agent.run(query)
             
+            # Réponse directe depuis le catalogue pour les questions de prix et de disponibilité
+            catalog_answer = self.catalog_agent.run(query)
+            if catalog_answer:
+                logger.info("Catalog fast path answered: %s", catalog_answer['entities'])
+                return catalog_answer
+            
+            # Demande de réservation ou réponse à une question de qualification en cours
+            if session_id is not None and self.lead_qualifier.handles(query, session_id):
+                return {
+                    "message": self.lead_qualifier.run(query, session_id),
+                    "intent": 'commande',
+                    "offer_human_contact": False
+                }
+            
+            # Les clients en cours de commande passent en priorité quand le quota Gemini est tendu
+            priority = PRIORITY_NORMAL
+            if self.session_manager is not None and session_id is not None:
+                priority = session_priority(self.session_manager.get_user_context(session_id))
+            
+            if self.structured_output:
+                return self._route_structured(query, on_delta, priority, session_id)
+            
             # Utiliser directement Gemini pour toutes les autres requêtes
-            response = self.gemini_agent.run(query)
+            response = self.gemini_agent.run(query, priority=priority, session_id=session_id)
             
             # Si la réponse semble indiquer qu'une assistance humaine serait utile
             if self._should_offer_human_contact(response, query):
@@ -40,44 +91,45 @@ class Orchestrator:
             return response
             
         except Exception as e:
-            logger.error(f"Error routing query: {e}")
+            logger.error("Error routing query: %s", e)
             return f"Je m'excuse, mais j'ai rencontré une erreur lors du traitement de votre demande. Veuillez réessayer ou contacter notre support."
-
+    
+    def _route_structured(self, query: str, on_delta: Optional[Callable[[str], None]] = None,
+                          priority: int = PRIORITY_NORMAL, session_id: Optional[str] = None) -> dict:
+        """Answer with one structured generation and route on its ``needs_human`` flag."""
+        result = self.gemini_agent.run_structured(query, on_delta=on_delta, priority=priority, session_id=session_id)
+        response = {
+            "message": result["reply"],
+            "intent": result["intent"],
+            "entities": result["entities"],
+            "offer_human_contact": result["needs_human"]
+        }
+        if result["needs_human"]:
+            logger.info("Model flagged the query as needing a human (intent: %s)", result['intent'])
+            human_contact = self.whatsapp_agent.get_human_contact_message(query)
+            response["whatsapp_link"] = human_contact["whatsapp_link"]
+            response["phone_number"] = human_contact["phone_number"]
+        return response
+    
     def _wants_human_contact(self, query: str) -> bool:
         """Détecte si l'utilisateur veut parler à un humain."""
-        human_contact_keywords = ["parler à un humain", "agent humain", "personne réelle", 
-                              "conseiller", "représentant", "parler à quelqu'un", 
-                              "whatsapp", "téléphone", "contact direct", "vraie personne", 
-                              "chat humain", "assistant humain", "humain"]
-        
-        query_lower = query.lower()
-        for keyword in human_contact_keywords:
-            if keyword in query_lower:
-                logger.info(f"Detected human contact request with keyword: '{keyword}' in query: '{query}'")
-                return True
-        
+        match = self.routing_rules.classify(query)
+        if match and match['target'] == 'whatsapp':
+            logger.info("Detected human contact request (rule %s, keyword '%s')", match['name'], match['keyword'])
+            return True
         return False
     
     def _should_offer_human_contact(self, response: str, query: str) -> bool:
         """Détermine si on devrait proposer un contact humain basé sur la réponse et la requête."""
-        # Si la requête est complexe (plus de 150 caractères)
-        if len(query) > 150:
-            logger.info(f"Query is complex (length > 150), suggesting human contact")
+        # Si la requête est complexe
+        if len(query) > self.LONG_QUERY_CHARS:
+            logger.info("Query is complex (length > %d), suggesting human contact", self.LONG_QUERY_CHARS)
             return True
-            
-        # Si la réponse contient des phrases qui indiquent une incertitude
-        uncertainty_phrases = [
-            "je ne suis pas sûr", 
-            "je n'ai pas cette information",
-            "je ne peux pas", 
-            "désolé", 
-            "navré",
-            "contacter un conseiller",
-            "contacter directement"
-        ]
         
-        if any(phrase in response.lower() for phrase in uncertainty_phrases):
-            logger.info(f"Response indicates uncertainty, suggesting human contact")
+        # Si la réponse contient des phrases qui indiquent une incertitude
+        match = self.routing_rules.classify(query, response)
+        if match and match['target'] == 'offer_human':
+            logger.info("Response indicates uncertainty (rule %s), suggesting human contact", match['name'])
             return True
-            
+        
         return False
@@ -1,10 +1,6 @@
-import os
-import pandas as pd
 import logging
-from langchain.schema import Document
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.chains import RetrievalQA
+from utils.embeddings import SharedLangChainEmbeddings
+from utils.index_builder import open_index
 
 logger = logging.getLogger(__name__)
 
@@ -15,10 +11,11 @@ class RAGAgent:
         
         try:
             # Initialize ChromaDB with product data
-            self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+            self.embeddings = SharedLangChainEmbeddings("sentence-transformers/all-MiniLM-L6-v2")
             self.db = self._initialize_vector_store()
             
             # Setup RAG chain
+            from langchain.chains import RetrievalQA
             self.rag_chain = RetrievalQA.from_chain_type(
                 llm=self.llm,
                 chain_type="stuff",
@@ -29,60 +26,28 @@ class RAGAgent:
         except Exception as e:
             logger.error(f"Failed to initialize RAG Agent: {e}")
             self.rag_chain = None
-
-    def _initialize_vector_store(self) -> Chroma:
-        """Initialize the vector store with product and service data."""
+    
+    def _initialize_vector_store(self) -> 'Chroma':
+        """Open the prebuilt product and service index read-only.
+        
+        The index is built offline with ``python -m utils.index_builder``;
+        a missing or stale index raises instead of being rebuilt here.
+        """
         try:
-            # Check if ChromaDB already exists
-            persist_directory = "chroma_db"
-            
-            if os.path.exists(persist_directory):
-                db = Chroma(persist_directory=persist_directory, embedding_function=self.embeddings)
-                logger.info("Loaded existing ChromaDB")
-                return db
-            
-            # Load and process CSV data
-            documents = []
-            
-            # Load products data
-            if os.path.exists("products_rag.csv"):
-                products_df = pd.read_csv("products_rag.csv")
-                for _, row in products_df.iterrows():
-                    content = f"Product: {row.get('name', '')} - {row.get('description', '')} - Price: {row.get('price', 'N/A')}"
-                    documents.append(Document(page_content=content, metadata={"type": "product", "source": "products_rag.csv"}))
-            
-            # Load services data
-            if os.path.exists("services_rag.csv"):
-                services_df = pd.read_csv("services_rag.csv")
-                for _, row in services_df.iterrows():
-                    content = f"Service: {row.get('name', '')} - {row.get('description', '')} - Price: {row.get('price', 'N/A')}"
-                    documents.append(Document(page_content=content, metadata={"type": "service", "source": "services_rag.csv"}))
-            
-            if not documents:
-                # Create some sample documents if no CSV files found
-                documents = [
-                    Document(page_content="Wedding planning services including venue booking, catering, and decoration", 
-                            metadata={"type": "service", "source": "default"}),
-                    Document(page_content="Corporate event management for conferences, seminars, and team building", 
-                            metadata={"type": "service", "source": "default"}),
-                    Document(page_content="Party supplies rental including tables, chairs, and sound systems", 
-                            metadata={"type": "product", "source": "default"})
-                ]
-            
-            # Create and persist vector store
-            db = Chroma.from_documents(
-                documents=documents,
-                embedding=self.embeddings,
-                persist_directory=persist_directory
+            vector_db = open_index(backend="chroma", model_name=self.embeddings.model_name)
+            from langchain_community.vectorstores import Chroma
+            db = Chroma(
+                client=vector_db.client,
+                collection_name=vector_db.collection_name,
+                embedding_function=self.embeddings
             )
-            db.persist()
-            logger.info(f"Created new ChromaDB with {len(documents)} documents")
+            logger.info(f"Loaded vector index {vector_db.manifest['version']}")
             return db
             
         except Exception as e:
             logger.error(f"Error initializing vector store: {e}")
             raise
-
+    
     def run(self, query: str) -> str:
         """Process the RAG query to retrieve relevant product/service information."""
         try:
@@ -9,6 +9,8 @@ except ImportError:
         logging.warning("dotenv package not installed, environment variables may not be loaded")
         return False
 
+logger = logging.getLogger(__name__)
+
 class WhatsAppRouterAgent:
     def __init__(self):
         self.whatsapp_link = "https://api.whatsapp.com/message/ZREQ73H3OQTRJ1?autoload=1&app_absent=0"
@@ -17,14 +19,15 @@ class WhatsAppRouterAgent:
         self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
         self.api_enabled = bool(self.account_sid and self.auth_token)
         self.phone_number = os.getenv('CONTACT_PHONE', "+212671506013")  # Numéro de téléphone par défaut
-        logging.info("WhatsApp router agent initialized with direct contact link")
+        logger.info("WhatsApp router agent initialized with direct contact link")
         
     def _generate_whatsapp_link(self, query: str) -> str:
         base_link = self.whatsapp_link
         separator = "&" if "?" in base_link else "?"
         encoded_message = urllib.parse.quote(f"Bonjour, j'ai une question concernant: {query}")
         final_link = f"{base_link}{separator}text={encoded_message}"
-        logging.info(f"Generated WhatsApp link: {final_link} for query: {query}")
+        # The link embeds the customer's message: length only, and only at debug level
+        logger.debug("Generated WhatsApp link (%d chars)", len(final_link))
         return final_link
         
     def run(self, query: str) -> dict:
@@ -36,7 +39,7 @@ class WhatsAppRouterAgent:
             "whatsapp_link": whatsapp_link,
             "phone_number": self.phone_number
         }
-        logging.info(f"WhatsAppRouterAgent returning response: {response}")
+        logger.info("Redirecting to WhatsApp")
         return response
         
     def get_human_contact_message(self, query: str) -> dict:
@@ -1,5 +1,8 @@
 // HS Chatbot JavaScript Application
 
+// Version of the server envelope protocol understood by this client
+const ENVELOPE_PROTOCOL = 1;
+
 class HSChatbot {
     constructor() {
         this.socket = null;
@@ -10,6 +13,7 @@ class HSChatbot {
         this.connectionStatus = document.getElementById('connection-status');
         this.typingIndicator = document.getElementById('typing-indicator');
         this.onlineIndicator = document.getElementById('online-indicator');
+        this.streamingMessages = {};
         
         this.initializeSocketIO();
         this.setupEventListeners();
@@ -17,7 +21,9 @@ class HSChatbot {
     }
 
     initializeSocketIO() {
-        this.socket = io();
+        // Ask for envelope frames, in MessagePack when the decoder is loaded
+        const formats = window.MessagePack ? ['msgpack', 'json'] : ['json'];
+        this.socket = io({ auth: { protocol: ENVELOPE_PROTOCOL, formats } });
         
         this.socket.on('connect', () => {
             this.updateConnectionStatus('connected');
@@ -29,13 +35,19 @@ class HSChatbot {
             console.log('Disconnected from server');
         });
 
+        // One frame with all the parts of a reply (see utils/envelope.py)
+        this.socket.on('envelope', (frame) => {
+            this.handleEnvelope(frame);
+        });
+
+        // Legacy events, sent when the server does not use the envelope protocol
         this.socket.on('message', (data) => {
-            if (data.type === 'human_contact' || data.type === 'human_contact_offer') {
-                this.displayHumanContactMessage(data);
-            } else {
-                this.displayMessage(data.content, 'assistant', data.timestamp);
-            }
-            this.hideTypingIndicator();
+            this.handleMessage(data);
+        });
+
+        // Partial answer text, streamed while the reply is generated
+        this.socket.on('message_delta', (data) => {
+            this.appendMessageDelta(data.message_id, data.content);
         });
 
         this.socket.on('suggestions', (data) => {
@@ -55,6 +67,39 @@ class HSChatbot {
         });
     }
     
+    handleEnvelope(frame) {
+        const envelope = frame instanceof ArrayBuffer ? MessagePack.decode(new Uint8Array(frame)) : frame;
+        if (envelope.v > ENVELOPE_PROTOCOL) {
+            console.warn(`Unsupported envelope version ${envelope.v}`);
+        }
+        envelope.parts.forEach((part) => {
+            if (part.t === 'delta') {
+                this.appendMessageDelta(envelope.id, part.c);
+                return;
+            }
+            this.handleMessage({
+                type: part.t,
+                content: part.c,
+                whatsapp_link: part.wa,
+                phone_number: part.tel,
+                message_id: part.t === 'text' ? envelope.id : undefined,
+                sender: envelope.from,
+                timestamp: envelope.ts
+            });
+        });
+    }
+
+    handleMessage(data) {
+        if (data.type === 'human_contact' || data.type === 'human_contact_offer') {
+            this.displayHumanContactMessage(data);
+        } else if (data.message_id && this.streamingMessages[data.message_id]) {
+            this.finishStreamingMessage(data);
+        } else {
+            this.displayMessage(data.content, 'assistant', data.timestamp);
+        }
+        this.hideTypingIndicator();
+    }
+    
     displayHumanContactMessage(data) {
         const messageDiv = document.createElement('div');
         messageDiv.className = 'message assistant';
@@ -205,6 +250,28 @@ class HSChatbot {
         this.scrollToBottom();
     }
 
+    appendMessageDelta(messageId, delta) {
+        let stream = this.streamingMessages[messageId];
+        if (!stream) {
+            this.hideTypingIndicator();
+            this.displayMessage('', 'assistant');
+            const messageDiv = this.messageContainer.lastElementChild;
+            stream = { bubble: messageDiv.querySelector('.message-bubble'), text: '' };
+            this.streamingMessages[messageId] = stream;
+        }
+        stream.text += delta;
+        stream.bubble.innerHTML = this.formatMessageContent(stream.text, 'assistant');
+        this.scrollToBottom();
+    }
+
+    finishStreamingMessage(data) {
+        // The final message is authoritative: replace the streamed text with it
+        const stream = this.streamingMessages[data.message_id];
+        stream.bubble.innerHTML = this.formatMessageContent(data.content, 'assistant');
+        delete this.streamingMessages[data.message_id];
+        this.scrollToBottom();
+    }
+
     formatMessageContent(content, sender) {
         if (sender === 'assistant') {
             // Format assistant messages with better styling
@@ -0,0 +1,132 @@
+"""Per-session conversation history sent to Gemini as multi-turn contents.
+
+Every exchange is appended here in memory by :meth:`ConversationStore.record_turn`,
+already converted to Gemini ``contents``, and handed to ``SessionManager``
+once per turn for persistence. The history is trimmed from the oldest
+turns to a token budget, and sessions unused for ``idle_seconds`` (or
+beyond ``max_sessions``) are evicted; an evicted session (or one from
+before a restart) is rebuilt from ``SessionManager`` on its next message.
+
+Settings come from ``config.json`` under ``conversation_config``.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.prompt_packer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+ROLES = {'user': 'user', 'assistant': 'model'}
+
+
+class _Conversation:
+    def __init__(self):
+        self.contents: List[Dict[str, Any]] = []
+        self.tokens: List[int] = []
+        self.last_used = 0.0
+    
+    def append(self, role: str, text: str):
+        text = str(text or '').strip()
+        if not role or not text:
+            return
+        if self.contents and self.contents[-1]['role'] == role:
+            # Consecutive messages from the same side are merged into one turn
+            self.contents[-1]['parts'][0] += f"\n{text}"
+            self.tokens[-1] += estimate_tokens(text)
+        else:
+            self.contents.append({'role': role, 'parts': [text]})
+            self.tokens.append(estimate_tokens(text))
+
+
+class ConversationStore:
+    """Trimmed Gemini history per session, persisted through ``SessionManager``."""
+    
+    def __init__(self, session_manager=None, history_token_budget: int = 1500, idle_seconds: float = 1800,
+                 max_sessions: int = 500, clock: Callable[[], float] = time.monotonic):
+        self.session_manager = session_manager
+        self.history_token_budget = history_token_budget
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conversations: 'OrderedDict[str, _Conversation]' = OrderedDict()
+        self._counters = {'rebuilt': 0, 'reused': 0, 'evicted': 0, 'trimmed_turns': 0}
+    
+    @classmethod
+    def from_config(cls, session_manager=None, config_path: str = 'config.json') -> 'ConversationStore':
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                settings = json.load(f).get('conversation_config', {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read conversation_config settings from {config_path}: {e}")
+            settings = {}
+        return cls(session_manager=session_manager, **settings)
+    
+    def _evict(self, now: float):
+        while self._conversations:
+            session_id, conversation = next(iter(self._conversations.items()))
+            if len(self._conversations) <= self.max_sessions and now - conversation.last_used < self.idle_seconds:
+                break
+            del self._conversations[session_id]
+            self._counters['evicted'] += 1
+    
+    def _trim(self, conversation: _Conversation):
+        """Drop the oldest turns past the budget; the history must start with a user turn."""
+        total = sum(conversation.tokens)
+        while conversation.contents and (total > self.history_token_budget or conversation.contents[0]['role'] != 'user'):
+            conversation.contents.pop(0)
+            total -= conversation.tokens.pop(0)
+            self._counters['trimmed_turns'] += 1
+    
+    def _conversation(self, session_id: str, now: float) -> _Conversation:
+        """The session's history, rebuilt from ``SessionManager`` if it is not in memory (called under the lock)."""
+        conversation = self._conversations.pop(session_id, None)
+        if conversation is None:
+            conversation = _Conversation()
+            self._counters['rebuilt'] += 1
+            if self.session_manager is not None:
+                for message in self.session_manager.get_conversation_history(session_id, limit=0):
+                    conversation.append(ROLES.get(message.get('sender')), message.get('content'))
+                self._trim(conversation)
+        else:
+            self._counters['reused'] += 1
+        conversation.last_used = now
+        self._conversations[session_id] = conversation
+        self._evict(now)
+        return conversation
+    
+    def history(self, session_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Previous turns of the session as Gemini contents (empty without a session)."""
+        if session_id is None:
+            return []
+        with self._lock:
+            conversation = self._conversation(session_id, self._clock())
+            # Copies, so callers can append the new turn without touching the store
+            return [{'role': turn['role'], 'parts': list(turn['parts'])} for turn in conversation.contents]
+    
+    def record_turn(self, session_id: Optional[str], user_message: str, reply: str):
+        """Append a question and its answer to the history and persist them with one save."""
+        if session_id is None:
+            return
+        with self._lock:
+            conversation = self._conversation(session_id, self._clock())
+            conversation.append('user', user_message)
+            conversation.append('model', reply)
+            self._trim(conversation)
+        if self.session_manager is not None:
+            self.session_manager.add_messages(session_id, [
+                {'content': user_message, 'sender': 'user'},
+                {'content': reply, 'sender': 'assistant'}
+            ])
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters,
+                'sessions': len(self._conversations),
+                'history_tokens': sum(sum(conversation.tokens) for conversation in self._conversations.values())
+            }
@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+class EmbeddingCache:
+    """Bounded LRU cache for query embeddings keyed by normalized text."""
+    
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(0, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize query text so trivially different queries share an entry."""
+        return " ".join(str(text).lower().split())
+    
+    def get(self, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for a query, or None."""
+        key = self.normalize(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+    
+    def put(self, text: str, embedding: List[float]):
+        """Store an embedding, evicting the least recently used entries."""
+        if self.max_entries == 0:
+            return
+        key = self.normalize(text)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def get_or_compute(self, text: str, compute: Callable[[str], List[float]]) -> List[float]:
+        """Return the cached embedding or compute and cache it."""
+        embedding = self.get(text)
+        if embedding is None:
+            embedding = compute(self.normalize(text))
+            self.put(text, embedding)
+        return embedding
+    
+    def clear(self):
+        """Drop all cached embeddings and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+DEFAULT_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+ENGINES = ('torch', 'onnx')
+
+logger = logging.getLogger(__name__)
+
+_models = {}
+_registry_lock = threading.Lock()
+_model_locks = {}
+
+# Engine settings, read from the environment unless configure() is called
+_engine_config = {
+    'engine': os.getenv('EMBEDDING_ENGINE', 'torch'),
+    'onnx_model_dir': os.getenv('ONNX_MODEL_DIR', os.path.join('models', 'onnx', '{model}')),
+    'intra_op_threads': int(os.getenv('EMBEDDING_THREADS', '1')),
+    'inter_op_threads': 1,
+    'batch_size': 32
+}
+
+
+def _check_engine(engine: str):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown embedding engine '{engine}', expected one of {ENGINES}")
+
+
+# A bad EMBEDDING_ENGINE fails here rather than silently loading torch later
+_check_engine(_engine_config['engine'])
+
+
+def configure(**settings):
+    """Override the embedding engine settings (engine, onnx_model_dir, threads, batch_size).
+    
+    Must be called before the first model is loaded to take effect.
+    """
+    unknown = set(settings) - set(_engine_config)
+    if unknown:
+        raise ValueError(f"Unknown embedding settings: {sorted(unknown)}")
+    _check_engine(settings.get('engine', _engine_config['engine']))
+    with _registry_lock:
+        _engine_config.update(settings)
+
+
+def _load_model(key: str):
+    """Load a model with the configured engine."""
+    engine = _engine_config['engine']
+    if engine == 'onnx':
+        from utils.onnx_embeddings import OnnxEmbeddingModel
+        model_dir = _engine_config['onnx_model_dir'].format(model=key)
+        logger.info(f"Loading ONNX embedding model: {key} from {model_dir}")
+        return OnnxEmbeddingModel(
+            model_dir,
+            intra_op_threads=_engine_config['intra_op_threads'],
+            inter_op_threads=_engine_config['inter_op_threads'],
+            batch_size=_engine_config['batch_size']
+        )
+    
+    from sentence_transformers import SentenceTransformer
+    logger.info(f"Loading embedding model: {key}")
+    return SentenceTransformer(key)
+
+
+def _canonical_name(model_name: str) -> str:
+    """Map 'sentence-transformers/x' and 'x' to the same registry key."""
+    prefix = 'sentence-transformers/'
+    return model_name[len(prefix):] if model_name.startswith(prefix) else model_name
+
+
+def get_embedding_model(model_name: str = DEFAULT_MODEL_NAME):
+    """Return the process-wide encoder for a model, loading it once on first use."""
+    key = _canonical_name(model_name)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    
+    with _registry_lock:
+        model_lock = _model_locks.setdefault(key, threading.Lock())
+    
+    # Per-model lock: concurrent callers wait for a single load
+    with model_lock:
+        model = _models.get(key)
+        if model is None:
+            model = _load_model(key)
+            _models[key] = model
+    return model
+
+
+def is_loaded(model_name: str = DEFAULT_MODEL_NAME) -> bool:
+    """Check whether a model is already resident in this process."""
+    return _canonical_name(model_name) in _models
+
+
+def warm_up(model_names: Optional[Iterable[str]] = None):
+    """Load models ahead of the first request (e.g. at worker boot)."""
+    for model_name in model_names or [DEFAULT_MODEL_NAME]:
+        try:
+            get_embedding_model(model_name).encode(['warm-up'], convert_to_numpy=True)
+        except Exception as e:
+            logger.warning(f"Could not warm up embedding model {model_name}: {e}")
+
+
+def encode(texts: List[str], model_name: str = DEFAULT_MODEL_NAME, batch_size: int = 32) -> np.ndarray:
+    """Encode texts with the shared model."""
+    return get_embedding_model(model_name).encode(list(texts), batch_size=batch_size, convert_to_numpy=True)
+
+
+class SharedEmbeddingFunction:
+    """Chroma embedding function backed by the shared model."""
+    
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME):
+        self.model_name = model_name
+    
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return encode(input, self.model_name).tolist()
+
+
+class SharedLangChainEmbeddings:
+    """LangChain ``Embeddings`` implementation backed by the shared model."""
+    
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME):
+        self.model_name = model_name
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return encode(texts, self.model_name).tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        return encode([text], self.model_name)[0].tolist()
+
+
+def get_stats() -> Dict[str, Any]:
+    """List the models resident in this process."""
+    return {'engine': _engine_config['engine'], 'loaded_models': sorted(_models)}
@@ -0,0 +1,292 @@
+import re
+import unicodedata
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+# Amounts such as "2000", "2 000", "2.000", "1500,50" or "2k"
+_AMOUNT = r'(\d{1,3}(?:[ .]\d{3})+(?!\d)|\d+(?:[.,]\d+)?)\s*(k\b)?'
+_CURRENCY = r'(?:\s*(?:mad|dhs?|dirhams?)\b)'
+
+_PEOPLE = r'(?:personnes?|invites?|convives?|pers\b|couverts?|participants?)'
+_RANGE = re.compile(rf'entre\s+{_AMOUNT}{_CURRENCY}?\s+et\s+{_AMOUNT}{_CURRENCY}?(?![\d.,]|\s*{_PEOPLE})')
+_MAX = re.compile(
+    rf'(?:moins\s+de|maximum|max|au\s+plus|pas\s+plus\s+de|jusqu\s*a|sous|inferieur\s+a|ne\s+depassant\s+pas)'
+    rf'\s*{_AMOUNT}{_CURRENCY}'
+)
+# After the word "budget" the currency is implied
+_BUDGET = re.compile(rf'budget\s+(?:de\s+|d\s*environ\s+|max\s+|maximum\s+|est\s+de\s+)?{_AMOUNT}{_CURRENCY}?')
+_MIN = re.compile(rf'(?:plus\s+de|minimum|au\s+moins|a\s+partir\s+de|superieur\s+a)\s*{_AMOUNT}{_CURRENCY}')
+_PRICED = re.compile(rf'{_AMOUNT}{_CURRENCY}')
+
+_AVAILABLE = re.compile(r'\b(?:en\s+stock|disponibles?|dispo)\b')
+
+_GUESTS = re.compile(rf'(\d{{1,4}})\s*{_PEOPLE}')
+_GUESTS_FOR = re.compile(r'pour\s+(\d{1,4})\b(?!\s*(?:mad|dhs?|dirhams?|k\b|h\b|heures?|ans?\b|%|/|[.,]?\d))')
+
+MONTHS = {
+    'janvier': 1, 'fevrier': 2, 'mars': 3, 'avril': 4, 'mai': 5, 'juin': 6, 'juillet': 7,
+    'aout': 8, 'septembre': 9, 'octobre': 10, 'novembre': 11, 'decembre': 12
+}
+WEEKDAYS = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
+
+_NUMERIC_DATE = re.compile(r'\b(\d{1,2})[/.-](\d{1,2})(?:[/.-](\d{2,4}))?\b')
+_TEXT_DATE = re.compile(rf'\b(\d{{1,2}})(?:er)?\s+({"|".join(MONTHS)})(?:\s+(\d{{4}}))?\b')
+_RELATIVE_DATE = re.compile(
+    rf'\b(aujourd\s*hui|apres[\s-]demain|demain|ce\s+soir|ce\s+week[\s-]?end|week[\s-]?end\s+prochain'
+    rf'|semaine\s+prochaine|mois\s+prochain|(?:ce\s+)?(?:{"|".join(WEEKDAYS)})(?:\s+prochain)?)\b'
+)
+
+# Event types, matched on folded text, mapped to the catalog service they belong to
+EVENT_TYPES = [
+    (re.compile(r'\b(?:mariages?|noces?|fiancailles?|henna|henne)\b'), 'mariage', 'Mariage'),
+    (re.compile(r'\b(?:soutenances?|diplomes?|remise\s+de\s+diplome|these|graduation)\b'), 'soutenance', 'Soutenance'),
+    (re.compile(r'\b(?:anniversaires?|birthday)\b'), 'anniversaire', 'Anniversaire'),
+    (re.compile(r'\b(?:naissances?|bapteme|baptemes|aqiqa|sbou3?)\b'), 'naissance', 'Mariage'),
+    (re.compile(r'\b(?:seminaires?|entreprises?|conferences?|corporate|team\s+building|professionnels?)\b'), 'entreprise', 'Catering Général'),
+    (re.compile(r'\b(?:ftour|iftar|ramadan|aid)\b'), 'fete religieuse', 'Cuisine Marocaine'),
+]
+
+# Service mentions that do not imply an event type
+SERVICE_KEYWORDS = [
+    (re.compile(r'\bbuffets?\b'), 'Buffet'),
+    (re.compile(r'\b(?:patisseries?|gateaux?|piece\s+montee|cake\s+design|desserts?)\b'), 'Pâtisserie'),
+    (re.compile(r'\b(?:cuisine\s+marocaine|tajines?|couscous|pastillas?|mechoui)\b'), 'Cuisine Marocaine'),
+    (re.compile(r'\bmenus?\s+complets?\b'), '[Menu complet'),
+    (re.compile(r'\b(?:traiteur|catering)\b'), 'Catering Général'),
+]
+
+# Answers to the qualification questions, first match wins
+CUISINES = [
+    (re.compile(r'\b(?:les\s+deux|mixte|un\s+peu\s+des\s+deux)\b'), 'mixte'),
+    (re.compile(r'\bmarocaine?s?\b'), 'marocaine'),
+    (re.compile(r'\binternationale?s?\b'), 'internationale'),
+]
+BUFFET_STYLES = [
+    (re.compile(r'\b(?:les\s+deux|mixte|sucres?\s+(?:et\s+)?sales?|sales?\s+(?:et\s+)?sucres?)\b'), 'mixte'),
+    (re.compile(r'\bsucres?\b'), 'sucré'),
+    (re.compile(r'\bsales?\b'), 'salé'),
+]
+VENUES = [
+    (re.compile(r'\b(?:exterieur|dehors|plein\s+air|jardin|terrasse)\b'), 'extérieur'),
+    (re.compile(r'\b(?:interieur|salle|dedans)\b'), 'intérieur'),
+]
+SERVICE_LEVELS = [
+    (re.compile(r'\b(?:juste|seulement|uniquement)\s+(?:la\s+)?(?:nourriture|livraison|repas)\b'), 'nourriture seule'),
+    (re.compile(r'\bservice\s+complet\b'), 'service complet'),
+]
+
+_YES = re.compile(r'^\W*(?:oui|ouais|yes|bien\s+sur|volontiers|absolument|d\s+accord|ok|okay|exactement|tout\s+a\s+fait|avec\s+plaisir)\b')
+_NO = re.compile(r'^\W*(?:non|no|pas\s+besoin|pas\s+du\s+tout|aucun|aucune|sans|ce\s+n\s+est\s+pas\s+necessaire)\b')
+_NEGATION = r'(?:sans|pas\s+de|pas\s+d|pas\s+besoin\s+de|pas\s+besoin\s+d|aucune?|ni)\s+(?:\w+\s+){0,2}?'
+
+_URGENT = re.compile(r'\b(?:urgent|urgence|au\s+plus\s+vite|rapidement|asap|tout\s+de\s+suite|aujourd\s*hui|ce\s+soir|demain|48\s*h|24\s*h)\b')
+
+
+def normalize(text: Any) -> str:
+    """Lowercase and strip accents, keeping digits and punctuation."""
+    decomposed = unicodedata.normalize('NFKD', str(text or '').lower())
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return re.sub(r"[\u2019'\u00a0]", ' ', folded)
+
+
+def _to_amount(number: str, thousands: Optional[str]) -> float:
+    if re.fullmatch(r'\d{1,3}(?:[ .]\d{3})+', number):
+        number = re.sub(r'[ .]', '', number)
+    value = float(number.replace(',', '.'))
+    return value * 1000 if thousands else value
+
+
+def extract_budget(text: str) -> Optional[Dict[str, float]]:
+    """Extract a budget in MAD as ``{'min': ..., 'max': ...}`` (either key optional)."""
+    folded = normalize(text)
+    
+    match = _RANGE.search(folded)
+    if match:
+        low = _to_amount(match.group(1), match.group(2))
+        high = _to_amount(match.group(3), match.group(4))
+        return {'min': min(low, high), 'max': max(low, high)}
+    
+    budget = {}
+    match = _MAX.search(folded) or _BUDGET.search(folded)
+    if match:
+        budget['max'] = _to_amount(match.group(1), match.group(2))
+    match = _MIN.search(folded)
+    if match:
+        budget['min'] = _to_amount(match.group(1), match.group(2))
+    if budget:
+        return budget
+    
+    # A bare amount with a currency ("pour 2000 MAD") is read as a ceiling
+    match = _PRICED.search(folded)
+    if match:
+        return {'max': _to_amount(match.group(1), match.group(2))}
+    return None
+
+
+def wants_available(text: str) -> bool:
+    """Whether the customer asks for items in stock."""
+    return bool(_AVAILABLE.search(normalize(text)))
+
+
+def extract_search_filters(text: str) -> Dict[str, Any]:
+    """Search filters implied by a customer message (budget and availability)."""
+    filters = {}
+    budget = extract_budget(text)
+    if budget:
+        if 'min' in budget:
+            filters['min_price'] = budget['min']
+        if 'max' in budget:
+            filters['max_price'] = budget['max']
+    if wants_available(text):
+        filters['available'] = True
+    return filters
+
+
+def extract_guest_count(text: str) -> Optional[int]:
+    """Number of guests ("50 personnes", "pour 30", "entre 40 et 50 invités" gives the upper bound)."""
+    folded = normalize(text)
+    match = re.search(rf'(\d{{1,4}})\s*(?:et|a|-)\s*(\d{{1,4}})\s*{_PEOPLE}', folded)
+    if match:
+        return max(int(match.group(1)), int(match.group(2)))
+    match = _GUESTS.search(folded) or _GUESTS_FOR.search(folded)
+    if match:
+        count = int(match.group(1))
+        return count if 0 < count <= 5000 else None
+    return None
+
+
+def _next_weekday(today: date, weekday: int) -> date:
+    return today + timedelta(days=(weekday - today.weekday()) % 7 or 7)
+
+
+def extract_date(text: str, today: Optional[date] = None) -> Optional[str]:
+    """Event date as ISO ``YYYY-MM-DD`` when it can be resolved, else the raw expression."""
+    folded = normalize(text)
+    today = today or date.today()
+    
+    match = _TEXT_DATE.search(folded)
+    if match:
+        day, month = int(match.group(1)), MONTHS[match.group(2)]
+        year = int(match.group(3)) if match.group(3) else None
+    else:
+        match = _NUMERIC_DATE.search(folded)
+        if match and not re.match(r'\s*(?:personnes?|invites?|mad|dhs?)', folded[match.end():]):
+            day, month = int(match.group(1)), int(match.group(2))
+            year = int(match.group(3)) if match.group(3) else None
+            if year is not None and year < 100:
+                year += 2000
+        else:
+            match = None
+    
+    if match:
+        try:
+            resolved = date(year or today.year, month, day)
+        except ValueError:
+            return None
+        # A date without a year that already passed refers to next year
+        if year is None and resolved < today:
+            resolved = date(today.year + 1, month, day)
+        return resolved.isoformat()
+    
+    match = _RELATIVE_DATE.search(folded)
+    if not match:
+        return None
+    expression = re.sub(r'\s+', ' ', match.group(1))
+    if expression.startswith('aujourd') or expression == 'ce soir':
+        return today.isoformat()
+    if expression == 'demain':
+        return (today + timedelta(days=1)).isoformat()
+    if expression.startswith('apres'):
+        return (today + timedelta(days=2)).isoformat()
+    for index, weekday in enumerate(WEEKDAYS):
+        if weekday in expression:
+            return _next_weekday(today, index).isoformat()
+    return expression
+
+
+def extract_event_type(text: str) -> Optional[str]:
+    folded = normalize(text)
+    for pattern, event_type, _ in EVENT_TYPES:
+        if pattern.search(folded):
+            return event_type
+    return None
+
+
+def extract_service(text: str) -> Optional[str]:
+    """Catalog service mentioned or implied by the event type."""
+    folded = normalize(text)
+    for pattern, service in SERVICE_KEYWORDS:
+        if pattern.search(folded):
+            return service
+    for pattern, _, service in EVENT_TYPES:
+        if pattern.search(folded):
+            return service
+    return None
+
+
+def extract_urgency(text: str) -> str:
+    """Urgency level: élevée for explicit urgency or a date within two days."""
+    if _URGENT.search(normalize(text)):
+        return 'élevée'
+    return 'moyenne' if extract_date(text) else 'faible'
+
+
+def _first_match(text: str, patterns) -> Optional[str]:
+    folded = normalize(text)
+    for pattern, value in patterns:
+        if pattern.search(folded):
+            return value
+    return None
+
+
+def extract_cuisine(text: str) -> Optional[str]:
+    """Cuisine preference: marocaine, internationale or mixte."""
+    return _first_match(text, CUISINES)
+
+
+def extract_buffet_style(text: str) -> Optional[str]:
+    """Buffet style: sucré, salé or mixte."""
+    return _first_match(text, BUFFET_STYLES)
+
+
+def extract_venue(text: str) -> Optional[str]:
+    return _first_match(text, VENUES)
+
+
+def extract_service_level(text: str) -> Optional[str]:
+    """Full service or food only."""
+    return _first_match(text, SERVICE_LEVELS)
+
+
+def extract_yes_no(text: str) -> Optional[bool]:
+    """Answer to a yes/no question, None if the message is neither."""
+    folded = normalize(text)
+    if _NO.search(folded):
+        return False
+    if _YES.search(folded):
+        return True
+    return None
+
+
+def extract_option(text: str, keyword: str) -> Optional[bool]:
+    """Whether an option matching the ``keyword`` regex is wanted ("avec décoration" / "sans décoration")."""
+    folded = normalize(text)
+    if re.search(rf'\b{_NEGATION}(?:{keyword})', folded):
+        return False
+    if re.search(rf'\b(?:{keyword})', folded):
+        return True
+    return None
+
+
+def extract_entities(text: str) -> Dict[str, Any]:
+    """Entities in the shape of PromptEngineer.extract_intent (missing values are None)."""
+    budget = extract_budget(text)
+    return {
+        'produit': None,
+        'service': extract_service(text),
+        'evenement': extract_event_type(text),
+        'budget': budget.get('max', budget.get('min')) if budget else None,
+        'nombre_personnes': extract_guest_count(text),
+        'date': extract_date(text),
+        'urgence': extract_urgency(text)
+    }
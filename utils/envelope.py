@@ -0,0 +1,146 @@
+"""Versioned Socket.IO envelope carrying several message parts in one frame.
+
+An envelope is sent as a single ``envelope`` event::
+
+    {"v": 1, "id": "<message id>", "ts": <epoch ms>, "from": "assistant",
+     "parts": [{"t": "text", "c": "..."},
+               {"t": "human_contact_offer", "c": "...", "wa": "<link>", "tel": "<phone>"}]}
+
+The sender, timestamp and message id are written once per frame instead of
+once per message, and part fields use short keys (:data:`PART_KEYS`).
+Streamed text travels as ``delta`` parts, in frames without ``ts``/``from``,
+coalesced by :class:`DeltaBatcher` so a reply is not one frame per chunk.
+
+Clients opt in by connecting with ``auth={"protocol": 1, "formats": [...]}``;
+``msgpack`` is used when both sides support it (the ``msgpack`` package is
+optional), JSON otherwise. Clients that send no protocol get the former
+``message`` / ``message_delta`` events, expanded by :func:`to_legacy`.
+"""
+import json
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+PROTOCOL_VERSION = 1
+EVENT = 'envelope'
+# Preferred first
+FORMATS = ('msgpack', 'json')
+# Part fields and their short wire names
+PART_KEYS = {'type': 't', 'content': 'c', 'whatsapp_link': 'wa', 'phone_number': 'tel'}
+LEGACY_KEYS = {short: name for name, short in PART_KEYS.items()}
+
+
+def _msgpack():
+    try:
+        import msgpack
+        return msgpack
+    except ImportError:
+        return None
+
+
+def available_formats() -> List[str]:
+    return [fmt for fmt in FORMATS if fmt != 'msgpack' or _msgpack() is not None]
+
+
+def negotiate(auth: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Wire format for a client from its connect ``auth``; None means legacy events."""
+    if not isinstance(auth, dict):
+        return None
+    try:
+        version = int(auth.get('protocol') or 0)
+    except (TypeError, ValueError):
+        return None
+    if version < 1:
+        return None
+    offered = auth.get('formats') or ['json']
+    return next((fmt for fmt in available_formats() if fmt in offered), None)
+
+
+def part(type: str, content: str, **fields) -> Dict[str, Any]:
+    """One message part; ``fields`` use the legacy names (``whatsapp_link``...)."""
+    data = {'t': type, 'c': content}
+    for name, value in fields.items():
+        if value is not None:
+            data[PART_KEYS.get(name, name)] = value
+    return data
+
+
+def build(parts: Iterable[Dict[str, Any]], message_id: Optional[str] = None, sender: Optional[str] = 'assistant',
+          timestamp: Optional[int] = None) -> Dict[str, Any]:
+    """Envelope for ``parts``; pass ``sender=None`` to leave out ``ts``/``from`` (deltas)."""
+    envelope = {'v': PROTOCOL_VERSION}
+    if message_id:
+        envelope['id'] = message_id
+    if sender:
+        envelope['ts'] = timestamp or int(time.time() * 1000)
+        envelope['from'] = sender
+    envelope['parts'] = list(parts)
+    return envelope
+
+
+def encode(envelope: Dict[str, Any], fmt: str = 'json') -> Any:
+    """Payload of the ``envelope`` event: bytes for msgpack, a dict for JSON.
+    
+    JSON payloads are serialized by Socket.IO itself, so the dict is returned.
+    """
+    if fmt == 'msgpack':
+        return _msgpack().packb(envelope, use_bin_type=True)
+    return envelope
+
+
+def decode(payload: Any) -> Dict[str, Any]:
+    if isinstance(payload, (bytes, bytearray)):
+        return _msgpack().unpackb(payload, raw=False)
+    if isinstance(payload, str):
+        return json.loads(payload)
+    return payload
+
+
+def to_legacy(envelope: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """The ``(event, data)`` pairs the former protocol sent for this envelope."""
+    events = []
+    for data in envelope['parts']:
+        fields = {LEGACY_KEYS.get(key, key): value for key, value in data.items()}
+        if fields['type'] == 'delta':
+            events.append(('message_delta', {'message_id': envelope.get('id'), 'content': fields['content']}))
+            continue
+        message = dict(fields)
+        # Only plain text messages carried the id (to close a streamed answer)
+        if message['type'] == 'text' and envelope.get('id'):
+            message['message_id'] = envelope['id']
+        message['sender'] = envelope.get('from', 'assistant')
+        message['timestamp'] = datetime.fromtimestamp(envelope['ts'] / 1000.0 if 'ts' in envelope else time.time()).isoformat()
+        events.append(('message', message))
+    return events
+
+
+class DeltaBatcher:
+    """Coalesces streamed deltas into fewer frames.
+    
+    A delta is sent right away when the previous frame is older than
+    ``max_delay`` seconds (so the first words show up immediately), or once
+    ``min_chars`` characters are buffered. What is left in the buffer when
+    the reply ends is dropped: the final message replaces the streamed text.
+    """
+    
+    def __init__(self, send: Callable[[str], None], min_chars: int = 80, max_delay: float = 0.1,
+                 clock: Callable[[], float] = time.monotonic):
+        self.send = send
+        self.min_chars = min_chars
+        self.max_delay = max_delay
+        self._clock = clock
+        self._buffer: List[str] = []
+        self._size = 0
+        self._last_sent = float('-inf')
+    
+    def add(self, delta: str):
+        self._buffer.append(delta)
+        self._size += len(delta)
+        if self._size >= self.min_chars or self._clock() - self._last_sent >= self.max_delay:
+            self.flush()
+    
+    def flush(self):
+        if self._buffer:
+            self.send(''.join(self._buffer))
+            self._buffer, self._size = [], 0
+            self._last_sent = self._clock()
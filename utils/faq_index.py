@@ -0,0 +1,93 @@
+"""FAQ entries embedded once and matched in-process.
+
+FAQs live in ``data/faqs.json`` as ``{"id", "category", "questions", "answer"}``
+entries; every phrasing in ``questions`` gets its own row. The rows are
+L2-normalized and saved as a float16 matrix under
+``indexes/faq/<fingerprint>.npy``, keyed by the FAQ file hash and the
+embedding model, so a process only embeds the FAQs when they changed.
+Matching a query is one encode and one matrix-vector product.
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+
+from utils import embeddings
+
+DEFAULT_FAQ_PATH = 'data/faqs.json'
+DEFAULT_FAQ_INDEX_DIR = os.path.join('indexes', 'faq')
+
+logger = logging.getLogger(__name__)
+
+
+def load_faqs(path: str = DEFAULT_FAQ_PATH) -> List[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        faqs = json.load(f)
+    for faq in faqs:
+        if not faq.get('questions') or not faq.get('answer'):
+            raise ValueError(f"FAQ {faq.get('id')} needs at least one question and an answer")
+    return faqs
+
+
+class FAQIndex:
+    """Nearest-FAQ search over a persisted matrix of question embeddings."""
+    
+    def __init__(self, faqs: List[Dict[str, Any]], matrix: np.ndarray, model_name: str = embeddings.DEFAULT_MODEL_NAME):
+        self.faqs = faqs
+        self.model_name = model_name
+        # A few rows per FAQ: widened once here rather than on every query
+        self._matrix = np.asarray(matrix, dtype=np.float32)
+        # Row -> FAQ position; each FAQ has one row per phrasing
+        self._owners = np.array([i for i, faq in enumerate(faqs) for _ in faq['questions']], dtype=np.int64)
+        if len(self._owners) != len(matrix):
+            raise ValueError(f"FAQ matrix has {len(matrix)} rows for {len(self._owners)} questions")
+    
+    @staticmethod
+    def fingerprint(faq_path: str, model_name: str) -> str:
+        digest = hashlib.sha256()
+        with open(faq_path, 'rb') as f:
+            digest.update(f.read())
+        digest.update(model_name.split('/')[-1].encode('utf-8'))
+        return digest.hexdigest()[:16]
+    
+    @staticmethod
+    def _embed(faqs: List[Dict[str, Any]], model_name: str) -> np.ndarray:
+        questions = [question for faq in faqs for question in faq['questions']]
+        vectors = np.asarray(embeddings.encode(questions, model_name), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors.astype(np.float16)
+    
+    @classmethod
+    def load(cls, faq_path: str = DEFAULT_FAQ_PATH, index_dir: str = DEFAULT_FAQ_INDEX_DIR,
+             model_name: str = embeddings.DEFAULT_MODEL_NAME) -> 'FAQIndex':
+        """Open the persisted matrix for the current FAQ file, embedding it first if missing."""
+        faqs = load_faqs(faq_path)
+        matrix_path = os.path.join(index_dir, f"{cls.fingerprint(faq_path, model_name)}.npy")
+        if os.path.exists(matrix_path):
+            matrix = np.load(matrix_path, mmap_mode='r')
+        else:
+            logger.info(f"Embedding {len(faqs)} FAQs into {matrix_path}")
+            matrix = cls._embed(faqs, model_name)
+            os.makedirs(index_dir, exist_ok=True)
+            # Write then rename so concurrent workers never read a partial file
+            temporary_path = f"{matrix_path}.{os.getpid()}.tmp.npy"
+            np.save(temporary_path, matrix)
+            os.replace(temporary_path, matrix_path)
+            for name in os.listdir(index_dir):
+                if name.endswith('.npy') and name != os.path.basename(matrix_path) and '.tmp' not in name:
+                    os.remove(os.path.join(index_dir, name))
+        return cls(faqs, matrix, model_name)
+    
+    def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """Top ``k`` distinct FAQs with their best cosine similarity to the query."""
+        vector = np.asarray(embeddings.encode([query], self.model_name)[0], dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        similarities = self._matrix @ vector
+        
+        best = np.full(len(self.faqs), -1.0, dtype=np.float32)
+        np.maximum.at(best, self._owners, similarities)
+        top = np.argsort(-best)[:k]
+        return [{**self.faqs[i], 'score': float(best[i])} for i in top]
@@ -0,0 +1,290 @@
+"""Offline build of versioned vector indexes.
+
+Serving processes never embed the catalog: the index is built once by
+
+    python -m utils.index_builder [--backend chroma|numpy] [--data-dir data] [--index-root indexes]
+
+which writes ``indexes/<version>/`` with a ``manifest.json`` (source file
+hashes, embedding model and dimension, backend) and points
+``indexes/CURRENT`` at it. Workers then call :func:`open_index`, which opens
+the current index read-only and raises :class:`IndexVersionError` if it
+does not match the catalog or the embedding model.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from utils import embeddings
+from utils.data_loader import DataLoader
+from utils.faq_index import FAQIndex
+from utils.suggestion_tables import SuggestionTables
+from utils.vector_db import VectorDatabase
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+DEFAULT_INDEX_ROOT = 'indexes'
+SOURCE_FILES = ('products_rag.csv', 'services_rag.csv')
+
+logger = logging.getLogger(__name__)
+
+
+class IndexVersionError(RuntimeError):
+    """The index on disk is missing or does not match the serving process."""
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_hashes(data_dir: str) -> Dict[str, str]:
+    """SHA-256 of each catalog file the index is built from."""
+    return {name: file_sha256(os.path.join(data_dir, name)) for name in SOURCE_FILES}
+
+
+def _model_name(model_name: str) -> str:
+    return model_name.split('/')[-1]
+
+
+def _fingerprint(sources: Dict[str, str], model_name: str, backend: str, quantization: Optional[str]) -> str:
+    payload = json.dumps(
+        {'sources': sources, 'model': _model_name(model_name), 'backend': backend, 'quantization': quantization},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _write_atomic(path: str, content: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def current_version(index_root: str = DEFAULT_INDEX_ROOT) -> Optional[str]:
+    """Version name the CURRENT pointer refers to, or None."""
+    try:
+        with open(os.path.join(index_root, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(index_root: str = DEFAULT_INDEX_ROOT, version: Optional[str] = None) -> Dict[str, Any]:
+    """Load the manifest of ``version`` (default: the current index)."""
+    version = version or current_version(index_root)
+    if not version:
+        raise IndexVersionError(
+            f"No vector index found in {index_root}, build one with: python -m utils.index_builder"
+        )
+    manifest_path = os.path.join(index_root, version, MANIFEST_FILE)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise IndexVersionError(f"Index {version} has no manifest (incomplete build?)")
+    if manifest.get('manifest_version') != MANIFEST_VERSION:
+        raise IndexVersionError(
+            f"Index {version} has manifest version {manifest.get('manifest_version')}, expected {MANIFEST_VERSION}"
+        )
+    return manifest
+
+
+def build_index(data_dir: str = 'data', index_root: str = DEFAULT_INDEX_ROOT, backend: str = 'chroma',
+                quantization: str = 'int8', collection_name: str = 'hs_catering_collection',
+                model_name: str = embeddings.DEFAULT_MODEL_NAME, force: bool = False) -> Dict[str, Any]:
+    """Embed the catalog into a new versioned index and make it current.
+    
+    If the current index was already built from the same sources, model and
+    backend, it is kept as is unless ``force`` is set.
+    """
+    quantization = quantization if backend == 'numpy' else None
+    sources = source_hashes(data_dir)
+    fingerprint = _fingerprint(sources, model_name, backend, quantization)
+    
+    if not force and current_version(index_root):
+        try:
+            manifest = read_manifest(index_root)
+            if manifest.get('fingerprint') == fingerprint:
+                logger.info(f"Index {manifest['version']} is up to date")
+                return manifest
+        except IndexVersionError:
+            pass
+    
+    data_loader = DataLoader(data_dir)
+    products_df = data_loader.load_products()
+    services_df = data_loader.load_services()
+    if products_df.empty and services_df.empty:
+        raise ValueError(f"No catalog data found in {data_dir}")
+    
+    version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{fingerprint[:8]}"
+    index_dir = os.path.join(index_root, version)
+    os.makedirs(index_dir)
+    
+    vector_db = VectorDatabase(
+        persist_directory=index_dir,
+        collection_name=collection_name,
+        backend=backend,
+        quantization=quantization or 'int8',
+        embedding_model_name=model_name
+    )
+    sync_stats = vector_db.sync_collection(products_df, services_df)
+    
+    manifest = {
+        'manifest_version': MANIFEST_VERSION,
+        'version': version,
+        'fingerprint': fingerprint,
+        'created_at': datetime.now().isoformat(),
+        'backend': backend,
+        'quantization': quantization,
+        'collection_name': collection_name,
+        'embedding_model': _model_name(model_name),
+        'embedding_engine': embeddings.get_stats()['engine'],
+        'dimension': embeddings.get_embedding_model(model_name).get_sentence_embedding_dimension(),
+        'document_count': vector_db.collection.count(),
+        'sources': sources,
+        'sync': sync_stats
+    }
+    
+    # The manifest is written last: an index without one is an incomplete build
+    _write_atomic(os.path.join(index_dir, MANIFEST_FILE), json.dumps(manifest, indent=2, ensure_ascii=False))
+    _write_atomic(os.path.join(index_root, CURRENT_FILE), version)
+    logger.info(f"Built index {version} with {manifest['document_count']} documents")
+    return manifest
+
+
+def verify_manifest(manifest: Dict[str, Any], data_dir: Optional[str] = 'data', backend: Optional[str] = None,
+                    model_name: str = embeddings.DEFAULT_MODEL_NAME):
+    """Raise IndexVersionError if the index does not match the serving setup.
+    
+    Pass ``data_dir=None`` to skip the catalog hash check. The embedding
+    dimension is checked only when the model is already loaded.
+    """
+    version = manifest.get('version')
+    if manifest.get('embedding_model') != _model_name(model_name):
+        raise IndexVersionError(
+            f"Index {version} was built with {manifest.get('embedding_model')}, serving uses {_model_name(model_name)}"
+        )
+    if backend and manifest.get('backend') != backend:
+        raise IndexVersionError(f"Index {version} uses the {manifest.get('backend')} backend, expected {backend}")
+    if data_dir is not None:
+        stale = [
+            name for name, digest in source_hashes(data_dir).items()
+            if manifest.get('sources', {}).get(name) != digest
+        ]
+        if stale:
+            raise IndexVersionError(
+                f"Index {version} is stale ({', '.join(stale)} changed), rebuild it with: python -m utils.index_builder"
+            )
+    if embeddings.is_loaded(model_name):
+        dimension = embeddings.get_embedding_model(model_name).get_sentence_embedding_dimension()
+        if dimension != manifest.get('dimension'):
+            raise IndexVersionError(
+                f"Index {version} has dimension {manifest.get('dimension')}, the embedding model produces {dimension}"
+            )
+
+
+def open_index(index_root: str = DEFAULT_INDEX_ROOT, data_dir: Optional[str] = 'data', backend: Optional[str] = None,
+               model_name: str = embeddings.DEFAULT_MODEL_NAME, **kwargs) -> VectorDatabase:
+    """Open the current index read-only after checking its manifest.
+    
+    Extra keyword arguments (e.g. ``retrieval_config``) go to VectorDatabase.
+    """
+    manifest = read_manifest(index_root)
+    verify_manifest(manifest, data_dir=data_dir, backend=backend, model_name=model_name)
+    
+    try:
+        vector_db = VectorDatabase(
+            persist_directory=os.path.join(index_root, manifest['version']),
+            collection_name=manifest['collection_name'],
+            backend=manifest['backend'],
+            quantization=manifest.get('quantization') or 'int8',
+            embedding_model_name=model_name,
+            read_only=True,
+            **kwargs
+        )
+    except Exception as e:
+        raise IndexVersionError(f"Could not open index {manifest['version']}: {e}")
+    
+    if vector_db.collection.count() != manifest['document_count']:
+        raise IndexVersionError(
+            f"Index {manifest['version']} holds {vector_db.collection.count()} documents, "
+            f"manifest says {manifest['document_count']}"
+        )
+    vector_db.manifest = manifest
+    return vector_db
+
+
+def prune_indexes(index_root: str = DEFAULT_INDEX_ROOT, keep: int = 2) -> int:
+    """Delete old index versions, keeping the current one and the ``keep`` most recent.
+    
+    Only directories with a manifest are versions: ``faq/`` and
+    ``suggestions/`` live next to them, and a build in progress has no
+    manifest yet.
+    """
+    current = current_version(index_root)
+    versions = sorted(
+        name for name in os.listdir(index_root)
+        if os.path.isfile(os.path.join(index_root, name, MANIFEST_FILE))
+    )
+    stale = [name for name in versions[:max(len(versions) - keep, 0)] if name != current]
+    for name in stale:
+        shutil.rmtree(os.path.join(index_root, name))
+    return len(stale)
+
+
+def main():
+    try:
+        with open('config.json', 'r', encoding='utf-8') as f:
+            chroma_config = json.load(f).get('chroma_config', {})
+    except (OSError, ValueError):
+        chroma_config = {}
+    
+    parser = argparse.ArgumentParser(description="Build the versioned vector index used by the web workers")
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--index-root', default=chroma_config.get('index_root', DEFAULT_INDEX_ROOT))
+    parser.add_argument('--backend', default=chroma_config.get('backend', 'chroma'), choices=VectorDatabase.BACKENDS)
+    parser.add_argument('--quantization', default=chroma_config.get('quantization', 'int8'))
+    parser.add_argument('--collection', default=chroma_config.get('collection_name', 'hs_catering_collection'))
+    parser.add_argument('--model', default=chroma_config.get('embedding_model', embeddings.DEFAULT_MODEL_NAME))
+    parser.add_argument('--force', action='store_true', help="rebuild even if the current index is up to date")
+    parser.add_argument('--keep', type=int, default=2, help="number of old versions to keep")
+    parser.add_argument('--verify', action='store_true', help="only check the current index against the catalog")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    
+    if args.verify:
+        manifest = read_manifest(args.index_root)
+        verify_manifest(manifest, data_dir=args.data_dir, backend=args.backend, model_name=args.model)
+        print(f"Index {manifest['version']} is up to date")
+        return
+    
+    manifest = build_index(
+        data_dir=args.data_dir,
+        index_root=args.index_root,
+        backend=args.backend,
+        quantization=args.quantization,
+        collection_name=args.collection,
+        model_name=args.model,
+        force=args.force
+    )
+    pruned = prune_indexes(args.index_root, keep=args.keep)
+    # The FAQ matrix is small and keyed by its own fingerprint, so it is simply refreshed here
+    faq_index = FAQIndex.load(os.path.join(args.data_dir, 'faqs.json'), os.path.join(args.index_root, 'faq'), model_name=args.model)
+    # Same for the suggestion tables, keyed by the products file
+    suggestions = SuggestionTables.load(args.data_dir, os.path.join(args.index_root, 'suggestions'))
+    print(json.dumps({**manifest, 'pruned_versions': pruned, 'faqs': len(faq_index.faqs),
+                      'suggestion_tables': len(suggestions.tables)}, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
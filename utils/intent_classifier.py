@@ -0,0 +1,110 @@
+"""In-process intent classifier for customer messages.
+
+Nearest-centroid over TF-IDF weighted, hashed word and character n-gram
+features, trained at load time from ``data/intent_examples.json``. A
+prediction is a handful of dictionary lookups and one small dot product,
+so it runs in a fraction of a millisecond and needs no model download.
+"""
+import json
+import math
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from utils.entity_extractors import extract_entities
+from utils.lexical_index import fold_text
+
+INTENTS = ('information', 'commande', 'suggestion', 'prix', 'disponibilité', 'autre')
+DEFAULT_EXAMPLES_PATH = 'data/intent_examples.json'
+
+
+def _features(text: str) -> Counter:
+    """Word unigrams, bigrams and character trigrams of the folded text."""
+    words = fold_text(text).split()
+    features = Counter(f"w:{word}" for word in words)
+    features.update(f"b:{first}_{second}" for first, second in zip(words, words[1:]))
+    for word in words:
+        padded = f"#{word}#"
+        features.update(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return features
+
+
+class IntentClassifier:
+    """Nearest-centroid intent classifier with a softmax confidence."""
+    
+    def __init__(self, examples: Dict[str, List[str]], dimensions: int = 1 << 14, temperature: float = 0.05):
+        self.dimensions = dimensions
+        self.temperature = temperature
+        self.intents = [intent for intent in INTENTS if examples.get(intent)]
+        
+        # Inverse document frequency of each hashed feature over the training examples
+        samples = [(intent, self._hash(_features(text))) for intent in self.intents for text in examples[intent]]
+        document_frequency = Counter(index for _, hashed in samples for index in hashed)
+        self._idf = {index: math.log((1 + len(samples)) / (1 + count)) + 1.0 for index, count in document_frequency.items()}
+        
+        centroids = np.zeros((len(self.intents), dimensions), dtype=np.float32)
+        for intent, hashed in samples:
+            indices, weights = self._vectorize(hashed)
+            centroids[self.intents.index(intent), indices] += weights
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self._centroids = centroids / np.maximum(norms, 1e-12)
+    
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_EXAMPLES_PATH, **kwargs) -> 'IntentClassifier':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), **kwargs)
+    
+    def _hash(self, features: Counter) -> Counter:
+        hashed = Counter()
+        for feature, count in features.items():
+            hashed[zlib.crc32(feature.encode('utf-8')) % self.dimensions] += count
+        return hashed
+    
+    def _vectorize(self, hashed: Counter) -> Tuple[np.ndarray, np.ndarray]:
+        """Sparse L2-normalized TF-IDF vector as (indices, weights); unseen features are ignored."""
+        pairs = [(index, (1.0 + math.log(count)) * self._idf[index]) for index, count in hashed.items() if index in self._idf]
+        if not pairs:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        indices = np.fromiter((index for index, _ in pairs), dtype=np.int64, count=len(pairs))
+        weights = np.fromiter((weight for _, weight in pairs), dtype=np.float32, count=len(pairs))
+        return indices, weights / np.linalg.norm(weights)
+    
+    def scores(self, text: str) -> Dict[str, float]:
+        """Softmax probability of each intent."""
+        indices, weights = self._vectorize(self._hash(_features(text)))
+        if not len(indices):
+            return {intent: (1.0 if intent == 'autre' else 0.0) for intent in self.intents}
+        similarities = self._centroids[:, indices] @ weights
+        exponents = np.exp((similarities - similarities.max()) / self.temperature)
+        probabilities = exponents / exponents.sum()
+        return dict(zip(self.intents, probabilities.tolist()))
+    
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Most likely intent and its confidence."""
+        scores = self.scores(text)
+        intent = max(scores, key=scores.get)
+        return intent, scores[intent]
+    
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Intent, entities and urgency in the shape PromptEngineer.extract_intent returns."""
+        intent, confidence = self.predict(text)
+        entities = extract_entities(text)
+        urgency = entities.pop('urgence')
+        return {
+            'intent': intent,
+            'entities': entities,
+            'urgence': urgency,
+            'confidence': confidence
+        }
+
+
+_classifiers: Dict[str, IntentClassifier] = {}
+
+
+def get_intent_classifier(path: str = DEFAULT_EXAMPLES_PATH) -> IntentClassifier:
+    """Process-wide classifier trained from an examples file."""
+    if path not in _classifiers:
+        _classifiers[path] = IntentClassifier.from_file(path)
+    return _classifiers[path]
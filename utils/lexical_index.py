@@ -0,0 +1,164 @@
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Frequent French words that carry no retrieval signal
+STOPWORDS = {
+    'a', 'au', 'aux', 'avec', 'ce', 'ces', 'combien', 'd', 'dans', 'de', 'des', 'du', 'elle', 'en', 'est',
+    'et', 'il', 'je', 'l', 'la', 'le', 'les', 'leur', 'mais', 'me', 'mon', 'ne', 'nous', 'ou', 'par',
+    'pas', 'pour', 'qu', 'que', 'qui', 's', 'sa', 'se', 'ses', 'son', 'sur', 'ta', 'te', 'tu', 'un',
+    'une', 'vos', 'votre', 'vous', 'y'
+}
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def fold_text(text: Any) -> str:
+    """Lowercase, strip accents and collapse punctuation to single spaces."""
+    decomposed = unicodedata.normalize('NFKD', str(text).lower())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(' ', stripped).strip()
+
+
+def tokenize(text: Any) -> List[str]:
+    """Tokenize text into accent-folded terms without stopwords."""
+    return [token for token in fold_text(text).split() if token not in STOPWORDS]
+
+
+def metadata_matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Check a metadata dict against a Chroma-style where clause."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(metadata_matches(metadata, clause) for clause in condition):
+                return False
+            continue
+        if key == '$or':
+            if not any(metadata_matches(metadata, clause) for clause in condition):
+                return False
+            continue
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        value = metadata.get(key)
+        for operator, expected in condition.items():
+            if operator == '$eq':
+                matched = value == expected
+            elif operator == '$ne':
+                matched = value != expected
+            elif operator == '$in':
+                matched = value in expected
+            elif operator == '$nin':
+                matched = value not in expected
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                matched = False
+            elif operator == '$gt':
+                matched = value > expected
+            elif operator == '$gte':
+                matched = value >= expected
+            elif operator == '$lt':
+                matched = value < expected
+            elif operator == '$lte':
+                matched = value <= expected
+            else:
+                raise ValueError(f"Unsupported where operator: {operator}")
+            if not matched:
+                return False
+    return True
+
+
+def reciprocal_rank_fusion(rankings: List[Tuple[List[str], float]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists with weighted reciprocal rank fusion.
+    
+    Each ranking is an ``(ids, weight)`` pair; an id at rank ``r`` (1-based)
+    contributes ``weight / (k + r)``.
+    """
+    scores = defaultdict(float)
+    for ids, weight in rankings:
+        for rank, doc_id in enumerate(ids, start=1):
+            scores[doc_id] += weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """In-process Okapi BM25 index over the catalog documents."""
+    
+    # Names shorter than this many tokens are too generic for exact matching
+    MIN_NAME_TOKENS = 2
+    
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+                 k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = [metadata or {} for metadata in metadatas]
+        
+        self._term_freqs = []
+        self._lengths = []
+        document_freqs = Counter()
+        postings = defaultdict(list)
+        for position, document in enumerate(self.documents):
+            term_freqs = Counter(tokenize(document))
+            self._term_freqs.append(term_freqs)
+            self._lengths.append(sum(term_freqs.values()))
+            for term in term_freqs:
+                document_freqs[term] += 1
+                postings[term].append(position)
+        
+        count = len(self.documents)
+        self._average_length = (sum(self._lengths) / count) if count else 0.0
+        self._idf = {
+            term: math.log(1.0 + (count - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_freqs.items()
+        }
+        self._postings = dict(postings)
+        
+        # Folded product names, used to short-circuit exact name queries
+        self._names = defaultdict(list)
+        for position, metadata in enumerate(self.metadatas):
+            if metadata.get('type') != 'product':
+                continue
+            name = fold_text(metadata.get('name', ''))
+            if len(name.split()) >= self.MIN_NAME_TOKENS:
+                self._names[name].append(position)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def search(self, query: str, n_results: int = 10, where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """Return ``(position, score)`` pairs for the best BM25 matches."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for position in self._postings[term]:
+                freq = self._term_freqs[position][term]
+                norm = 1.0 - self.b + self.b * self._lengths[position] / (self._average_length or 1.0)
+                scores[position] += idf * freq * (self.k1 + 1.0) / (freq + self.k1 * norm)
+        
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if where:
+            ranked = [item for item in ranked if metadata_matches(self.metadatas[item[0]], where)]
+        return ranked[:n_results]
+    
+    def exact_name_matches(self, query: str, where: Optional[Dict[str, Any]] = None) -> List[int]:
+        """Positions of products whose full name appears in the query.
+        
+        Only the longest matching name is kept, so "Buffet de soutenance Chic
+        entre 40 et 50 personnes" does not also match shorter prefixes.
+        """
+        folded = f" {fold_text(query)} "
+        best_name = None
+        for name in self._names:
+            if f" {name} " in folded and (best_name is None or len(name) > len(best_name)):
+                best_name = name
+        if best_name is None:
+            return []
+        return [
+            position for position in self._names[best_name]
+            if metadata_matches(self.metadatas[position], where)
+        ]
@@ -0,0 +1,495 @@
+"""Deadline-bounded calls to the LLM upstream.
+
+Every call goes through a shared :class:`LLMClient` (one per upstream, see
+:func:`get_llm_client`) which adds:
+
+- a per-call deadline covering retries and hedges, so a handler never
+  waits longer than ``deadline_seconds`` for the model;
+- retries with full-jitter exponential backoff, only for retryable errors
+  (timeouts, 429 and 5xx);
+- an optional hedged duplicate request, sent when the first one is slower
+  than the recent p95 latency; the first successful answer wins;
+- a circuit breaker that fails fast with :class:`CircuitOpenError` after
+  repeated failures, so callers can answer from a cache or a fast path
+  instead of waiting on an unhealthy upstream;
+- admission through a :class:`~utils.llm_scheduler.LLMScheduler`, which
+  enforces the requests/min and tokens/min quotas in priority order and
+  sheds low-priority work with :class:`LLMShedError`;
+- a cap on requests in flight: an abandoned request keeps its worker until
+  the upstream returns, so callers pass ``request_timeout`` (e.g.
+  :func:`sdk_timeout`) to bound it, and new calls fail fast with
+  :class:`LLMSaturatedError` rather than queue behind abandoned ones.
+
+The client wraps any callable, so a local stub model can stand in for the
+real API (see ``benchmarks/bench_llm_client.py``).
+"""
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from utils.llm_scheduler import PRIORITY_NORMAL, LLMScheduler, RequestShedError, Ticket
+from utils.prompt_packer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses and exception names (google.api_core and builtins) worth retrying
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    'TimeoutError', 'ConnectionError', 'ConnectionResetError', 'LLMTimeoutError',
+    'DeadlineExceeded', 'ServiceUnavailable', 'ResourceExhausted', 'InternalServerError',
+    'TooManyRequests', 'GatewayTimeout', 'BadGateway', 'RetryError'
+}
+
+_STREAM_END = object()
+
+
+class LLMError(RuntimeError):
+    """The LLM call failed after retries."""
+
+
+class LLMTimeoutError(LLMError):
+    """The call did not complete before its deadline."""
+
+
+class CircuitOpenError(LLMError):
+    """The upstream is considered unhealthy; the call was not attempted."""
+
+
+class LLMShedError(LLMError):
+    """The scheduler refused the call to protect the quota for higher priorities."""
+
+
+class LLMSaturatedError(LLMError):
+    """Every worker is busy with requests in flight; the call was not attempted."""
+
+
+def sdk_timeout(remaining: float) -> Dict[str, Any]:
+    """``request_timeout`` for google-generativeai calls: the SDK's own timeout for the time left."""
+    return {'request_options': {'timeout': remaining}}
+
+
+def is_retryable(error: BaseException) -> bool:
+    code = getattr(error, 'code', None)
+    code = getattr(code, 'value', code)
+    if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+        return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over consecutive failures.
+    
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are rejected for ``reset_timeout`` seconds; then a single trial call
+    is let through and its outcome closes or re-opens the circuit.
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+    
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+    
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+    
+    def release(self):
+        """Give back a half-open trial that was never sent."""
+        with self._lock:
+            self._trial_in_flight = False
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    logger.warning(f"LLM circuit opened after {self._failures} consecutive failures")
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for the hedge delay and reporting."""
+    
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._samples)
+    
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+        return ordered[rank]
+
+
+class LLMClient:
+    """Deadlines, jittered retries, hedging and a circuit breaker around model calls."""
+    
+    def __init__(self, name: str = 'llm', deadline_seconds: float = 20.0, max_retries: int = 2,
+                 backoff_seconds: float = 0.3, max_backoff_seconds: float = 2.0,
+                 hedge: bool = True, hedge_min_delay: float = 1.0, hedge_min_samples: int = 20,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, max_workers: int = 16,
+                 max_in_flight: Optional[int] = None, expected_output_tokens: int = 400,
+                 scheduler: Optional[LLMScheduler] = None):
+        self.name = name
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.scheduler = scheduler
+        # Charged to the tokens/min budget on top of the prompt until the real usage is known
+        self.expected_output_tokens = expected_output_tokens
+        self.latencies = LatencyTracker()
+        # Blocking SDK calls run here so the caller can stop waiting at the deadline
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-call")
+        # Requests submitted and not finished, abandoned ones included; never more than the workers
+        self.max_in_flight = min(max_in_flight or max_workers, max_workers)
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._counters = {
+            'calls': 0, 'successes': 0, 'failures': 0, 'timeouts': 0, 'retries': 0,
+            'hedges': 0, 'hedge_wins': 0, 'rejected': 0, 'shed': 0, 'saturated': 0, 'fallbacks': 0
+        }
+        self._counters_lock = threading.Lock()
+    
+    @classmethod
+    def from_config(cls, name: str = 'llm', config_path: str = 'config.json',
+                    scheduler: Optional[LLMScheduler] = None) -> 'LLMClient':
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                settings = json.load(f).get('llm_client', {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read llm_client settings from {config_path}: {e}")
+            settings = {}
+        return cls(name=name, scheduler=scheduler, **settings)
+    
+    def _count(self, counter: str, amount: int = 1):
+        with self._counters_lock:
+            self._counters[counter] += amount
+    
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging: the recent p95, once enough calls were observed."""
+        if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latencies.percentile(95))
+    
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * (2 ** attempt)))
+    
+    def _admit(self, priority: int, tokens: Optional[int], args, deadline: float) -> Optional[Ticket]:
+        """Wait for the scheduler to admit one upstream request."""
+        if self.scheduler is None:
+            return None
+        if tokens is None:
+            prompt = args[0] if args else ''
+            if isinstance(prompt, list):
+                # Multi-turn contents: [{'role': ..., 'parts': [text, ...]}, ...]
+                prompt = ' '.join(str(part) for turn in prompt if isinstance(turn, dict) for part in turn.get('parts', []))
+            tokens = estimate_tokens(prompt if isinstance(prompt, str) else '') + self.expected_output_tokens
+        try:
+            return self.scheduler.acquire(priority, tokens, timeout=max(0.0, deadline - time.monotonic()))
+        except RequestShedError as e:
+            self.breaker.release()
+            self._count('shed')
+            raise LLMShedError(str(e)) from e
+    
+    def _release_slot(self, _future=None):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+    
+    def _submit(self, func: Callable[..., Any], args, kwargs, deadline: float,
+                request_timeout: Optional[Callable[[float], Dict[str, Any]]] = None):
+        """Run ``func`` on a worker, with the upstream's own timeout set to the time left."""
+        with self._in_flight_lock:
+            if self._in_flight >= self.max_in_flight:
+                raise LLMSaturatedError(f"{self.name} has {self._in_flight} requests in flight")
+            self._in_flight += 1
+        if request_timeout is not None:
+            kwargs = {**kwargs, **request_timeout(max(0.1, deadline - time.monotonic()))}
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._release_slot()
+            raise
+        future.add_done_callback(self._release_slot)
+        return future
+    
+    @staticmethod
+    def _usage_tokens(result: Any) -> Optional[int]:
+        usage = getattr(result, 'usage_metadata', None)
+        return getattr(usage, 'total_token_count', None) or None
+    
+    def _attempt(self, func: Callable[..., Any], args, kwargs, deadline: float, ticket: Optional[Ticket] = None,
+                 request_timeout: Optional[Callable[[float], Dict[str, Any]]] = None) -> Any:
+        """One attempt, hedged after the p95 delay; the first success wins."""
+        started = time.monotonic()
+        futures = {self._submit(func, args, kwargs, deadline, request_timeout): False}
+        hedge_at = self.hedge_delay()
+        error = None
+        
+        while futures:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = remaining
+            if hedge_at is not None and len(futures) == 1:
+                timeout = min(remaining, max(0.0, started + hedge_at - time.monotonic()))
+            done, _ = wait(list(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+            
+            if not done:
+                # A hedge is only sent when a worker is free and the quota has room for it right now
+                if (hedge_at is not None and len(futures) == 1 and time.monotonic() < deadline
+                        and self._in_flight < self.max_in_flight and self.breaker.allow()
+                        and (ticket is None or self.scheduler.try_acquire(ticket.priority, ticket.tokens))):
+                    try:
+                        futures[self._submit(func, args, kwargs, deadline, request_timeout)] = True
+                        self._count('hedges')
+                    except LLMSaturatedError:
+                        self.breaker.release()
+                    hedge_at = None
+                continue
+            
+            for future in done:
+                hedged = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                self.latencies.add(time.monotonic() - started)
+                if hedged:
+                    self._count('hedge_wins')
+                for other in futures:
+                    other.cancel()
+                return result
+            # The only failure so far may still be beaten by the other request
+            if not futures:
+                raise error
+        
+        # Abandoned requests finish in the background (bounded by request_timeout); their results are dropped
+        for future in futures:
+            future.cancel()
+        raise LLMTimeoutError(f"{self.name} call exceeded its deadline")
+    
+    def call(self, func: Callable[..., Any], *args, deadline_seconds: Optional[float] = None,
+             fallback: Optional[Callable[[Exception], Any]] = None, priority: int = PRIORITY_NORMAL,
+             tokens: Optional[int] = None, downgrade: Optional[Dict[str, Any]] = None,
+             request_timeout: Optional[Callable[[float], Dict[str, Any]]] = None, **kwargs) -> Any:
+        """Call ``func(*args, **kwargs)`` within the deadline.
+        
+        ``priority`` and ``tokens`` (estimated from the prompt if omitted) are
+        used for admission; ``downgrade`` holds keyword overrides applied when
+        the scheduler asks for cheaper work (e.g. a smaller generation_config).
+        ``request_timeout`` maps the seconds left to keyword arguments that
+        make ``func`` itself give up by then (see :func:`sdk_timeout`).
+        Raises :class:`LLMError` (or returns ``fallback(error)`` if given) when
+        the circuit is open, the call is shed, the deadline passes or the
+        retries are exhausted.
+        """
+        self._count('calls')
+        deadline = time.monotonic() + (deadline_seconds or self.deadline_seconds)
+        try:
+            if not self.breaker.allow():
+                self._count('rejected')
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            
+            attempt = 0
+            while True:
+                ticket = self._admit(priority, tokens, args, deadline)
+                call_kwargs = {**kwargs, **downgrade} if downgrade and ticket is not None and ticket.degraded else kwargs
+                try:
+                    result = self._attempt(func, args, call_kwargs, deadline, ticket, request_timeout)
+                except LLMSaturatedError:
+                    # Not an upstream failure: the breaker is left alone and the tokens are given back
+                    self._count('saturated')
+                    self.breaker.release()
+                    if ticket is not None:
+                        ticket.settle(0)
+                    raise
+                except Exception as e:
+                    if isinstance(e, LLMTimeoutError):
+                        self._count('timeouts')
+                    self.breaker.record_failure()
+                    pause = self._backoff(attempt)
+                    if (attempt >= self.max_retries or not is_retryable(e)
+                            or time.monotonic() + pause >= deadline or not self.breaker.allow()):
+                        raise e if isinstance(e, LLMError) else LLMError(f"{self.name} call failed: {e}") from e
+                    attempt += 1
+                    self._count('retries')
+                    logger.info("Retrying %s call in %.2fs after: %s", self.name, pause, e)
+                    time.sleep(pause)
+                    continue
+                self.breaker.record_success()
+                self._count('successes')
+                if ticket is not None:
+                    ticket.settle(self._usage_tokens(result))
+                return result
+        except LLMError as e:
+            self._count('failures')
+            if fallback is None:
+                raise
+            self._count('fallbacks')
+            logger.info("Using fallback answer: %s", e)
+            return fallback(e)
+    
+    def stream(self, func: Callable[..., Iterable[Any]], *args, deadline_seconds: Optional[float] = None,
+               priority: int = PRIORITY_NORMAL, tokens: Optional[int] = None,
+               downgrade: Optional[Dict[str, Any]] = None,
+               request_timeout: Optional[Callable[[float], Dict[str, Any]]] = None, **kwargs) -> Iterator[Any]:
+        """Iterate a streaming call within the deadline, in the caller's thread.
+        
+        The upstream iterator is consumed by a worker thread, so a stalled
+        stream raises :class:`LLMTimeoutError` at the deadline. Streams are
+        never hedged, and only retried while nothing has been yielded yet.
+        Each attempt's ticket is settled with the usage reported by the last
+        chunk, whether the stream ends or fails.
+        """
+        self._count('calls')
+        deadline = time.monotonic() + (deadline_seconds or self.deadline_seconds)
+        if not self.breaker.allow():
+            self._count('rejected')
+            self._count('failures')
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        
+        attempt = 0
+        while True:
+            try:
+                ticket = self._admit(priority, tokens, args, deadline)
+            except LLMShedError:
+                self._count('failures')
+                raise
+            call_kwargs = {**kwargs, **downgrade} if downgrade and ticket is not None and ticket.degraded else kwargs
+            if request_timeout is not None:
+                call_kwargs = {**call_kwargs, **request_timeout(max(0.1, deadline - time.monotonic()))}
+            items = queue.Queue()
+            
+            def produce():
+                try:
+                    for item in func(*args, **call_kwargs):
+                        items.put((True, item))
+                    items.put((True, _STREAM_END))
+                except Exception as e:
+                    items.put((False, e))
+            
+            started = time.monotonic()
+            yielded = False
+            usage = None
+            try:
+                self._submit(produce, (), {}, deadline)
+                while True:
+                    try:
+                        ok, item = items.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        self._count('timeouts')
+                        raise LLMTimeoutError(f"{self.name} stream exceeded its deadline")
+                    if not ok:
+                        raise item
+                    if item is _STREAM_END:
+                        break
+                    yielded = True
+                    usage = self._usage_tokens(item) or usage
+                    yield item
+            except LLMSaturatedError:
+                self._count('saturated')
+                self._count('failures')
+                self.breaker.release()
+                usage = 0
+                raise
+            except Exception as e:
+                self.breaker.record_failure()
+                pause = self._backoff(attempt)
+                if (yielded or attempt >= self.max_retries or not is_retryable(e)
+                        or time.monotonic() + pause >= deadline or not self.breaker.allow()):
+                    self._count('failures')
+                    raise e if isinstance(e, LLMError) else LLMError(f"{self.name} stream failed: {e}") from e
+                attempt += 1
+                self._count('retries')
+                time.sleep(pause)
+                continue
+            finally:
+                # Also runs when the caller stops iterating early
+                if ticket is not None:
+                    ticket.settle(usage)
+            self.latencies.add(time.monotonic() - started)
+            self.breaker.record_success()
+            self._count('successes')
+            return
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {
+            'name': self.name,
+            'circuit': self.breaker.state,
+            **counters,
+            'latency_p50_s': self.latencies.percentile(50),
+            'latency_p95_s': self.latencies.percentile(95),
+            'latency_p99_s': self.latencies.percentile(99),
+            'hedge_delay_s': self.hedge_delay()
+        }
+
+
+_clients: Dict[str, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(name: str = 'gemini', config_path: str = 'config.json') -> LLMClient:
+    """Client shared by every caller of one upstream, so they share its breaker, quota and latency stats."""
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = LLMClient.from_config(name, config_path, scheduler=LLMScheduler.from_config(config_path))
+        return _clients[name]
+
+
+def get_all_stats() -> Dict[str, Any]:
+    return {
+        name: {**client.get_stats(), 'scheduler': client.scheduler.get_stats() if client.scheduler else None}
+        for name, client in _clients.items()
+    }
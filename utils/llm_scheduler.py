@@ -0,0 +1,186 @@
+"""Priority admission of LLM requests under requests/min and tokens/min quotas.
+
+Two token buckets (requests and tokens) refill continuously at the
+configured per-minute rates. Requests wait in a priority queue and only the
+head of the queue may draw from the buckets, so a customer in the middle
+of an order is never stuck behind browsing questions. When the quota runs
+low, lower-priority work is downgraded (the caller shrinks its output) or
+shed with :class:`RequestShedError` instead of pushing everyone into
+upstream quota errors.
+
+Settings come from ``config.json`` under ``llm_scheduler``.
+"""
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0      # order in progress or qualified lead
+PRIORITY_NORMAL = 1    # regular chat answers
+PRIORITY_LOW = 2       # background work the caller can do without (intent extraction, rephrasing)
+PRIORITY_NAMES = {'high': PRIORITY_HIGH, 'normal': PRIORITY_NORMAL, 'low': PRIORITY_LOW}
+# How long a qualified lead keeps the high priority after its last question was answered
+QUALIFIED_LEAD_PRIORITY_SECONDS = 1800
+
+
+class RequestShedError(RuntimeError):
+    """The request was not admitted within its priority's wait budget."""
+
+
+def session_priority(user_context: Optional[Dict[str, Any]], now: Optional[float] = None) -> int:
+    """High priority for sessions with an order in progress or a recently qualified lead."""
+    user_context = user_context or {}
+    if user_context.get('order_in_progress'):
+        return PRIORITY_HIGH
+    lead = user_context.get('lead') or {}
+    if lead.get('complete') and lead.get('completed_at'):
+        now = time.time() if now is None else now
+        if now - lead['completed_at'] < QUALIFIED_LEAD_PRIORITY_SECONDS:
+            return PRIORITY_HIGH
+    return PRIORITY_NORMAL
+
+
+class TokenBucket:
+    """Bucket of ``capacity`` units refilled at ``per_minute`` units per minute."""
+    
+    def __init__(self, per_minute: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+    
+    def refill(self):
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` units are available (0 if they are now)."""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate) if self.rate > 0 else (0.0 if missing <= 0 else float('inf'))
+    
+    @property
+    def fill_ratio(self) -> float:
+        return self.level / self.capacity if self.capacity else 0.0
+
+
+class Ticket:
+    """Admission of one upstream request; ``settle`` charges the real token usage."""
+    
+    def __init__(self, scheduler: 'LLMScheduler', priority: int, tokens: int, degraded: bool):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.tokens = tokens
+        self.degraded = degraded
+    
+    def settle(self, actual_tokens: Optional[int]):
+        if actual_tokens is not None:
+            self.scheduler._adjust_tokens(self.tokens - actual_tokens)
+
+
+class LLMScheduler:
+    """Token-bucket rate limiter with a priority queue, downgrading and shedding."""
+    
+    def __init__(self, requests_per_minute: float = 60, tokens_per_minute: float = 120000,
+                 max_wait_seconds: Optional[Dict[str, float]] = None, downgrade_below: float = 0.3,
+                 max_queue: int = 50, clock: Callable[[], float] = time.monotonic):
+        self.requests = TokenBucket(requests_per_minute, clock=clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock=clock)
+        # How long each priority may queue before being shed; low priority never waits by default
+        waits = {'high': 20.0, 'normal': 5.0, 'low': 0.0, **(max_wait_seconds or {})}
+        self.max_wait = {PRIORITY_NAMES[name]: float(seconds) for name, seconds in waits.items()}
+        # Below this share of either bucket, non-high priority requests are downgraded
+        self.downgrade_below = downgrade_below
+        self.max_queue = max_queue
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._counters = {'admitted': 0, 'downgraded': 0, 'shed': 0}
+    
+    @classmethod
+    def from_config(cls, config_path: str = 'config.json') -> 'LLMScheduler':
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                settings = json.load(f).get('llm_scheduler', {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read llm_scheduler settings from {config_path}: {e}")
+            settings = {}
+        return cls(**settings)
+    
+    def _adjust_tokens(self, amount: float):
+        with self._cond:
+            self.tokens.refill()
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + amount)
+            self._cond.notify_all()
+    
+    def _try_take(self, tokens: int) -> float:
+        """Take one request and ``tokens`` tokens if available; else the seconds to wait."""
+        self.requests.refill()
+        self.tokens.refill()
+        wait_for = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        if wait_for == 0:
+            self.requests.level -= 1
+            self.tokens.level -= min(tokens, self.tokens.capacity)
+        return wait_for
+    
+    def _admit(self, priority: int, tokens: int) -> Ticket:
+        degraded = priority != PRIORITY_HIGH and min(self.requests.fill_ratio, self.tokens.fill_ratio) < self.downgrade_below
+        self._counters['admitted'] += 1
+        self._counters['downgraded'] += degraded
+        return Ticket(self, priority, tokens, degraded)
+    
+    def _shed(self, priority: int, reason: str):
+        self._counters['shed'] += 1
+        raise RequestShedError(f"LLM request (priority {priority}) shed: {reason}")
+    
+    def try_acquire(self, priority: int = PRIORITY_NORMAL, tokens: int = 0) -> Optional[Ticket]:
+        """Admit immediately if nobody is queued and the quota allows it, else None."""
+        with self._cond:
+            if self._queue or self._try_take(tokens) > 0:
+                return None
+            return self._admit(priority, tokens)
+    
+    def acquire(self, priority: int = PRIORITY_NORMAL, tokens: int = 0, timeout: Optional[float] = None) -> Ticket:
+        """Wait for admission in priority order; raises RequestShedError past the wait budget."""
+        max_wait = self.max_wait.get(priority, 0.0)
+        deadline = self._clock() + (min(max_wait, timeout) if timeout is not None else max_wait)
+        with self._cond:
+            if len(self._queue) >= self.max_queue and priority != PRIORITY_HIGH:
+                self._shed(priority, "queue full")
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    wait_for = None
+                    if self._queue[0] == entry:
+                        wait_for = self._try_take(tokens)
+                        if wait_for == 0:
+                            return self._admit(priority, tokens)
+                    remaining = deadline - self._clock()
+                    # Shed now rather than time out later when the quota cannot free up in time
+                    if remaining <= 0 or (wait_for is not None and wait_for > remaining):
+                        self._shed(priority, f"quota exhausted for {wait_for or remaining:.1f}s")
+                    self._cond.wait(min(remaining, wait_for) if wait_for else remaining)
+            finally:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                self._cond.notify_all()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            self.requests.refill()
+            self.tokens.refill()
+            return {
+                **self._counters,
+                'queued': len(self._queue),
+                'requests_available': round(self.requests.level, 2),
+                'tokens_available': round(self.tokens.level)
+            }
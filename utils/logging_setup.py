@@ -0,0 +1,162 @@
+"""Non-blocking logging for the request path.
+
+:func:`setup_logging` replaces the root handlers with a queue handler: the
+request thread only checks the level, applies the sampling and request-id
+filters and enqueues the record. A background listener formats (the
+``%``-style arguments are only interpolated there) and writes it, as text
+or as one JSON object per line.
+
+Per-logger sampling keeps one in ``1/rate`` INFO/DEBUG records of noisy
+loggers; warnings and errors are never sampled. Settings come from
+``config.json`` under ``logging_config`` and can be overridden with
+``LOG_LEVEL`` and ``LOG_FORMAT=json``.
+"""
+import atexit
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+_request_id: contextvars.ContextVar = contextvars.ContextVar('request_id', default='-')
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def set_request_id(request_id: Optional[str] = None) -> str:
+    """Tag the log records of the current context (a new id if none is given)."""
+    request_id = request_id or uuid.uuid4().hex[:12]
+    _request_id.set(request_id)
+    return request_id
+
+
+def get_request_id() -> str:
+    return _request_id.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """Copies the context's request id onto the record, in the caller's thread."""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in ``1/rate`` records below WARNING for the configured loggers.
+    
+    ``rates`` maps logger names to a keep rate in (0, 1]; a name also covers
+    its child loggers, the longest configured prefix wins.
+    """
+    
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates = {name: float(rate) for name, rate in (rates or {}).items()}
+        self._every: Dict[str, int] = {}
+        self._counters: Dict[str, itertools.count] = {}
+        self.dropped = 0
+    
+    def _keep_every(self, name: str) -> int:
+        every = self._every.get(name)
+        if every is None:
+            prefix = max((configured for configured in self.rates
+                          if name == configured or name.startswith(configured + '.')), key=len, default=None)
+            rate = self.rates[prefix] if prefix is not None else 1.0
+            every = self._every[name] = max(1, round(1.0 / rate)) if rate > 0 else 0
+            self._counters[name] = itertools.count()
+        return every
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        every = self._keep_every(record.name)
+        # itertools.count is atomic under the GIL, no lock needed
+        if every and next(self._counters[record.name]) % every == 0:
+            return True
+        self.dropped += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request id and message."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues the record as is; the stdlib handler would format it in the caller."""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def load_settings(config_path: str = 'config.json') -> Dict:
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('logging_config', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def setup_logging(level: Optional[str] = None, json_output: Optional[bool] = None,
+                  sampling: Optional[Dict[str, float]] = None, stream=None,
+                  config_path: str = 'config.json') -> logging.handlers.QueueListener:
+    """Route all logging through a queue drained by a background writer thread.
+    
+    Arguments left to None come from ``logging_config`` (and the ``LOG_LEVEL``
+    / ``LOG_FORMAT`` environment variables). Calling it again reconfigures.
+    """
+    global _listener
+    settings = load_settings(config_path)
+    level = (level or os.getenv('LOG_LEVEL') or settings.get('level', 'INFO')).upper()
+    if json_output is None:
+        json_output = os.getenv('LOG_FORMAT', 'json' if settings.get('json') else 'text').lower() == 'json'
+    sampling = sampling if sampling is not None else settings.get('sampling', {})
+    
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JsonFormatter() if json_output else logging.Formatter(TEXT_FORMAT))
+    
+    records = queue.SimpleQueue()
+    handler = _LazyQueueHandler(records)
+    handler.addFilter(SamplingFilter(sampling))
+    handler.addFilter(RequestIdFilter())
+    
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    
+    _listener = logging.handlers.QueueListener(records, writer, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Flush the queue and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
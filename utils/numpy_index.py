@@ -0,0 +1,347 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def _compare(column: np.ndarray, operator: str, value: Any) -> np.ndarray:
+    """Evaluate one where-clause operator against a metadata column."""
+    if operator == '$eq':
+        return column == value
+    if operator == '$ne':
+        return column != value
+    if operator in ('$in', '$nin'):
+        mask = np.isin(column, list(value))
+        return mask if operator == '$in' else ~mask
+    if operator in ('$gt', '$gte', '$lt', '$lte'):
+        if column.dtype == object:
+            raise ValueError(f"Operator {operator} requires a numeric metadata field")
+        with np.errstate(invalid='ignore'):
+            if operator == '$gt':
+                return column > value
+            if operator == '$gte':
+                return column >= value
+            if operator == '$lt':
+                return column < value
+            return column <= value
+    raise ValueError(f"Unsupported where operator: {operator}")
+
+
+class NumpyCollection:
+    """Chroma-compatible collection backed by a memory-mapped NumPy matrix.
+    
+    Embeddings are L2-normalized and stored as a contiguous float16 or
+    int8-quantized matrix (one scale per row). Search is a single
+    matrix-vector product followed by ``argpartition``; metadata is kept
+    as columns so where clauses are evaluated as vectorized masks.
+    """
+    
+    QUANTIZATIONS = ('int8', 'float16')
+    # Rows scored per matrix product; bounds the float32 copy of the quantized matrix
+    SCORE_BLOCK_ROWS = 4096
+    
+    def __init__(self, directory: str, name: str,
+                 embedding_function: Optional[Callable[[List[str]], Any]] = None,
+                 quantization: str = 'int8'):
+        if quantization not in self.QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}', expected one of {self.QUANTIZATIONS}")
+        
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self.embedding_function = embedding_function
+        self.quantization = quantization
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._vectors = None
+        self._scales = None
+        self._columns = {}
+        self._positions = {}
+        
+        self._load()
+    
+    def _files(self) -> Dict[str, str]:
+        return {
+            'records': os.path.join(self.path, 'records.json'),
+            'vectors': os.path.join(self.path, 'vectors.npy'),
+            'scales': os.path.join(self.path, 'scales.npy')
+        }
+    
+    def _load(self):
+        """Open the index files, memory-mapping the embedding matrix."""
+        files = self._files()
+        if not os.path.exists(files['records']):
+            return
+        
+        with open(files['records'], 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        
+        if records.get('quantization', self.quantization) != self.quantization:
+            self.logger.warning(
+                f"Index {self.path} uses {records.get('quantization')} quantization, "
+                f"not {self.quantization}; using the stored format"
+            )
+            self.quantization = records['quantization']
+        
+        self._ids = records['ids']
+        self._documents = records['documents']
+        self._metadatas = records['metadatas']
+        if self._ids:
+            self._vectors = np.load(files['vectors'], mmap_mode='r')
+            self._scales = np.load(files['scales'], mmap_mode='r') if self.quantization == 'int8' else None
+        self._rebuild_columns()
+    
+    def _save(self, vectors: Optional[np.ndarray], scales: Optional[np.ndarray]):
+        """Write the index files atomically and re-open them memory-mapped."""
+        os.makedirs(self.path, exist_ok=True)
+        files = self._files()
+        
+        if vectors is not None and len(vectors):
+            self._atomic_save_array(files['vectors'], vectors)
+            if scales is not None:
+                self._atomic_save_array(files['scales'], scales)
+        
+        tmp_path = files['records'] + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'quantization': self.quantization,
+                'dimension': int(vectors.shape[1]) if vectors is not None and len(vectors) else None,
+                'ids': self._ids,
+                'documents': self._documents,
+                'metadatas': self._metadatas
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, files['records'])
+        
+        if self._ids:
+            self._vectors = np.load(files['vectors'], mmap_mode='r')
+            self._scales = np.load(files['scales'], mmap_mode='r') if self.quantization == 'int8' else None
+        else:
+            self._vectors = None
+            self._scales = None
+        self._rebuild_columns()
+    
+    @staticmethod
+    def _atomic_save_array(path: str, array: np.ndarray):
+        tmp_path = path + '.tmp.npy'
+        np.save(tmp_path, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+    
+    def _rebuild_columns(self):
+        """Rebuild id positions and per-key metadata columns used for filtering."""
+        self._positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        keys = set()
+        for metadata in self._metadatas:
+            keys.update(metadata or {})
+        
+        columns = {}
+        for key in keys:
+            values = [(metadata or {}).get(key) for metadata in self._metadatas]
+            present = [value for value in values if value is not None]
+            if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+                columns[key] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            else:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+                columns[key] = column
+        self._columns = columns
+    
+    @staticmethod
+    def _normalize(embeddings: Any) -> np.ndarray:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    
+    def _quantize(self, matrix: np.ndarray):
+        """Quantize normalized float32 rows to the storage format."""
+        if self.quantization == 'float16':
+            return matrix.astype(np.float16), None
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    
+    def _embed(self, documents: List[str]) -> np.ndarray:
+        if self.embedding_function is None:
+            raise ValueError("No embedding function configured; pass embeddings explicitly")
+        return self._normalize(self.embedding_function(list(documents)))
+    
+    def count(self) -> int:
+        return len(self._ids)
+    
+    def add(self, ids: List[str], documents: Optional[List[str]] = None,
+            metadatas: Optional[List[Dict[str, Any]]] = None, embeddings: Optional[Any] = None):
+        """Add new documents; existing ids raise like Chroma's ``add``."""
+        duplicates = [doc_id for doc_id in ids if doc_id in self._positions]
+        if duplicates:
+            raise ValueError(f"IDs already exist in collection: {duplicates[:5]}")
+        self.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+    
+    def upsert(self, ids: List[str], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict[str, Any]]] = None, embeddings: Optional[Any] = None):
+        """Insert or replace documents by id."""
+        if not ids:
+            return
+        documents = list(documents) if documents is not None else [''] * len(ids)
+        metadatas = list(metadatas) if metadatas is not None else [{}] * len(ids)
+        matrix = self._normalize(embeddings) if embeddings is not None else self._embed(documents)
+        new_vectors, new_scales = self._quantize(matrix)
+        
+        with self._lock:
+            vectors = np.array(self._vectors) if self._vectors is not None else None
+            scales = np.array(self._scales) if self._scales is not None else None
+            append_rows = []
+            
+            for row, doc_id in enumerate(ids):
+                position = self._positions.get(doc_id)
+                if position is None:
+                    self._positions[doc_id] = len(self._ids)
+                    self._ids.append(doc_id)
+                    self._documents.append(documents[row])
+                    self._metadatas.append(metadatas[row])
+                    append_rows.append(row)
+                    continue
+                self._documents[position] = documents[row]
+                self._metadatas[position] = metadatas[row]
+                vectors[position] = new_vectors[row]
+                if scales is not None:
+                    scales[position] = new_scales[row]
+            
+            if append_rows:
+                vectors = new_vectors[append_rows] if vectors is None else np.concatenate([vectors, new_vectors[append_rows]])
+                if new_scales is not None:
+                    scales = new_scales[append_rows] if scales is None else np.concatenate([scales, new_scales[append_rows]])
+            
+            self._save(vectors, scales)
+    
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        """Delete documents by id and/or where clause."""
+        with self._lock:
+            if not self._ids:
+                return
+            remove = np.zeros(len(self._ids), dtype=bool)
+            for doc_id in ids or []:
+                position = self._positions.get(doc_id)
+                if position is not None:
+                    remove[position] = True
+            if where:
+                remove |= self._where_mask(where)
+            if not remove.any():
+                return
+            
+            keep = np.flatnonzero(~remove)
+            self._ids = [self._ids[i] for i in keep]
+            self._documents = [self._documents[i] for i in keep]
+            self._metadatas = [self._metadatas[i] for i in keep]
+            vectors = np.array(self._vectors[keep])
+            scales = np.array(self._scales[keep]) if self._scales is not None else None
+            self._save(vectors, scales)
+    
+    def reset(self):
+        """Remove every document and the index files."""
+        with self._lock:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self._ids, self._documents, self._metadatas = [], [], []
+            self._vectors = None
+            self._scales = None
+            self._rebuild_columns()
+    
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Fetch documents by id and/or where clause."""
+        mask = self._where_mask(where) if where else np.ones(len(self._ids), dtype=bool)
+        if ids is not None:
+            selected = np.zeros(len(self._ids), dtype=bool)
+            for doc_id in ids:
+                position = self._positions.get(doc_id)
+                if position is not None:
+                    selected[position] = True
+            mask &= selected
+        positions = np.flatnonzero(mask)
+        return {
+            'ids': [self._ids[i] for i in positions],
+            'documents': [self._documents[i] for i in positions],
+            'metadatas': [self._metadatas[i] for i in positions]
+        }
+    
+    def query(self, query_embeddings: Optional[Any] = None, query_texts: Optional[List[str]] = None,
+              n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None) -> Dict[str, List[List[Any]]]:
+        """Return the top ``n_results`` neighbours for each query, Chroma-style."""
+        if query_embeddings is None:
+            if query_texts is None:
+                raise ValueError("Either query_embeddings or query_texts is required")
+            queries = self._embed(query_texts)
+        else:
+            queries = self._normalize(query_embeddings)
+        
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        vectors, scales = self._vectors, self._scales
+        if vectors is None:
+            for _ in range(len(queries)):
+                for key in results:
+                    results[key].append([])
+            return results
+        
+        # Every query is scored against a block of rows at a time; each block is
+        # upcast to float32 on its own instead of the whole memory-mapped matrix
+        scores = np.empty((len(vectors), len(queries)), dtype=np.float32)
+        for start in range(0, len(vectors), self.SCORE_BLOCK_ROWS):
+            end = start + self.SCORE_BLOCK_ROWS
+            scores[start:end] = np.asarray(vectors[start:end], dtype=np.float32).dot(queries.T)
+        if scales is not None:
+            scores *= np.asarray(scales)[:, None]
+        
+        mask = self._where_mask(where) if where else None
+        candidates = int(mask.sum()) if mask is not None else len(self._ids)
+        k = min(n_results, candidates)
+        
+        for column in range(scores.shape[1]):
+            column_scores = scores[:, column].copy()
+            if mask is not None:
+                column_scores[~mask] = -np.inf
+            if k <= 0:
+                top = np.array([], dtype=np.int64)
+            elif k < len(column_scores):
+                top = np.argpartition(-column_scores, k - 1)[:k]
+                top = top[np.argsort(-column_scores[top])]
+            else:
+                top = np.argsort(-column_scores)[:k]
+            results['ids'].append([self._ids[i] for i in top])
+            results['documents'].append([self._documents[i] for i in top])
+            results['metadatas'].append([self._metadatas[i] for i in top])
+            results['distances'].append([float(1.0 - column_scores[i]) for i in top])
+        
+        return results
+    
+    def _where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Evaluate a Chroma-style where clause over the metadata columns."""
+        mask = np.ones(len(self._ids), dtype=bool)
+        for key, condition in where.items():
+            if key == '$and':
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+                continue
+            if key == '$or':
+                any_mask = np.zeros(len(self._ids), dtype=bool)
+                for clause in condition:
+                    any_mask |= self._where_mask(clause)
+                mask &= any_mask
+                continue
+            column = self._columns.get(key)
+            if column is None:
+                return np.zeros(len(self._ids), dtype=bool)
+            if not isinstance(condition, dict):
+                condition = {'$eq': condition}
+            for operator, value in condition.items():
+                mask &= _compare(column, operator, value)
+        return mask
@@ -0,0 +1,160 @@
+"""Quantized ONNX Runtime inference path for sentence-transformers models.
+
+The model is exported once, offline, with the heavy torch/transformers
+stack::
+
+    python -m utils.onnx_embeddings --model all-MiniLM-L6-v2 --output models/onnx/all-MiniLM-L6-v2
+
+Serving processes then only need ``onnxruntime``, ``tokenizers`` and numpy.
+"""
+import argparse
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+MANIFEST_FILE = 'onnx_manifest.json'
+MODEL_FILE = 'model.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+
+logger = logging.getLogger(__name__)
+
+
+def export_quantized_model(model_name: str, output_dir: str, max_seq_length: int = 256, opset: int = 14) -> Dict[str, Any]:
+    """Export a sentence-transformers model to ONNX with dynamic int8 quantization."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+    
+    hf_name = model_name if '/' in model_name else f"sentence-transformers/{model_name}"
+    tokenizer = AutoTokenizer.from_pretrained(hf_name)
+    model = AutoModel.from_pretrained(hf_name).eval()
+    
+    class _HiddenStates(torch.nn.Module):
+        """Expose only the token embeddings so pooling stays outside the graph."""
+        
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+        
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.encoder(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)[0]
+    
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.save_pretrained(output_dir)
+    
+    inputs = tokenizer(['export'], return_tensors='pt')
+    input_names = ['input_ids', 'attention_mask', 'token_type_ids']
+    fp32_path = os.path.join(output_dir, 'model_fp32.onnx')
+    torch.onnx.export(
+        _HiddenStates(model),
+        tuple(inputs[name] for name in input_names),
+        fp32_path,
+        input_names=input_names,
+        output_names=['last_hidden_state'],
+        dynamic_axes={name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']},
+        opset_version=opset
+    )
+    quantize_dynamic(fp32_path, os.path.join(output_dir, MODEL_FILE), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    
+    manifest = {
+        'model_name': model_name,
+        'dimension': int(model.config.hidden_size),
+        'max_seq_length': max_seq_length,
+        'pooling': 'mean',
+        'normalize': True,
+        'quantization': 'dynamic-int8'
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Exported quantized ONNX model to {output_dir}")
+    return manifest
+
+
+class OnnxEmbeddingModel:
+    """Drop-in replacement for ``SentenceTransformer.encode`` on ONNX Runtime.
+    
+    Uses the model's own tokenizer, mean pooling over the attention mask
+    and L2 normalization, matching the all-MiniLM-L6-v2 pipeline.
+    """
+    
+    def __init__(self, model_dir: str, intra_op_threads: int = 1, inter_op_threads: int = 1, batch_size: int = 32):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        
+        with open(os.path.join(model_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.max_seq_length = int(self.manifest.get('max_seq_length', 256))
+        
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id('[PAD]') or 0, pad_token='[PAD]')
+        
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, MODEL_FILE),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.manifest['dimension'])
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            'input_ids': np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            'attention_mask': np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            'token_type_ids': np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        }
+        feeds = {name: value for name, value in feeds.items() if name in self._input_names}
+        hidden = self.session.run(None, feeds)[0]
+        
+        # Mean pooling over real tokens, then L2 normalization
+        mask = feeds['attention_mask'][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+    
+    def encode(self, sentences, batch_size: Optional[int] = None, convert_to_numpy: bool = True, **kwargs) -> Any:
+        """Encode one sentence or a list of sentences."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        batch_size = batch_size or self.batch_size
+        
+        if not texts:
+            embeddings = np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        else:
+            embeddings = np.concatenate([
+                self._encode_batch(texts[start:start + batch_size])
+                for start in range(0, len(texts), batch_size)
+            ]).astype(np.float32)
+        
+        result = embeddings[0] if single else embeddings
+        return result if convert_to_numpy else result.tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a sentence-transformers model to quantized ONNX.")
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--output', default=os.path.join('models', 'onnx', 'all-MiniLM-L6-v2'))
+    parser.add_argument('--max-seq-length', type=int, default=256)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    manifest = export_quantized_model(args.model, args.output, max_seq_length=args.max_seq_length)
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,28 @@
-import google.generativeai as genai
 import os
 import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional
 from utils.data_loader import DataLoader
-from utils.vector_db import VectorDatabase
+from utils.index_builder import open_index
 from utils.session_manager import SessionManager
+from utils.entity_extractors import extract_search_filters
+from utils.search_filters import merge_filters
+from utils.prompt_packer import PromptPacker
+from utils.intent_classifier import INTENTS, get_intent_classifier
+from utils.llm_client import LLMError, get_llm_client, sdk_timeout
+from utils.llm_scheduler import PRIORITY_LOW, session_priority
+from utils.streaming_json import parse_json_object
 
 class PromptEngineer:
     """Handles prompt engineering and AI response generation."""
     
+    # Number of retrieved documents per type for each turn
+    RETRIEVAL_QUOTAS = {'product': 3, 'service': 2}
+    # A stated budget also restricts the following turns; "disponible" only restricts its own turn
+    STICKY_FILTER_KEYS = ('min_price', 'max_price')
+    
     def __init__(self, config_path: str = "config.json"):
         self.logger = logging.getLogger(__name__)
         self.config = self.load_config(config_path)
@@ -17,8 +30,20 @@ class PromptEngineer:
         
         # Initialize components
         self.data_loader = DataLoader()
-        self.vector_db = VectorDatabase()
+        chroma_config = self.config.get('chroma_config', {})
+        # Prebuilt index (python -m utils.index_builder), opened read-only
+        self.vector_db = open_index(
+            index_root=chroma_config.get('index_root', 'indexes'),
+            data_dir=self.data_loader.data_dir,
+            backend=chroma_config.get('backend'),
+            model_name=chroma_config.get('embedding_model', 'all-MiniLM-L6-v2'),
+            retrieval_config=self.config.get('retrieval_config')
+        )
         self.session_manager = SessionManager()
+        self.intent_classifier = get_intent_classifier()
+        
+        # Worker pool used to gather turn context concurrently
+        self._context_executor = ThreadPoolExecutor(max_workers=2)
         
         # Load prompt templates
         self.load_prompt_templates()
@@ -39,6 +64,8 @@ class PromptEngineer:
             if not api_key:
                 raise ValueError("GOOGLE_API_KEY not found in environment variables")
             
+            # Imported here so loading this module does not pull in the SDK
+            import google.generativeai as genai
             genai.configure(api_key=api_key)
             
             # Initialize model
@@ -48,9 +75,19 @@ class PromptEngineer:
             )
             
             # Configure generation settings
+            prompt_config = self.config.get('prompt_config', {})
+            # Deadlines, retries, hedging and circuit breaker shared with the other Gemini callers
+            self.llm_client = get_llm_client('gemini')
             self.generation_config = genai.types.GenerationConfig(
                 temperature=model_config.get('temperature', 0.7),
-                max_output_tokens=300,  # Reduced for faster responses
+                max_output_tokens=prompt_config.get('max_output_tokens', 300),
+                top_p=model_config.get('top_p', 0.9),
+                candidate_count=1
+            )
+            # Used when the scheduler downgrades a request under quota pressure
+            self.downgraded_generation_config = genai.types.GenerationConfig(
+                temperature=model_config.get('temperature', 0.7),
+                max_output_tokens=max(100, prompt_config.get('max_output_tokens', 300) // 2),
                 top_p=model_config.get('top_p', 0.9),
                 candidate_count=1
             )
@@ -77,6 +114,33 @@ Services: mariages, soutenances, anniversaires, buffets.
 Nous offrons un service complet avec décoration et matériel."""
         
         self.response_templates = self.config.get('response_templates', {})
+        
+        # Static prefix is rendered once; per-turn context is packed into the token budget
+        prompt_config = self.config.get('prompt_config', {})
+        self.prompt_packer = PromptPacker(
+            self.system_prompt,
+            input_token_budget=prompt_config.get('input_token_budget', 1200),
+            max_detail_words=prompt_config.get('max_detail_words', 25),
+            history_messages=prompt_config.get('history_messages', 3)
+        )
+        # How long a stated budget keeps restricting the searches of the session
+        self.search_filter_ttl = prompt_config.get('search_filter_ttl_seconds', 900)
+    
+    def _turn_filters(self, query: str, session_id: str, user_context: Dict[str, Any]) -> Dict[str, Any]:
+        """Filters for this turn: the message's own, over the session's budget if it is recent.
+        
+        A budget stated in the message replaces the stored one (and restarts
+        its expiry); other constraints are not stored.
+        """
+        extracted = extract_search_filters(query)
+        stored = user_context.get('search_filters') or {}
+        if time.time() - stored.get('stated_at', 0) > self.search_filter_ttl:
+            stored = {}
+        sticky = {key: value for key, value in extracted.items() if key in self.STICKY_FILTER_KEYS}
+        if sticky:
+            self.session_manager.update_user_context(session_id, {'search_filters': {**sticky, 'stated_at': time.time()}})
+            stored = sticky
+        return merge_filters({key: value for key, value in stored.items() if key in self.STICKY_FILTER_KEYS}, extracted)
     
     def get_context_from_query(self, query: str, session_id: str) -> Dict[str, Any]:
         """Get relevant context from vector database and session history."""
@@ -88,55 +152,41 @@ Nous offrons un service complet avec décoration et matériel."""
         }
         
         try:
-            # Get relevant products and services from vector database
-            context['relevant_products'] = self.vector_db.search_products(query, n_results=3)
-            context['relevant_services'] = self.vector_db.search_services(query, n_results=2)
+            # History is independent of retrieval: gather it in parallel
+            history = self._context_executor.submit(
+                self.session_manager.get_conversation_history, session_id, 5
+            )
             
-            # Get conversation history
-            context['conversation_history'] = self.session_manager.get_conversation_history(session_id, limit=5)
+            # Read once for the filters, the prompt and the request priority
+            user_context = self.session_manager.get_user_context(session_id)
+            context['user_context'] = user_context
+            # Budget constraints carry over for a while, availability only for this turn
+            filters = self._turn_filters(query, session_id, user_context)
             
-            # Get user context
-            context['user_context'] = self.session_manager.get_user_context(session_id)
+            # Get relevant products and services from vector database
+            retrieved = self.vector_db.search_by_types(query, self.RETRIEVAL_QUOTAS, filters=filters)
+            if filters and not any(retrieved.values()):
+                # Nothing fits the constraints: fall back to unfiltered suggestions
+                retrieved = self.vector_db.search_by_types(query, self.RETRIEVAL_QUOTAS)
+            context['relevant_products'] = retrieved.get('product', [])
+            context['relevant_services'] = retrieved.get('service', [])
             
+            # Get conversation history
+            context['conversation_history'] = history.result()
+        
         except Exception as e:
             self.logger.error(f"Error getting context: {str(e)}")
         
         return context
     
     def build_prompt(self, user_query: str, context: Dict[str, Any]) -> str:
-        """Build the complete prompt with context."""
-        prompt_parts = [self.system_prompt]
-        
-        # Add relevant products
-        if context['relevant_products']:
-            prompt_parts.append("\nPRODUITS PERTINENTS:")
-            for product in context['relevant_products']:
-                prompt_parts.append(f"- {product['document']}")
-        
-        # Add relevant services
-        if context['relevant_services']:
-            prompt_parts.append("\nSERVICES PERTINENTS:")
-            for service in context['relevant_services']:
-                prompt_parts.append(f"- {service['document']}")
-        
-        # Add conversation history
-        if context['conversation_history']:
-            prompt_parts.append("\nHISTORIQUE DE CONVERSATION:")
-            for msg in context['conversation_history'][-3:]:  # Last 3 messages
-                sender = "Client" if msg['sender'] == 'user' else "Assistant"
-                prompt_parts.append(f"{sender}: {msg['content']}")
-        
-        # Add user context
-        if context['user_context']:
-            user_prefs = context['user_context'].get('preferences', {})
-            if user_prefs:
-                prompt_parts.append(f"\nPRÉFÉRENCES CLIENT: {user_prefs}")
-        
-        # Add current query
-        prompt_parts.append(f"\nQUESTION ACTUELLE: {user_query}")
-        prompt_parts.append("\nRÉPONSE:")
-        
-        return "\n".join(prompt_parts)
+        """Build the complete prompt with context, within the input token budget."""
+        prompt, stats = self.prompt_packer.pack(user_query, context)
+        self.logger.debug(
+            f"Packed prompt: ~{stats['estimated_tokens']} tokens, {stats['documents']} documents "
+            f"({stats['documents_dropped']} dropped), {stats['history_messages']} history messages"
+        )
+        return prompt
     
     def generate_response(self, user_query: str, session_id: str) -> str:
         """Generate AI response using Gemini."""
@@ -148,22 +198,25 @@ Nous offrons un service complet avec décoration et matériel."""
             prompt = self.build_prompt(user_query, context)
             
             # Generate response
-            response = self.model.generate_content(
+            # Orders in progress go first when the quota is tight; others may get a shorter answer
+            response = self.llm_client.call(
+                self.model.generate_content,
                 prompt,
-                generation_config=self.generation_config
+                generation_config=self.generation_config,
+                priority=session_priority(context['user_context']),
+                downgrade={'generation_config': self.downgraded_generation_config},
+                request_timeout=sdk_timeout
             )
             
             # Extract response text
             response_text = response.text if response.text else self.response_templates.get('error', 'Désolé, je ne peux pas répondre pour le moment.')
             
-            # Save to session
-            self.session_manager.add_message(session_id, {
+            # Save to session, both messages with one save
+            self.session_manager.add_messages(session_id, [{
                 'type': 'text',
                 'content': user_query,
                 'sender': 'user'
-            })
-            
-            self.session_manager.add_message(session_id, {
+            }, {
                 'type': 'text',
                 'content': response_text,
                 'sender': 'assistant',
@@ -173,10 +226,14 @@ Nous offrons un service complet avec décoration et matériel."""
                         'services_count': len(context['relevant_services'])
                     }
                 }
-            })
+            }])
             
             return response_text
-            
+        
+        except LLMError as e:
+            # Upstream slow or unhealthy: answer within the deadline instead of hanging the handler
+            self.logger.warning(f"LLM unavailable for response: {str(e)}")
+            return self.response_templates.get('error', 'Désolé, je rencontre une difficulté technique.')
         except Exception as e:
             self.logger.error(f"Error generating response: {str(e)}")
             return self.response_templates.get('error', 'Désolé, je rencontre une difficulté technique.')
@@ -202,13 +259,23 @@ Nous offrons un service complet avec décoration et matériel."""
             self.session_manager.update_user_context(session_id, {'preferences': preferences})
             
             return suggestions
-            
+        
         except Exception as e:
             self.logger.error(f"Error suggesting products: {str(e)}")
             return []
     
     def extract_intent(self, user_query: str) -> Dict[str, Any]:
-        """Extract intent from user query."""
+        """Extract intent from user query.
+        
+        The local classifier answers directly; Gemini is only asked when its
+        confidence is below ``intent_config.llm_fallback_threshold``.
+        """
+        local = self.intent_classifier.classify(user_query)
+        threshold = self.config.get('intent_config', {}).get('llm_fallback_threshold', 0.6)
+        if local['confidence'] >= threshold:
+            local['source'] = 'local'
+            return local
+        
         intent_prompt = f"""Analyse cette question d'un client de traiteur et extrait l'intention:
         
         Question: "{user_query}"
@@ -227,12 +294,23 @@ Nous offrons un service complet avec décoration et matériel."""
         }}"""
         
         try:
-            response = self.model.generate_content(intent_prompt)
-            intent_data = json.loads(response.text)
+            # The local result is a good enough answer: do not wait long for the model
+            response = self.llm_client.call(self.model.generate_content, intent_prompt, deadline_seconds=5.0,
+                                            priority=PRIORITY_LOW, request_timeout=sdk_timeout)
+            intent_data = parse_json_object(response.text)
+            if intent_data.get('intent') not in INTENTS:
+                raise ValueError(f"Unexpected intent: {intent_data.get('intent')}")
+            
+            # Rule-based entities fill whatever the model left out
+            entities = {key: value for key, value in (intent_data.get('entities') or {}).items() if value}
+            intent_data['entities'] = {**local['entities'], **entities}
+            intent_data.setdefault('urgence', local['urgence'])
+            intent_data['source'] = 'llm'
             return intent_data
         except Exception as e:
             self.logger.error(f"Error extracting intent: {str(e)}")
-            return {"intent": "autre", "entities": {}, "urgence": "faible"}
+            local['source'] = 'local'
+            return local
     
     def get_greeting_message(self) -> str:
         """Get greeting message."""
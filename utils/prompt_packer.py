@@ -0,0 +1,208 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.lexical_index import fold_text
+
+# Average characters per token for French text with Gemini/SentencePiece tokenizers
+CHARS_PER_TOKEN = 4.0
+
+# Documents whose folded word sets overlap this much (Jaccard) with an already packed one are dropped
+DUPLICATE_OVERLAP = 0.85
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, good enough to enforce a budget."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def truncate_words(text: str, max_words: int) -> str:
+    words = str(text or '').split()
+    if len(words) <= max_words:
+        return ' '.join(words)
+    return ' '.join(words[:max_words]).rstrip('.,;:') + '…'
+
+
+def parse_fields(document: str) -> Dict[str, str]:
+    """Split a ``Clé: valeur | Clé: valeur`` catalog document into fields."""
+    fields = {}
+    for part in str(document or '').split(' | '):
+        key, sep, value = part.partition(':')
+        if sep:
+            fields[key.strip()] = value.strip()
+    return fields
+
+
+def _price(value: Any) -> Optional[float]:
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 else None
+
+
+def condense_product(result: Dict[str, Any], max_detail_words: int) -> str:
+    """One line with the key fields of a product: name, category, price, stock, short details."""
+    metadata = result.get('metadata', {})
+    fields = parse_fields(result.get('document', ''))
+    name = metadata.get('name') or fields.get('Produit', '')
+    category = (metadata.get('category') or fields.get('Catégories', '')).split(',')[0].split('>')[-1].strip()
+    
+    price = fields.get('Tarification')
+    if not price:
+        value = _price(metadata.get('price'))
+        price = f"{value:g} MAD" if value else 'sur devis'
+    
+    parts = [name]
+    if category:
+        parts.append(category)
+    parts.append(price)
+    if 'available' in metadata:
+        parts.append('en stock' if metadata['available'] else 'rupture')
+    details = fields.get('Détails') or fields.get('Description')
+    if details and max_detail_words > 0:
+        parts.append(truncate_words(details, max_detail_words))
+    return ' | '.join(parts)
+
+
+def condense_service(result: Dict[str, Any], max_detail_words: int) -> str:
+    """One line with the key fields of a service: name, price range, summary."""
+    metadata = result.get('metadata', {})
+    fields = parse_fields(result.get('document', ''))
+    name = metadata.get('name') or fields.get('Service', '')
+    
+    low, high = _price(metadata.get('min_price')), _price(metadata.get('max_price'))
+    if low and high:
+        price = f"{low:g} - {high:g} MAD"
+    elif low or high:
+        price = f"à partir de {(low or high):g} MAD"
+    else:
+        price = 'sur devis'
+    
+    parts = [name, price]
+    summary = metadata.get('summary') or fields.get('Résumé')
+    if summary and max_detail_words > 0:
+        parts.append(truncate_words(summary, max_detail_words))
+    return ' | '.join(parts)
+
+
+CONDENSERS = {
+    'product': condense_product,
+    'service': condense_service
+}
+
+
+def relevance(result: Dict[str, Any]) -> float:
+    """Fused score when available, otherwise cosine similarity."""
+    if 'score' in result:
+        return float(result['score'])
+    return 1.0 - float(result.get('distance', 1.0))
+
+
+class PromptPacker:
+    """Builds prompts that fit an input token budget.
+    
+    The static prefix (system prompt) is rendered once. Retrieved documents
+    are condensed to their key fields, deduplicated and added by decreasing
+    relevance until the budget is spent; recent history gets a bounded
+    share of the budget.
+    """
+    
+    SECTION_TITLES = {
+        'product': "PRODUITS PERTINENTS:",
+        'service': "SERVICES PERTINENTS:"
+    }
+    
+    def __init__(self, system_prompt: str, input_token_budget: int = 1200, max_detail_words: int = 25,
+                 history_messages: int = 3, history_share: float = 0.25, max_message_words: int = 60):
+        self.static_prefix = system_prompt.strip()
+        self.prefix_tokens = estimate_tokens(self.static_prefix)
+        self.input_token_budget = input_token_budget
+        self.max_detail_words = max_detail_words
+        self.history_messages = history_messages
+        self.history_share = history_share
+        self.max_message_words = max_message_words
+    
+    @staticmethod
+    def _word_set(text: str) -> set:
+        return set(fold_text(text).split())
+    
+    def _select_documents(self, context: Dict[str, Any], budget: int) -> Tuple[Dict[str, List[str]], int, int]:
+        candidates = [
+            (relevance(result), doc_type, result)
+            for doc_type, key in (('product', 'relevant_products'), ('service', 'relevant_services'))
+            for result in context.get(key) or []
+        ]
+        candidates.sort(key=lambda item: item[0], reverse=True)
+        
+        selected = {doc_type: [] for doc_type in self.SECTION_TITLES}
+        seen_names, seen_words = set(), []
+        used, dropped = 0, 0
+        for _, doc_type, result in candidates:
+            line = f"- {CONDENSERS[doc_type](result, self.max_detail_words)}"
+            name = fold_text(result.get('metadata', {}).get('name', ''))
+            words = self._word_set(line)
+            duplicate = (name and name in seen_names) or any(
+                len(words & other) >= DUPLICATE_OVERLAP * len(words | other)
+                for other in seen_words if words and other
+            )
+            if duplicate:
+                dropped += 1
+                continue
+            
+            cost = estimate_tokens(line) + (0 if selected[doc_type] else estimate_tokens(self.SECTION_TITLES[doc_type]))
+            if used + cost > budget:
+                dropped += 1
+                continue
+            
+            selected[doc_type].append(line)
+            seen_names.add(name)
+            seen_words.append(words)
+            used += cost
+        return selected, used, dropped
+    
+    def _select_history(self, history: List[Dict[str, Any]], budget: int) -> Tuple[List[str], int]:
+        lines, used = [], 0
+        # Walk back from the most recent message
+        for msg in reversed((history or [])[-self.history_messages:]):
+            sender = "Client" if msg.get('sender') == 'user' else "Assistant"
+            line = f"{sender}: {truncate_words(msg.get('content', ''), self.max_message_words)}"
+            cost = estimate_tokens(line)
+            if used + cost > budget:
+                break
+            lines.insert(0, line)
+            used += cost
+        return lines, used
+    
+    def pack(self, user_query: str, context: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Return the prompt and packing stats (estimated tokens, documents kept and dropped)."""
+        query_part = f"\nQUESTION ACTUELLE: {user_query}\n\nRÉPONSE:"
+        
+        preferences = (context.get('user_context') or {}).get('preferences', {})
+        preferences_part = f"\nPRÉFÉRENCES CLIENT: {preferences}" if preferences else ''
+        
+        remaining = self.input_token_budget - self.prefix_tokens - estimate_tokens(query_part) - estimate_tokens(preferences_part)
+        history_lines, history_tokens = self._select_history(
+            context.get('conversation_history'), max(int(remaining * self.history_share), 0)
+        )
+        remaining -= history_tokens
+        documents, document_tokens, dropped = self._select_documents(context, max(remaining, 0))
+        
+        prompt_parts = [self.static_prefix]
+        for doc_type, lines in documents.items():
+            if lines:
+                prompt_parts.append(f"\n{self.SECTION_TITLES[doc_type]}")
+                prompt_parts.extend(lines)
+        if history_lines:
+            prompt_parts.append("\nHISTORIQUE DE CONVERSATION:")
+            prompt_parts.extend(history_lines)
+        if preferences_part:
+            prompt_parts.append(preferences_part)
+        prompt_parts.append(query_part)
+        
+        prompt = "\n".join(prompt_parts)
+        stats = {
+            'estimated_tokens': estimate_tokens(prompt),
+            'documents': sum(len(lines) for lines in documents.values()),
+            'documents_dropped': dropped,
+            'history_messages': len(history_lines)
+        }
+        return prompt, stats
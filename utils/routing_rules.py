@@ -0,0 +1,162 @@
+"""Keyword routing rules compiled into a single Aho-Corasick automaton.
+
+Rules are declared in ``config.json`` under ``routing_rules``::
+
+    {"name": "human_request", "applies_to": "query", "target": "whatsapp",
+     "priority": 100, "keywords": ["parler a un humain", "conseiller"]}
+
+Keywords and inputs are accent-folded and lowercased, and keywords only
+match at the start of a word, so inflected forms ("conseillers",
+"telephoner", "desoles") still match. The query and the response are scanned together
+in one pass, so the cost per message does not grow with the number of rules.
+"""
+import json
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from utils.lexical_index import fold_text
+
+SCOPES = ('query', 'response')
+
+# Separates the query from the response in the scanned text; never produced by fold_text
+_SCOPE_SEPARATOR = '|'
+
+# Used when config.json has no routing_rules section
+DEFAULT_RULES = [
+    {
+        'name': 'human_request',
+        'applies_to': 'query',
+        'target': 'whatsapp',
+        'priority': 100,
+        'keywords': [
+            "parler à un humain", "agent humain", "personne réelle", "conseiller", "représentant",
+            "parler à quelqu'un", "whatsapp", "téléphone", "contact direct", "vraie personne",
+            "chat humain", "assistant humain", "humain", "humaine"
+        ]
+    },
+    {
+        'name': 'uncertain_answer',
+        'applies_to': 'response',
+        'target': 'offer_human',
+        'priority': 50,
+        'keywords': [
+            "je ne suis pas sûr", "je n'ai pas cette information", "je ne peux pas", "désolé", "désolée",
+            "navré", "navrée", "contacter un conseiller", "contacter directement"
+        ]
+    }
+]
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingRulesEngine:
+    """Matches every rule keyword against a query and a response in one pass."""
+    
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = []
+        for rule in rules:
+            applies_to = rule.get('applies_to', 'query')
+            if applies_to not in SCOPES:
+                raise ValueError(f"Routing rule {rule.get('name')}: applies_to must be one of {SCOPES}")
+            self.rules.append({
+                'name': rule['name'],
+                'applies_to': applies_to,
+                'target': rule['target'],
+                'priority': int(rule.get('priority', 0))
+            })
+        
+        # Trie of folded keywords: transitions, failure links and (length, rule index, keyword) outputs
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[tuple]] = [[]]
+        for index, rule in enumerate(rules):
+            for keyword in rule.get('keywords', []):
+                folded = fold_text(keyword)
+                if folded:
+                    self._add_keyword(folded, index, keyword)
+        self._build_failure_links()
+    
+    @classmethod
+    def from_config(cls, config_path: str = 'config.json') -> 'RoutingRulesEngine':
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                rules = json.load(f).get('routing_rules')
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read routing rules from {config_path}: {e}")
+            rules = None
+        return cls(rules or DEFAULT_RULES)
+    
+    def _add_keyword(self, keyword: str, rule_index: int, original: str):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append((len(keyword), rule_index, original))
+    
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # Inherit the keywords that end at the failure state
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+    
+    def matches(self, query: str, response: Optional[str] = None) -> List[Dict[str, Any]]:
+        """All rule matches, highest priority first."""
+        text = fold_text(query)
+        response_start = None
+        if response:
+            response_start = len(text) + 1
+            text = f"{text}{_SCOPE_SEPARATOR}{fold_text(response)}"
+        
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        found = {}
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, rule_index, keyword in outputs[state]:
+                if rule_index in found:
+                    continue
+                start = position - length + 1
+                # Word starts only (folded text separates words with single spaces); suffixes are allowed
+                if start > 0 and text[start - 1] not in f" {_SCOPE_SEPARATOR}":
+                    continue
+                scope = 'response' if response_start is not None and start >= response_start else 'query'
+                if self.rules[rule_index]['applies_to'] == scope:
+                    found[rule_index] = keyword
+        
+        return sorted(
+            ({**self.rules[rule_index], 'keyword': keyword} for rule_index, keyword in found.items()),
+            key=lambda match: match['priority'],
+            reverse=True
+        )
+    
+    def classify(self, query: str, response: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Highest-priority matching rule, or None."""
+        matches = self.matches(query, response)
+        return matches[0] if matches else None
+
+
+_engines: Dict[str, RoutingRulesEngine] = {}
+
+
+def get_routing_engine(config_path: str = 'config.json') -> RoutingRulesEngine:
+    """Routing engine compiled once per process from ``config_path``."""
+    if config_path not in _engines:
+        _engines[config_path] = RoutingRulesEngine.from_config(config_path)
+    return _engines[config_path]
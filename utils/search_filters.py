@@ -0,0 +1,83 @@
+from typing import Any, Dict, List, Optional, Union
+
+# Supported filter keys:
+#   min_price / max_price  budget range in MAD
+#   available              only items in stock (products)
+#   price_tier             a tier or list of tiers (économique, moyen_gamme, premium, sans_prix)
+FILTER_KEYS = ('min_price', 'max_price', 'available', 'price_tier')
+
+
+def _and(clauses: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Combine clauses; Chroma rejects ``$and`` with fewer than two operands."""
+    clauses = [clause for clause in clauses if clause]
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {'$and': clauses}
+
+
+def _product_clauses(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    clauses = []
+    if filters.get('min_price') is not None:
+        clauses.append({'price': {'$gte': float(filters['min_price'])}})
+    if filters.get('max_price') is not None:
+        # Unpriced products (price 0) cannot be shown to fit a budget
+        clauses.append({'price': {'$gt': 0.0}})
+        clauses.append({'price': {'$lte': float(filters['max_price'])}})
+    if filters.get('available'):
+        clauses.append({'available': True})
+    tiers = filters.get('price_tier')
+    if tiers:
+        tiers = [tiers] if isinstance(tiers, str) else list(tiers)
+        clauses.append({'price_tier': {'$in': tiers}} if len(tiers) > 1 else {'price_tier': tiers[0]})
+    return clauses
+
+
+def _service_clauses(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # A service matches a budget when its price range overlaps it
+    clauses = []
+    if filters.get('max_price') is not None:
+        clauses.append({'min_price': {'$gt': 0.0}})
+        clauses.append({'min_price': {'$lte': float(filters['max_price'])}})
+    if filters.get('min_price') is not None:
+        clauses.append({'max_price': {'$gte': float(filters['min_price'])}})
+    return clauses
+
+
+TYPE_CLAUSES = {
+    'product': _product_clauses,
+    'service': _service_clauses
+}
+
+
+def build_where_clause(filter_type: Union[str, List[str], None] = None,
+                       filters: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Translate a type restriction and structured filters into a where clause.
+    
+    The clause is evaluated inside the vector search, before top-k selection,
+    by Chroma and by the NumPy and BM25 indexes alike.
+    """
+    filters = {key: value for key, value in (filters or {}).items() if key in FILTER_KEYS and value is not None}
+    types = [filter_type] if isinstance(filter_type, str) else list(filter_type or [])
+    
+    if not filters:
+        if not types:
+            return None
+        return {'type': types[0]} if len(types) == 1 else {'type': {'$in': types}}
+    
+    per_type = [
+        _and([{'type': doc_type}] + TYPE_CLAUSES.get(doc_type, lambda _: [])(filters))
+        for doc_type in (types or list(TYPE_CLAUSES))
+    ]
+    return per_type[0] if len(per_type) == 1 else {'$or': per_type}
+
+
+def merge_filters(*filter_sets: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge filter dicts; later values win, ``None`` never overrides."""
+    merged = {}
+    for filter_set in filter_sets:
+        for key, value in (filter_set or {}).items():
+            if key in FILTER_KEYS and value is not None:
+                merged[key] = value
+    return merged
@@ -1,5 +1,7 @@
+import atexit
 import json
 import os
+import threading
 import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
@@ -9,12 +11,22 @@ import logging
 class SessionManager:
     """Manages user sessions and conversation history."""
     
-    def __init__(self, sessions_file: str = "data/sessions.json", timeout: int = 1800):
+    def __init__(self, sessions_file: str = "data/sessions.json", timeout: int = 1800, save_delay: float = 1.0):
         self.sessions_file = sessions_file
         self.timeout = timeout  # Session timeout in seconds
+        # Changes within this many seconds are written to the file together, off the request thread
+        self.save_delay = save_delay
         self.sessions = {}
         self.logger = logging.getLogger(__name__)
+        # Guards the sessions dict; the file itself is written under its own lock
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._save_timer = None
+        self._generation = 0
+        self._written_generation = 0
         self.load_sessions()
+        atexit.register(self.flush)
     
     def load_sessions(self):
         """Load sessions from file."""
@@ -28,39 +40,66 @@ class SessionManager:
             self.sessions = {}
     
     def save_sessions(self):
-        """Save sessions to file."""
-        try:
-            os.makedirs(os.path.dirname(self.sessions_file), exist_ok=True)
-            with open(self.sessions_file, 'w', encoding='utf-8') as f:
-                json.dump(self.sessions, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            self.logger.error(f"Error saving sessions: {str(e)}")
+        """Schedule a save of the sessions file; a background thread writes it after ``save_delay``."""
+        with self._lock:
+            self._dirty = True
+            if self.save_delay <= 0:
+                self.flush()
+            elif self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+    
+    def flush(self):
+        """Write the sessions file now if anything changed since the last write."""
+        with self._lock:
+            self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._generation += 1
+            generation = self._generation
+            # Serialized under the lock, written outside it
+            data = json.dumps(self.sessions, indent=2, ensure_ascii=False)
+        with self._write_lock:
+            if generation < self._written_generation:
+                # A newer snapshot is already on disk
+                return
+            self._written_generation = generation
+            try:
+                os.makedirs(os.path.dirname(self.sessions_file), exist_ok=True)
+                temporary_path = f"{self.sessions_file}.tmp"
+                with open(temporary_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(temporary_path, self.sessions_file)
+            except Exception as e:
+                self.logger.error(f"Error saving sessions: {str(e)}")
     
     def create_session(self, user_id: str = None) -> str:
         """Create a new session."""
         session_id = user_id or str(uuid.uuid4())
-        self.sessions[session_id] = {
-            'session_id': session_id,
-            'created_at': datetime.now().isoformat(),
-            'last_activity': datetime.now().isoformat(),
-            'messages': [],
-            'user_context': {
-                'preferences': {},
-                'current_inquiry': None,
-                'order_in_progress': False
+        with self._lock:
+            self.sessions[session_id] = {
+                'session_id': session_id,
+                'created_at': datetime.now().isoformat(),
+                'last_activity': datetime.now().isoformat(),
+                'messages': [],
+                'user_context': {
+                    'preferences': {},
+                    'current_inquiry': None,
+                    'order_in_progress': False
+                }
             }
-        }
-        self.save_sessions()
+            self.save_sessions()
         self.logger.info(f"Created new session: {session_id}")
         return session_id
     
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get session by ID."""
-        if session_id not in self.sessions:
+        session = self.sessions.get(session_id)
+        if session is None:
             return None
         
-        session = self.sessions[session_id]
-        
         # Check if session is expired
         last_activity = datetime.fromisoformat(session['last_activity'])
         if datetime.now() - last_activity > timedelta(seconds=self.timeout):
@@ -71,25 +110,31 @@ class SessionManager:
     
     def update_session_activity(self, session_id: str):
         """Update session last activity timestamp."""
-        if session_id in self.sessions:
-            self.sessions[session_id]['last_activity'] = datetime.now().isoformat()
-            self.save_sessions()
+        with self._lock:
+            if session_id in self.sessions:
+                self.sessions[session_id]['last_activity'] = datetime.now().isoformat()
+                self.save_sessions()
     
     def add_message(self, session_id: str, message: Dict[str, Any]):
         """Add a message to session history."""
-        if session_id not in self.sessions:
-            self.create_session(session_id)
-        
-        self.sessions[session_id]['messages'].append({
-            'timestamp': datetime.now().isoformat(),
-            'type': message.get('type', 'text'),
-            'content': message.get('content', ''),
-            'sender': message.get('sender', 'user'),
-            'metadata': message.get('metadata', {})
-        })
-        
-        self.update_session_activity(session_id)
-        self.save_sessions()
+        self.add_messages(session_id, [message])
+    
+    def add_messages(self, session_id: str, messages: List[Dict[str, Any]]):
+        """Add several messages (a user question and its answer) with a single save."""
+        with self._lock:
+            if session_id not in self.sessions:
+                self.create_session(session_id)
+            
+            for message in messages:
+                self.sessions[session_id]['messages'].append({
+                    'timestamp': datetime.now().isoformat(),
+                    'type': message.get('type', 'text'),
+                    'content': message.get('content', ''),
+                    'sender': message.get('sender', 'user'),
+                    'metadata': message.get('metadata', {})
+                })
+            
+            self.update_session_activity(session_id)
     
     def get_conversation_history(self, session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get conversation history for a session."""
@@ -102,12 +147,12 @@ class SessionManager:
     
     def update_user_context(self, session_id: str, context_update: Dict[str, Any]):
         """Update user context in session."""
-        if session_id not in self.sessions:
-            self.create_session(session_id)
-        
-        self.sessions[session_id]['user_context'].update(context_update)
-        self.update_session_activity(session_id)
-        self.save_sessions()
+        with self._lock:
+            if session_id not in self.sessions:
+                self.create_session(session_id)
+            
+            self.sessions[session_id]['user_context'].update(context_update)
+            self.update_session_activity(session_id)
     
     def get_user_context(self, session_id: str) -> Dict[str, Any]:
         """Get user context from session."""
@@ -119,20 +164,22 @@ class SessionManager:
     
     def delete_session(self, session_id: str):
         """Delete a session."""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        with self._lock:
+            if self.sessions.pop(session_id, None) is None:
+                return
             self.save_sessions()
-            self.logger.info(f"Deleted session: {session_id}")
+        self.logger.info(f"Deleted session: {session_id}")
     
     def cleanup_expired_sessions(self):
         """Clean up expired sessions."""
         current_time = datetime.now()
         expired_sessions = []
         
-        for session_id, session in self.sessions.items():
-            last_activity = datetime.fromisoformat(session['last_activity'])
-            if current_time - last_activity > timedelta(seconds=self.timeout):
-                expired_sessions.append(session_id)
+        with self._lock:
+            for session_id, session in self.sessions.items():
+                last_activity = datetime.fromisoformat(session['last_activity'])
+                if current_time - last_activity > timedelta(seconds=self.timeout):
+                    expired_sessions.append(session_id)
         
         for session_id in expired_sessions:
             self.delete_session(session_id)
@@ -149,7 +196,8 @@ class SessionManager:
         """Get session statistics."""
         self.cleanup_expired_sessions()
         
-        total_messages = sum(len(session.get('messages', [])) for session in self.sessions.values())
+        with self._lock:
+            total_messages = sum(len(session.get('messages', [])) for session in self.sessions.values())
         
         return {
             'active_sessions': len(self.sessions),
@@ -0,0 +1,178 @@
+"""Import and initialization timing of the application startup.
+
+When enabled (``PROFILE_STARTUP=1`` or :func:`enable`), a meta path finder
+times every module imported afterwards, both cumulative (with its own
+imports) and self time, and :func:`step` times named initialization steps.
+:func:`report` lists the slowest ones; the app logs it once warm-up is done
+and exposes it in ``/api/stats`` under ``startup``.
+
+Usage: python -m utils.startup_profiler [--module main] [--warm] [--top 25]
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_imports: Dict[str, Dict[str, float]] = {}
+_steps: List[Dict[str, Any]] = []
+_local = threading.local()
+_finder = None
+_started = None
+
+
+class _TimedLoader:
+    """Loader proxy timing module creation and execution."""
+    
+    def __init__(self, loader, name: str):
+        self._loader = loader
+        self._name = name
+    
+    def __getattr__(self, attribute):
+        return getattr(self._loader, attribute)
+    
+    def _timed(self, func, *args):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with _lock:
+                timing = _imports.setdefault(self._name, {'cumulative': 0.0, 'self': 0.0})
+                timing['cumulative'] += elapsed
+                timing['self'] += elapsed - children
+    
+    def create_module(self, spec):
+        create = getattr(self._loader, 'create_module', None)
+        return self._timed(create, spec) if create else None
+    
+    def exec_module(self, module):
+        return self._timed(self._loader.exec_module, module)
+
+
+class _TimingFinder:
+    """Meta path finder delegating to the others and wrapping their loaders."""
+    
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, fullname)
+                return spec
+        return None
+
+
+def enable():
+    """Start timing imports from now on (idempotent)."""
+    global _finder, _started
+    with _lock:
+        if _finder is None:
+            _finder = _TimingFinder()
+            sys.meta_path.insert(0, _finder)
+            _started = time.perf_counter()
+
+
+def enable_from_env(name: str = 'PROFILE_STARTUP'):
+    if os.getenv(name, 'false').lower() in ('1', 'true', 'yes'):
+        enable()
+
+
+def enabled() -> bool:
+    return _finder is not None
+
+
+@contextmanager
+def step(name: str):
+    """Time an initialization step (recorded only while profiling)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if enabled():
+            with _lock:
+                _steps.append({'step': name, 'ms': round((time.perf_counter() - start) * 1000.0, 1),
+                               'at_ms': round((start - _started) * 1000.0, 1)})
+
+
+def report(top: int = 25) -> Optional[Dict[str, Any]]:
+    """Slowest imports (by self time, packages rolled up) and the timed steps."""
+    if not enabled():
+        return None
+    with _lock:
+        imports = dict(_imports)
+        steps = list(_steps)
+    packages: Dict[str, Dict[str, float]] = {}
+    for name, timing in imports.items():
+        package = packages.setdefault(name.split('.')[0], {'cumulative': 0.0, 'self': 0.0, 'modules': 0})
+        package['self'] += timing['self']
+        package['modules'] += 1
+        if '.' not in name or name.split('.')[0] not in imports:
+            package['cumulative'] = max(package['cumulative'], timing['cumulative'])
+    
+    def rows(timings, key):
+        ranked = sorted(timings.items(), key=lambda item: item[1]['self'], reverse=True)[:top]
+        return [{key: name, 'self_ms': round(timing['self'] * 1000.0, 1),
+                 'cumulative_ms': round(timing['cumulative'] * 1000.0, 1),
+                 **({'modules': timing['modules']} if 'modules' in timing else {})}
+                for name, timing in ranked]
+    
+    return {
+        'modules_imported': len(imports),
+        'import_ms': round(sum(timing['self'] for timing in imports.values()) * 1000.0, 1),
+        'since_enabled_ms': round((time.perf_counter() - _started) * 1000.0, 1),
+        'packages': rows(packages, 'package'),
+        'modules': rows(imports, 'module'),
+        'steps': steps
+    }
+
+
+def log_report(top: int = 15):
+    data = report(top)
+    if data is None:
+        return
+    logger.info(f"Startup profile: {data['modules_imported']} modules imported in {data['import_ms']:.0f} ms")
+    for row in data['packages']:
+        logger.info(f"  import {row['package']:<28} {row['self_ms']:>8.1f} ms ({row['modules']} modules)")
+    for row in data['steps']:
+        logger.info(f"  step   {row['step']:<28} {row['ms']:>8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import and initialization time of the app.")
+    parser.add_argument('--module', default='main', help="module to import (default: the Flask app)")
+    parser.add_argument('--warm', action='store_true', help="also run the app's warm-up synchronously")
+    parser.add_argument('--top', type=int, default=25)
+    args = parser.parse_args()
+    # The background warm-up would race with the measurement
+    os.environ.setdefault('WARMUP_ON_START', 'false')
+    
+    # Under ``-m`` this file runs as __main__; the app records its steps in the importable copy
+    profiler = importlib.import_module('utils.startup_profiler')
+    profiler.enable()
+    with profiler.step(f"import {args.module}"):
+        module = importlib.import_module(args.module)
+    if args.warm:
+        module.warm_up_components()
+    print(json.dumps(profiler.report(args.top), indent=2))
+
+
+if __name__ == '__main__':
+    main()
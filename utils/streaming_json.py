@@ -0,0 +1,143 @@
+"""Tolerant JSON helpers for structured LLM replies.
+
+Models asked for JSON sometimes wrap it in code fences, add prose around
+it, or get cut off by the output token limit. :func:`parse_json_object`
+recovers the object in all of these cases, and
+:class:`StreamingFieldParser` decodes one string field while the reply is
+still streaming, so the text can be shown before the JSON is complete.
+"""
+import json
+import re
+from typing import Any, Dict, Optional
+
+_FENCE = re.compile(r'^\s*```(?:json)?\s*', re.IGNORECASE)
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def _close_truncated(fragment: str) -> str:
+    """Close the strings, arrays and objects left open by a truncated JSON document."""
+    stack, in_string, escaped = [], False, False
+    for char in fragment:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+    
+    if escaped:
+        fragment = fragment[:-1]
+    if in_string:
+        fragment += '"'
+    # A dangling key, colon or comma cannot be completed: drop it
+    fragment = re.sub(r'(?:,\s*"[^"]*"\s*:?\s*|,\s*|:\s*)$', '', fragment.rstrip())
+    return fragment + ''.join(reversed(stack))
+
+
+def parse_json_object(text: str) -> Dict[str, Any]:
+    """Parse the first JSON object in a model reply.
+    
+    Ignores code fences and surrounding prose, and repairs replies cut off
+    mid-object. Raises ValueError if no object can be recovered.
+    """
+    text = _FENCE.sub('', text or '')
+    start = text.find('{')
+    if start == -1:
+        raise ValueError("No JSON object in response")
+    
+    end = text.rfind('}')
+    if end > start:
+        try:
+            return json.loads(text[start:end + 1])
+        except ValueError:
+            pass
+    
+    try:
+        value = json.loads(_close_truncated(text[start:]))
+    except ValueError as e:
+        raise ValueError(f"Could not recover JSON object: {e}")
+    if not isinstance(value, dict):
+        raise ValueError("Response is not a JSON object")
+    return value
+
+
+class StreamingFieldParser:
+    """Incrementally decode one top-level string field of a streamed JSON reply.
+    
+    ``feed`` returns the newly decoded characters of the field. If the reply
+    turns out not to be JSON at all, the raw text is passed through instead.
+    """
+    
+    def __init__(self, field: str = 'reply'):
+        self._field_start = re.compile(rf'"{re.escape(field)}"\s*:\s*"')
+        self.buffer = ''
+        self.text = ''
+        self.complete = False
+        self._position: Optional[int] = None
+        self._passthrough = False
+    
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        if self.complete:
+            return ''
+        
+        if self._passthrough:
+            self.text += chunk
+            return chunk
+        
+        if self._position is None:
+            head = self.buffer.lstrip()
+            # Wait until a possible code fence is complete before deciding
+            if '{' not in head and len(head) < 8:
+                return ''
+            stripped = _FENCE.sub('', head)
+            if stripped and not stripped.startswith('{'):
+                # Plain text reply: stream it as is
+                self._passthrough = True
+                self.text = self.buffer
+                return self.buffer
+            match = self._field_start.search(self.buffer)
+            if not match:
+                return ''
+            self._position = match.end()
+        
+        return self._decode()
+    
+    def _decode(self) -> str:
+        decoded = []
+        position = self._position
+        buffer = self.buffer
+        while position < len(buffer):
+            char = buffer[position]
+            if char == '"':
+                self.complete = True
+                position += 1
+                break
+            if char != '\\':
+                decoded.append(char)
+                position += 1
+                continue
+            # Escape sequences may be split across chunks: wait for the rest
+            if position + 1 >= len(buffer):
+                break
+            code = buffer[position + 1]
+            if code == 'u':
+                if position + 6 > len(buffer):
+                    break
+                decoded.append(chr(int(buffer[position + 2:position + 6], 16)))
+                position += 6
+            else:
+                decoded.append(_ESCAPES.get(code, code))
+                position += 2
+        
+        self._position = position
+        delta = ''.join(decoded)
+        self.text += delta
+        return delta
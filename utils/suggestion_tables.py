@@ -0,0 +1,290 @@
+"""Product suggestions precomputed per catalog version.
+
+For every combination of category, event type and price tier found in the
+catalog (each one also "any"), the top products are ranked once and saved
+as ``indexes/suggestions/<fingerprint>.json``, keyed by the products file
+hash, so a suggestion request is a dict lookup. Preferences the tables do
+not know (a free-text category, an unknown tier...) fall back to a vector
+search of the prebuilt index; :class:`SuggestionService` caches the answers
+per session.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from itertools import product as combinations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.entity_extractors import EVENT_TYPES, extract_event_type
+from utils.lexical_index import fold_text
+
+DEFAULT_TABLE_DIR = os.path.join('indexes', 'suggestions')
+PRODUCTS_FILE = 'products_rag.csv'
+# Bump when the table layout or the ranking changes
+TABLE_VERSION = 1
+TOP_K = 5
+ANY = '*'
+
+PRICE_TIERS = ('économique', 'moyen_gamme', 'premium')
+# Ways customers name a price tier, matched on folded text
+PRICE_TIER_ALIASES = [
+    (re.compile(r'\b(?:economique|pas\s+cher|petit\s+budget|bon\s+marche|abordable|bas)\b'), 'économique'),
+    (re.compile(r'\b(?:moyen|moyen\s+gamme|intermediaire|standard)\b'), 'moyen_gamme'),
+    (re.compile(r'\b(?:premium|haut\s+de\s+gamme|luxe|prestige|chic)\b'), 'premium'),
+]
+
+logger = logging.getLogger(__name__)
+
+
+def _text(value: Any) -> str:
+    # Empty CSV cells come back as NaN
+    return '' if value is None or value != value else str(value).strip()
+
+
+def split_categories(value: Any) -> List[str]:
+    """Folded categories of a catalog entry; "Buffet > Buffet de soutenance" gives both."""
+    text = str(value or '').replace('\\,', ' ')
+    return sorted({fold_text(name) for name in re.split(r'[,>]', text) if fold_text(name)})
+
+
+def match_price_tier(value: Any) -> Optional[str]:
+    folded = fold_text(value)
+    for tier in PRICE_TIERS:
+        if folded == fold_text(tier):
+            return tier
+    for pattern, tier in PRICE_TIER_ALIASES:
+        if pattern.search(folded):
+            return tier
+    return None
+
+
+def _event_text(record: Dict[str, Any]) -> str:
+    return fold_text(f"{record['name']} {record['category']} {record['tags']}")
+
+
+def _rank_key(record: Dict[str, Any], event: Optional[str], tier: Optional[str]):
+    """Event type matches first, then the tier; available and priced products before the others."""
+    return (event is not None and event not in record['events'], tier is not None and record['price_tier'] != tier,
+            not record['available'], not record['price'], record['name'])
+
+
+def _base_name(name: str) -> str:
+    # "X - Avec" / "X - Sans" are variations of one product
+    return name.split(' - ')[0].strip().lower()
+
+
+class SuggestionTables:
+    """Top products per (category, event type, price tier), looked up in O(1)."""
+    
+    def __init__(self, products: Dict[str, Dict[str, Any]], tables: Dict[str, List[str]], version: str):
+        self.products = products
+        self.tables = tables
+        self.version = version
+        self.categories = sorted({category for record in products.values() for category in record['categories']})
+        self.events = sorted({event for _, event, _ in EVENT_TYPES})
+    
+    @staticmethod
+    def key(category: Optional[str], event: Optional[str], tier: Optional[str]) -> str:
+        return '|'.join(value or ANY for value in (category, event, tier))
+    
+    @staticmethod
+    def fingerprint(products_path: str) -> str:
+        digest = hashlib.sha256(f"suggestions-v{TABLE_VERSION}".encode('utf-8'))
+        with open(products_path, 'rb') as f:
+            digest.update(f.read())
+        return digest.hexdigest()[:16]
+    
+    @classmethod
+    def build(cls, products_df, version: str, top_k: int = TOP_K) -> 'SuggestionTables':
+        """Rank the catalog for every known combination of preferences."""
+        products = {}
+        for _, row in products_df.iterrows():
+            name = _text(row.get('Name'))
+            if not name:
+                continue
+            record = {
+                'id': int(row.get('ID', 0)),
+                'name': name,
+                'category': _text(row.get('Categories')),
+                'price': float(_text(row.get('Regular price_numeric')) or 0.0),
+                'available': bool(row.get('is_available', False)),
+                'tags': _text(row.get('Tags')),
+                'price_tier': _text(row.get('price_tier'))
+            }
+            record['categories'] = split_categories(record['category'])
+            text = _event_text(record)
+            record['events'] = sorted({event for pattern, event, _ in EVENT_TYPES if pattern.search(text)})
+            products[f"product_{record['id']}"] = record
+        
+        tables = cls(products, {}, version)
+        for category, event, tier in combinations([None] + tables.categories, [None] + tables.events, [None] + list(PRICE_TIERS)):
+            # The category filters; event type and tier only rank, so a rare combination still gets the closest products
+            candidates = sorted(
+                (item for item in products.items() if category is None or category in item[1]['categories']),
+                key=lambda item: _rank_key(item[1], event, tier)
+            )
+            picked, names = [], set()
+            for product_id, record in candidates:
+                if _base_name(record['name']) not in names:
+                    picked.append(product_id)
+                    names.add(_base_name(record['name']))
+                if len(picked) == top_k:
+                    break
+            tables.tables[cls.key(category, event, tier)] = picked
+        return tables
+    
+    @classmethod
+    def load(cls, data_dir: str = 'data', table_dir: str = DEFAULT_TABLE_DIR) -> 'SuggestionTables':
+        """Open the tables of the current catalog, building them first if missing."""
+        products_path = os.path.join(data_dir, PRODUCTS_FILE)
+        version = cls.fingerprint(products_path)
+        table_path = os.path.join(table_dir, f"{version}.json")
+        if os.path.exists(table_path):
+            with open(table_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(data['products'], data['tables'], data['version'])
+        
+        from utils.data_loader import DataLoader
+        tables = cls.build(DataLoader(data_dir).load_products(), version)
+        logger.info("Built %d suggestion tables into %s", len(tables.tables), table_path)
+        os.makedirs(table_dir, exist_ok=True)
+        # Write then rename so concurrent workers never read a partial file
+        temporary_path = f"{table_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'products': tables.products, 'tables': tables.tables}, f, ensure_ascii=False)
+        os.replace(temporary_path, table_path)
+        for name in os.listdir(table_dir):
+            if name.endswith('.json') and name != os.path.basename(table_path):
+                os.remove(os.path.join(table_dir, name))
+        return tables
+    
+    def resolve(self, preferences: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[str], bool]:
+        """(category, event, tier) keys of the preferences, and whether all of them are known."""
+        known = True
+        category = event = tier = None
+        if preferences.get('category'):
+            folded = fold_text(preferences['category'])
+            matches = [name for name in self.categories if name == folded] or \
+                      [name for name in self.categories if folded and folded in name]
+            category = matches[0] if len(matches) == 1 else None
+            known &= category is not None
+        if preferences.get('event_type'):
+            event = extract_event_type(str(preferences['event_type']))
+            known &= event is not None
+        if preferences.get('price_range'):
+            tier = match_price_tier(preferences['price_range'])
+            known &= tier is not None
+        return category, event, tier, known
+    
+    def lookup(self, category: Optional[str], event: Optional[str], tier: Optional[str]) -> List[Dict[str, Any]]:
+        return [self.as_result(product_id) for product_id in self.tables.get(self.key(category, event, tier), [])]
+    
+    def as_result(self, product_id: str) -> Dict[str, Any]:
+        """Same shape as a vector search result, which the client renders."""
+        record = self.products[product_id]
+        metadata = {key: record[key] for key in ('id', 'name', 'category', 'price', 'available', 'price_tier')}
+        return {'id': product_id, 'metadata': {'type': 'product', **metadata}}
+
+
+class SuggestionService:
+    """Table lookups, vector search for unseen preferences, per-session cache."""
+    
+    def __init__(self, tables: SuggestionTables, vector_db_factory: Optional[Callable[[], Any]] = None,
+                 top_k: int = TOP_K, max_sessions: int = 1000):
+        self.tables = tables
+        self.top_k = top_k
+        self.max_sessions = max_sessions
+        self._vector_db_factory = vector_db_factory
+        self._vector_db = None
+        self._lock = threading.Lock()
+        self._sessions: 'OrderedDict[str, Dict[str, List[Dict[str, Any]]]]' = OrderedDict()
+        self._counters = {'table_hits': 0, 'vector_searches': 0, 'session_cache_hits': 0, 'fallbacks': 0}
+    
+    @classmethod
+    def from_config(cls, config_path: str = 'config.json', data_dir: str = 'data') -> 'SuggestionService':
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            config = {}
+        chroma_config = config.get('chroma_config', {})
+        index_root = chroma_config.get('index_root', 'indexes')
+        
+        def open_vector_db():
+            # Only opened for the first unseen combination of preferences
+            from utils.index_builder import open_index
+            return open_index(
+                index_root=index_root,
+                data_dir=data_dir,
+                backend=chroma_config.get('backend'),
+                model_name=chroma_config.get('embedding_model', 'all-MiniLM-L6-v2'),
+                retrieval_config=config.get('retrieval_config')
+            )
+        
+        return cls(SuggestionTables.load(data_dir, os.path.join(index_root, 'suggestions')), open_vector_db)
+    
+    @staticmethod
+    def _cache_key(preferences: Dict[str, Any]) -> str:
+        return '|'.join(fold_text(preferences.get(name) or '') for name in ('category', 'event_type', 'price_range'))
+    
+    def _vector_search(self, preferences: Dict[str, Any], tier: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            if self._vector_db is None and self._vector_db_factory is not None:
+                try:
+                    self._vector_db = self._vector_db_factory()
+                except Exception as e:
+                    logger.warning("Vector index unavailable for suggestions, using the tables only: %s", e)
+                    self._vector_db_factory = None
+        if self._vector_db is None:
+            return None
+        parts = [str(preferences[name]) for name in ('category', 'event_type') if preferences.get(name)]
+        if preferences.get('price_range'):
+            parts.append(f"prix {preferences['price_range']}")
+        self._counters['vector_searches'] += 1
+        return self._vector_db.search_products(" ".join(parts), n_results=self.top_k,
+                                               filters={'price_tier': tier} if tier else None)
+    
+    def suggest(self, preferences: Dict[str, Any], session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        preferences = preferences if isinstance(preferences, dict) else {}
+        cache_key = self._cache_key(preferences)
+        if session_id is not None:
+            with self._lock:
+                cached = self._sessions.get(session_id, {}).get(cache_key)
+                if cached is not None:
+                    self._sessions.move_to_end(session_id)
+                    self._counters['session_cache_hits'] += 1
+                    return cached
+        
+        category, event, tier, known = self.tables.resolve(preferences)
+        results = None
+        if known:
+            self._counters['table_hits'] += 1
+            results = self.tables.lookup(category, event, tier)
+        else:
+            try:
+                results = self._vector_search(preferences, tier)
+            except Exception as e:
+                logger.warning("Suggestion search failed: %s", e)
+            if results is None:
+                # Closest known combination: the preferences the tables understood
+                self._counters['fallbacks'] += 1
+                results = self.tables.lookup(category, event, tier)
+        
+        if session_id is not None:
+            with self._lock:
+                self._sessions.setdefault(session_id, {})[cache_key] = results
+                self._sessions.move_to_end(session_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+        return results
+    
+    def forget(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._counters, 'version': self.tables.version, 'tables': len(self.tables.tables),
+                'cached_sessions': len(self._sessions)}
@@ -1,84 +1,227 @@
-import chromadb
-from chromadb.config import Settings
-import pandas as pd
+import math
 import os
+import json
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 import numpy as np
+from utils import embeddings
+from utils.embedding_cache import EmbeddingCache
+from utils.lexical_index import BM25Index, reciprocal_rank_fusion
+from utils.search_filters import build_where_clause
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 class VectorDatabase:
     """Manages ChromaDB vector database for semantic search."""
     
-    def __init__(self, persist_directory: str = "./chroma_db", collection_name: str = "hs_catering_collection"):
+    # Maximum number of documents sent to the collection per upsert call
+    SYNC_BATCH_SIZE = 256
+    
+    # Candidates fetched per requested result in multi-type searches
+    MULTI_TYPE_OVERFETCH = 4
+    
+    BACKENDS = ('chroma', 'numpy')
+    
+    # Hybrid lexical + vector retrieval settings, overridable from config.json
+    DEFAULT_RETRIEVAL_CONFIG = {
+        'hybrid': True,
+        'rrf_k': 60,
+        'vector_weight': 1.0,
+        'lexical_weight': 1.0,
+        'lexical_candidates': 20,
+        'exact_match_shortcircuit': True
+    }
+    
+    def __init__(self, persist_directory: str = "./chroma_db", collection_name: str = "hs_catering_collection",
+                 query_cache_size: int = 1024, backend: str = "chroma", quantization: str = "int8",
+                 retrieval_config: Optional[Dict[str, Any]] = None,
+                 embedding_model_name: str = embeddings.DEFAULT_MODEL_NAME, read_only: bool = False):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown vector backend '{backend}', expected one of {self.BACKENDS}")
+        
         self.persist_directory = persist_directory
         self.collection_name = collection_name
+        self.backend = backend
+        self.quantization = quantization
+        # Serving processes open a prebuilt index (see utils.index_builder) and never write to it
+        self.read_only = read_only
         self.logger = logging.getLogger(__name__)
+        self.client = None
+        
+        # LRU cache in front of the query encoder
+        self.query_cache = EmbeddingCache(max_entries=query_cache_size)
+        
+        # BM25 index over the collection documents, built lazily
+        self.retrieval_config = {**self.DEFAULT_RETRIEVAL_CONFIG, **(retrieval_config or {})}
+        self._lexical_index = None
+        self._lexical_lock = threading.Lock()
+        
+        # Sentence transformer shared with the other components of the process
+        self.embedding_model_name = embedding_model_name
+        self._embedding_model = None
+        self._embedding_model_failed = False
+        
+        self.collection = self._open_collection()
+        
+        self.logger.info(f"Vector database initialized with {backend} backend, collection: {collection_name}")
+    
+    @property
+    def embedding_model(self):
+        """Shared sentence transformer, loaded on first use (None if unavailable)."""
+        if self._embedding_model is None and not self._embedding_model_failed:
+            try:
+                self._embedding_model = embeddings.get_embedding_model(self.embedding_model_name)
+            except Exception as e:
+                self.logger.warning(f"Could not load sentence transformer: {e}")
+                self._embedding_model_failed = True
+        return self._embedding_model
+    
+    def _open_collection(self):
+        """Open (or create) the collection for the configured backend."""
+        if self.backend == 'numpy':
+            from utils.numpy_index import NumpyCollection
+            return NumpyCollection(
+                directory=os.path.join(self.persist_directory, 'numpy_index'),
+                name=self.collection_name,
+                embedding_function=self._encode_documents,
+                quantization=self.quantization
+            )
+        
+        import chromadb
         
         # Initialize ChromaDB client with simple embedding function
-        self.client = chromadb.PersistentClient(path=persist_directory)
+        if self.client is None:
+            self.client = chromadb.PersistentClient(path=self.persist_directory)
         
-        # Initialize sentence transformer for embeddings
-        try:
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        except Exception as e:
-            self.logger.warning(f"Could not load sentence transformer: {e}")
-            self.embedding_model = None
+        if self.read_only:
+            # Fail fast if the prebuilt collection is missing
+            return self.client.get_collection(
+                name=self.collection_name,
+                embedding_function=self._get_embedding_function()
+            )
         
         # Get or create collection with custom embedding function
         try:
-            self.collection = self.client.get_or_create_collection(
-                name=collection_name,
+            return self.client.get_or_create_collection(
+                name=self.collection_name,
                 embedding_function=self._get_embedding_function(),
                 metadata={"hnsw:space": "cosine"}
             )
         except Exception as e:
             self.logger.error(f"Error creating collection: {e}")
             # Fallback to basic collection
-            self.collection = self.client.get_or_create_collection(
-                name=collection_name
+            return self.client.get_or_create_collection(
+                name=self.collection_name
+            )
+    
+    def _check_writable(self):
+        """Refuse to modify an index opened read-only."""
+        if self.read_only:
+            raise RuntimeError(
+                f"Vector index at {self.persist_directory} is read-only, "
+                f"rebuild it with: python -m utils.index_builder"
             )
-        
-        self.logger.info(f"ChromaDB initialized with collection: {collection_name}")
+    
+    def _encode_documents(self, documents: List[str]) -> np.ndarray:
+        """Encode documents with the shared sentence transformer."""
+        return embeddings.encode(documents, self.embedding_model_name)
     
     def _get_embedding_function(self):
-        """Get a simple embedding function."""
+        """Get an embedding function backed by the shared model."""
+        return embeddings.SharedEmbeddingFunction(self.embedding_model_name)
+    
+    @staticmethod
+    def _to_float(value: Any) -> float:
+        """Parse a price cell, treating missing or textual values (e.g. 'sur_devis') as 0."""
         try:
-            import chromadb.utils.embedding_functions as ef
-            return ef.SentenceTransformerEmbeddingFunction(model_name='all-MiniLM-L6-v2')
-        except Exception as e:
-            self.logger.warning(f"Could not create embedding function: {e}")
-            return None
+            value = float(value)
+        except (TypeError, ValueError):
+            return 0.0
+        return 0.0 if math.isnan(value) else value
+    
+    @staticmethod
+    def _content_hash(document: str, metadata: Dict[str, Any]) -> str:
+        """Compute a stable hash of a document and its metadata."""
+        payload = json.dumps(
+            {'document': document, 'metadata': {k: v for k, v in metadata.items() if k != 'content_hash'}},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _build_product_records(self, products_df: 'pd.DataFrame') -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+        """Build ids, documents and metadatas for products."""
+        documents = []
+        metadatas = []
+        ids = []
+        
+        for _, row in products_df.iterrows():
+            # Use the pre-computed rag_description
+            document = row.get('rag_description', '')
+            if not document:
+                # Fallback to manual construction if rag_description is missing
+                document = f"Produit: {row.get('Name', '')} | Type: {row.get('Type', '')} | Catégories: {row.get('Categories', '')} | Prix: {row.get('Regular price', '')} | Description: {row.get('Description', '')}"
+            
+            documents.append(document)
+            
+            # Metadata
+            metadata = {
+                'type': 'product',
+                'id': int(row.get('ID', 0)),
+                'name': str(row.get('Name', '')),
+                'category': str(row.get('Categories', '')),
+                'price': float(row.get('Regular price_numeric', 0.0)),
+                'available': bool(row.get('is_available', False)),
+                'tags': str(row.get('Tags', '')),
+                'price_tier': str(row.get('price_tier', ''))
+            }
+            metadata['content_hash'] = self._content_hash(document, metadata)
+            metadatas.append(metadata)
+            ids.append(f"product_{row.get('ID', 0)}")
+        
+        return ids, documents, metadatas
+    
+    def _build_service_records(self, services_df: 'pd.DataFrame') -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+        """Build ids, documents and metadatas for services."""
+        documents = []
+        metadatas = []
+        ids = []
+        
+        for _, row in services_df.iterrows():
+            # Create document from service data
+            document = f"Service: {row.get('nom_service', '')} | Type: {row.get('type_service', '')} | Résumé: {row.get('résumé_service', '')} | Prix: {row.get('prix_minimum', '')} - {row.get('prix_maximum', '')} MAD | Spécialité: {row.get('spécialité', '')} | Mots-clés: {row.get('mots_clés', '')}"
+            
+            documents.append(document)
+            
+            # Metadata
+            metadata = {
+                'type': 'service',
+                'name': str(row.get('nom_service', '')),
+                'service_type': str(row.get('type_service', '')),
+                'summary': str(row.get('résumé_service', '')),
+                'min_price': self._to_float(row.get('prix_minimum')),
+                'max_price': self._to_float(row.get('prix_maximum')),
+                'availability': str(row.get('statut_disponibilité', '')),
+                'specialty': str(row.get('spécialité', '')),
+                'keywords': str(row.get('mots_clés', '')),
+                'target_audience': str(row.get('public_cible', ''))
+            }
+            metadata['content_hash'] = self._content_hash(document, metadata)
+            metadatas.append(metadata)
+            ids.append(f"service_{row.get('nom_service', '').replace(' ', '_').lower()}")
+        
+        return ids, documents, metadatas
     
-    def add_products_to_collection(self, products_df: pd.DataFrame):
+    def add_products_to_collection(self, products_df: 'pd.DataFrame'):
         """Add products to ChromaDB collection."""
         try:
-            documents = []
-            metadatas = []
-            ids = []
-            
-            for _, row in products_df.iterrows():
-                # Use the pre-computed rag_description
-                document = row.get('rag_description', '')
-                if not document:
-                    # Fallback to manual construction if rag_description is missing
-                    document = f"Produit: {row.get('Name', '')} | Type: {row.get('Type', '')} | Catégories: {row.get('Categories', '')} | Prix: {row.get('Regular price', '')} | Description: {row.get('Description', '')}"
-                
-                documents.append(document)
-                
-                # Metadata
-                metadata = {
-                    'type': 'product',
-                    'id': int(row.get('ID', 0)),
-                    'name': str(row.get('Name', '')),
-                    'category': str(row.get('Categories', '')),
-                    'price': float(row.get('Regular price_numeric', 0.0)),
-                    'available': bool(row.get('is_available', False)),
-                    'tags': str(row.get('Tags', '')),
-                    'price_tier': str(row.get('price_tier', ''))
-                }
-                metadatas.append(metadata)
-                ids.append(f"product_{row.get('ID', 0)}")
+            self._check_writable()
+            ids, documents, metadatas = self._build_product_records(products_df)
             
             # Add to collection
             self.collection.add(
@@ -87,39 +230,17 @@ class VectorDatabase:
                 ids=ids
             )
             
+            self._lexical_index = None
             self.logger.info(f"Added {len(documents)} products to ChromaDB")
-            
+        
         except Exception as e:
             self.logger.error(f"Error adding products to ChromaDB: {str(e)}")
     
-    def add_services_to_collection(self, services_df: pd.DataFrame):
+    def add_services_to_collection(self, services_df: 'pd.DataFrame'):
         """Add services to ChromaDB collection."""
         try:
-            documents = []
-            metadatas = []
-            ids = []
-            
-            for _, row in services_df.iterrows():
-                # Create document from service data
-                document = f"Service: {row.get('nom_service', '')} | Type: {row.get('type_service', '')} | Résumé: {row.get('résumé_service', '')} | Prix: {row.get('prix_minimum', '')} - {row.get('prix_maximum', '')} MAD | Spécialité: {row.get('spécialité', '')} | Mots-clés: {row.get('mots_clés', '')}"
-                
-                documents.append(document)
-                
-                # Metadata
-                metadata = {
-                    'type': 'service',
-                    'name': str(row.get('nom_service', '')),
-                    'service_type': str(row.get('type_service', '')),
-                    'summary': str(row.get('résumé_service', '')),
-                    'min_price': float(row.get('prix_minimum', 0.0)) if pd.notna(row.get('prix_minimum')) else 0.0,
-                    'max_price': float(row.get('prix_maximum', 0.0)) if pd.notna(row.get('prix_maximum')) else 0.0,
-                    'availability': str(row.get('statut_disponibilité', '')),
-                    'specialty': str(row.get('spécialité', '')),
-                    'keywords': str(row.get('mots_clés', '')),
-                    'target_audience': str(row.get('public_cible', ''))
-                }
-                metadatas.append(metadata)
-                ids.append(f"service_{row.get('nom_service', '').replace(' ', '_').lower()}")
+            self._check_writable()
+            ids, documents, metadatas = self._build_service_records(services_df)
             
             # Add to collection
             self.collection.add(
@@ -128,51 +249,362 @@ class VectorDatabase:
                 ids=ids
             )
             
+            self._lexical_index = None
             self.logger.info(f"Added {len(documents)} services to ChromaDB")
-            
+        
         except Exception as e:
             self.logger.error(f"Error adding services to ChromaDB: {str(e)}")
     
-    def search_similar(self, query: str, n_results: int = 5, filter_type: str = None) -> List[Dict[str, Any]]:
-        """Search for similar items in the collection."""
+    def embed_query(self, query: str) -> Optional[List[float]]:
+        """Embed a query through the LRU cache, or None if no encoder is loaded."""
+        if self.embedding_model is None:
+            return None
         try:
-            # Prepare where clause for filtering
-            where_clause = {}
-            if filter_type:
-                where_clause['type'] = filter_type
-            
-            # Query the collection
-            results = self.collection.query(
-                query_texts=[query],
+            return self.query_cache.get_or_compute(
+                query,
+                lambda text: self.embedding_model.encode([text], convert_to_numpy=True)[0].tolist()
+            )
+        except Exception as e:
+            self.logger.warning(f"Could not embed query, falling back to collection encoder: {e}")
+            return None
+    
+    def embed_queries(self, queries: List[str], batch_size: int = 64) -> List[Optional[List[float]]]:
+        """Embed many queries, encoding only cache misses and in batches."""
+        embeddings_out = [self.query_cache.get(query) for query in queries]
+        if self.embedding_model is None:
+            return embeddings_out
+        
+        # Deduplicate misses by normalized text before encoding
+        pending = {}
+        for i, embedding in enumerate(embeddings_out):
+            if embedding is None:
+                pending.setdefault(self.query_cache.normalize(queries[i]), []).append(i)
+        if not pending:
+            return embeddings_out
+        
+        try:
+            texts = list(pending)
+            encoded = self.embedding_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+            for text, vector in zip(texts, encoded):
+                embedding = vector.tolist()
+                self.query_cache.put(text, embedding)
+                for i in pending[text]:
+                    embeddings_out[i] = embedding
+        except Exception as e:
+            self.logger.warning(f"Could not embed query batch, falling back to collection encoder: {e}")
+        
+        return embeddings_out
+    
+    def _query(self, query: str, query_embedding: Optional[List[float]], n_results: int,
+               where_clause: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run a collection query from an embedding, or from the text as a fallback."""
+        if query_embedding is not None:
+            return self.collection.query(
+                query_embeddings=[query_embedding],
                 n_results=n_results,
                 where=where_clause if where_clause else None
             )
+        return self.collection.query(
+            query_texts=[query],
+            n_results=n_results,
+            where=where_clause if where_clause else None
+        )
+    
+    @staticmethod
+    def _format_results(results: Dict[str, Any], index: int = 0) -> List[Dict[str, Any]]:
+        """Format a Chroma query result for one query into a list of dicts."""
+        formatted_results = []
+        if results['documents'] and results['documents'][index]:
+            for i, doc in enumerate(results['documents'][index]):
+                result = {
+                    'document': doc,
+                    'metadata': results['metadatas'][index][i] if results['metadatas'] and results['metadatas'][index] else {},
+                    'distance': results['distances'][index][i] if results['distances'] and results['distances'][index] else 0.0,
+                    'id': results['ids'][index][i] if results['ids'] and results['ids'][index] else ''
+                }
+                formatted_results.append(result)
+        
+        return formatted_results
+    
+    def search_similar(self, query: str, n_results: int = 5, filter_type: str = None,
+                       query_embedding: Optional[List[float]] = None,
+                       filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Search for similar items in the collection.
+        
+        Pass a precomputed ``query_embedding`` to reuse one encode across
+        several searches for the same turn. ``filters`` (price range,
+        availability, price tier, see utils.search_filters) are applied
+        inside the search, before top-k selection.
+        """
+        try:
+            # Prepare where clause for filtering
+            where_clause = build_where_clause(filter_type, filters)
             
-            # Format results
-            formatted_results = []
-            if results['documents'] and results['documents'][0]:
-                for i, doc in enumerate(results['documents'][0]):
-                    result = {
-                        'document': doc,
-                        'metadata': results['metadatas'][0][i] if results['metadatas'] and results['metadatas'][0] else {},
-                        'distance': results['distances'][0][i] if results['distances'] and results['distances'][0] else 0.0,
-                        'id': results['ids'][0][i] if results['ids'] and results['ids'][0] else ''
-                    }
-                    formatted_results.append(result)
+            if self.retrieval_config.get('hybrid'):
+                return self._hybrid_search(query, n_results, where_clause, query_embedding)
             
-            return formatted_results
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
             
+            # Query the collection
+            results = self._query(query, query_embedding, n_results, where_clause)
+            
+            return self._format_results(results)
+        
         except Exception as e:
             self.logger.error(f"Error searching in ChromaDB: {str(e)}")
             return []
     
-    def search_products(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    def search_similar_many(self, queries: List[str], n_results: int = 5, filter_type: str = None,
+                            batch_size: int = 64,
+                            filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """Search for many queries at once; results are returned in input order.
+        
+        Queries are embedded in batches (reusing the query cache) and sent to
+        the collection ``batch_size`` at a time.
+        """
+        results = [[] for _ in queries]
+        if not queries:
+            return results
+        
+        try:
+            where_clause = build_where_clause(filter_type, filters)
+            hybrid = self.retrieval_config.get('hybrid')
+            
+            # Queries naming a product are answered lexically and never embedded
+            remaining = []
+            for i, query in enumerate(queries):
+                shortcut = self._lexical_shortcut(query, where_clause, n_results) if hybrid else None
+                if shortcut is not None:
+                    results[i] = shortcut
+                else:
+                    remaining.append(i)
+            
+            query_embeddings = self.embed_queries([queries[i] for i in remaining], batch_size=batch_size)
+            n_candidates = max(n_results, int(self.retrieval_config.get('lexical_candidates', 20))) if hybrid else n_results
+            
+            for start in range(0, len(remaining), batch_size):
+                chunk = remaining[start:start + batch_size]
+                chunk_embeddings = query_embeddings[start:start + batch_size]
+                
+                if all(embedding is not None for embedding in chunk_embeddings):
+                    batch = self.collection.query(
+                        query_embeddings=chunk_embeddings,
+                        n_results=n_candidates,
+                        where=where_clause
+                    )
+                else:
+                    batch = self.collection.query(
+                        query_texts=[queries[i] for i in chunk],
+                        n_results=n_candidates,
+                        where=where_clause
+                    )
+                
+                for offset, i in enumerate(chunk):
+                    vector_results = self._format_results(batch, index=offset)
+                    if hybrid:
+                        results[i] = self._hybrid_search(
+                            queries[i], n_results, where_clause, chunk_embeddings[offset], vector_results=vector_results
+                        )
+                    else:
+                        results[i] = vector_results[:n_results]
+            
+        except Exception as e:
+            self.logger.error(f"Error in batch search: {str(e)}")
+        
+        return results
+    
+    def search_by_types(self, query: str, quotas: Dict[str, int],
+                        query_embedding: Optional[List[float]] = None,
+                        filters: Optional[Dict[str, Any]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Retrieve per-type top-k results with a single vector search.
+        
+        ``quotas`` maps a document type to its number of results, e.g.
+        ``{'product': 3, 'service': 2}``. Types that the shared search could
+        not fill are topped up with per-type searches run concurrently.
+        """
+        grouped = {doc_type: [] for doc_type in quotas}
+        wanted = {doc_type: k for doc_type, k in quotas.items() if k > 0}
+        if not wanted:
+            return grouped
+        
+        try:
+            where_clause = build_where_clause(list(wanted), filters)
+            type_where = {doc_type: build_where_clause(doc_type, filters) for doc_type in wanted}
+            hybrid = self.retrieval_config.get('hybrid')
+            
+            # A query naming a product fills each type it can lexically; only the rest is embedded
+            if hybrid and query_embedding is None and self._exact_name_results(query, where_clause, 1):
+                for doc_type, k in wanted.items():
+                    filled = self._lexical_fill(query, type_where[doc_type], k)
+                    if len(filled) >= k:
+                        grouped[doc_type] = filled
+                wanted = {doc_type: k for doc_type, k in wanted.items() if not grouped[doc_type]}
+                if not wanted:
+                    return grouped
+                where_clause = build_where_clause(list(wanted), filters)
+            
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+            
+            total = self.collection.count()
+            n_results = min(total, sum(wanted.values()) * self.MULTI_TYPE_OVERFETCH)
+            if n_results == 0:
+                return grouped
+            
+            results = self._query(query, query_embedding, n_results, where_clause)
+            
+            candidates = {doc_type: [] for doc_type in wanted}
+            for result in self._format_results(results):
+                doc_type = result['metadata'].get('type')
+                if doc_type in candidates:
+                    candidates[doc_type].append(result)
+            
+            for doc_type, k in wanted.items():
+                if hybrid:
+                    grouped[doc_type] = self._hybrid_search(
+                        query, k, type_where[doc_type], query_embedding, vector_results=candidates[doc_type]
+                    )
+                else:
+                    grouped[doc_type] = candidates[doc_type][:k]
+            
+            # Top up types crowded out of the shared result list
+            missing = [
+                doc_type for doc_type, k in wanted.items()
+                if len(candidates[doc_type]) < k and n_results < total
+            ]
+            if missing:
+                with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                    futures = {
+                        doc_type: executor.submit(
+                            self.search_similar, query, wanted[doc_type],
+                            filter_type=doc_type, query_embedding=query_embedding, filters=filters
+                        )
+                        for doc_type in missing
+                    }
+                    for doc_type, future in futures.items():
+                        grouped[doc_type] = future.result()
+        
+        except Exception as e:
+            self.logger.error(f"Error in multi-type search: {str(e)}")
+        
+        return grouped
+    
+    def _get_lexical_index(self) -> BM25Index:
+        """Build the BM25 index from the collection on first use."""
+        with self._lexical_lock:
+            if self._lexical_index is None:
+                records = self.collection.get(include=['documents', 'metadatas'])
+                self._lexical_index = BM25Index(records['ids'], records['documents'], records['metadatas'] or [])
+                self.logger.info(f"Built BM25 index over {len(self._lexical_index)} documents")
+            return self._lexical_index
+    
+    @staticmethod
+    def _lexical_result(lexical_index: BM25Index, position: int, distance: float) -> Dict[str, Any]:
+        """Format a lexical hit like a vector search result."""
+        return {
+            'document': lexical_index.documents[position],
+            'metadata': lexical_index.metadatas[position],
+            'distance': distance,
+            'id': lexical_index.ids[position]
+        }
+    
+    def _exact_name_results(self, query: str, where_clause: Optional[Dict[str, Any]],
+                            n_results: int) -> Optional[List[Dict[str, Any]]]:
+        """Products the query names exactly (at most ``n_results``), else None."""
+        if not self.retrieval_config.get('exact_match_shortcircuit'):
+            return None
+        
+        lexical_index = self._get_lexical_index()
+        exact = lexical_index.exact_name_matches(query, where_clause)
+        if not exact:
+            return None
+        return [self._lexical_result(lexical_index, position, 0.0) for position in exact[:n_results]]
+    
+    def _lexical_fill(self, query: str, where_clause: Optional[Dict[str, Any]],
+                      n_results: int) -> List[Dict[str, Any]]:
+        """Exact name matches first, then the best BM25 matches (at most ``n_results``)."""
+        lexical_index = self._get_lexical_index()
+        results = self._exact_name_results(query, where_clause, n_results) or []
+        seen = {result['id'] for result in results}
+        for position, _ in lexical_index.search(query, n_results + len(results), where_clause):
+            if len(results) >= n_results:
+                break
+            if lexical_index.ids[position] not in seen:
+                results.append(self._lexical_result(lexical_index, position, 1.0))
+        return results
+    
+    def _lexical_shortcut(self, query: str, where_clause: Optional[Dict[str, Any]],
+                          n_results: int) -> Optional[List[Dict[str, Any]]]:
+        """Results for a query naming a product, when the lexical index fills ``n_results``; else None."""
+        if not self._exact_name_results(query, where_clause, 1):
+            return None
+        results = self._lexical_fill(query, where_clause, n_results)
+        return results if len(results) >= n_results else None
+    
+    def _hybrid_search(self, query: str, n_results: int, where_clause: Optional[Dict[str, Any]],
+                       query_embedding: Optional[List[float]] = None,
+                       vector_results: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Fuse BM25 and vector rankings with reciprocal rank fusion.
+        
+        Products the query names exactly come first. Such a query is answered
+        from the lexical index alone when BM25 fills the remaining places;
+        otherwise the fused ranking fills them.
+        """
+        config = self.retrieval_config
+        
+        if vector_results is None and query_embedding is None:
+            shortcut = self._lexical_shortcut(query, where_clause, n_results)
+            if shortcut is not None:
+                return shortcut
+        
+        exact = self._exact_name_results(query, where_clause, n_results) or []
+        if len(exact) >= n_results:
+            return exact
+        
+        lexical_index = self._get_lexical_index()
+        candidates = max(n_results, int(config.get('lexical_candidates', 20)))
+        
+        if vector_results is None:
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+            vector_results = self._format_results(self._query(query, query_embedding, candidates, where_clause))
+        
+        lexical_hits = lexical_index.search(query, candidates, where_clause)
+        fused = reciprocal_rank_fusion([
+            ([result['id'] for result in vector_results], float(config.get('vector_weight', 1.0))),
+            ([lexical_index.ids[position] for position, _ in lexical_hits], float(config.get('lexical_weight', 1.0)))
+        ], k=int(config.get('rrf_k', 60)))
+        
+        by_id = {result['id']: result for result in vector_results}
+        lexical_positions = {lexical_index.ids[position]: position for position, _ in lexical_hits}
+        
+        results = list(exact)
+        seen = {result['id'] for result in exact}
+        for doc_id, score in fused:
+            if len(results) >= n_results:
+                break
+            if doc_id in seen:
+                continue
+            if doc_id in by_id:
+                result = dict(by_id[doc_id])
+            else:
+                result = self._lexical_result(lexical_index, lexical_positions[doc_id], 1.0)
+            result['score'] = score
+            results.append(result)
+        return results
+    
+    def search_products(self, query: str, n_results: int = 5,
+                        query_embedding: Optional[List[float]] = None,
+                        filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """Search for products only."""
-        return self.search_similar(query, n_results, filter_type='product')
+        return self.search_similar(query, n_results, filter_type='product', query_embedding=query_embedding, filters=filters)
     
-    def search_services(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    def search_services(self, query: str, n_results: int = 5,
+                        query_embedding: Optional[List[float]] = None,
+                        filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """Search for services only."""
-        return self.search_similar(query, n_results, filter_type='service')
+        return self.search_similar(query, n_results, filter_type='service', query_embedding=query_embedding, filters=filters)
     
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get collection statistics."""
@@ -181,41 +613,106 @@ class VectorDatabase:
             return {
                 'total_items': count,
                 'collection_name': self.collection_name,
-                'persist_directory': self.persist_directory
+                'persist_directory': self.persist_directory,
+                'query_cache': self.query_cache.get_stats()
             }
         except Exception as e:
             self.logger.error(f"Error getting collection stats: {str(e)}")
             return {'total_items': 0}
     
-    def initialize_database(self, products_df: pd.DataFrame, services_df: pd.DataFrame, force_rebuild: bool = False):
+    def sync_collection(self, products_df: 'pd.DataFrame', services_df: 'pd.DataFrame') -> Dict[str, int]:
+        """Incrementally sync the collection with the current catalog snapshot.
+        
+        Only documents whose content hash changed (or that are new) are
+        re-embedded; documents no longer in the catalog are deleted.
+        """
+        self._check_writable()
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        
+        # Build the catalog snapshot, keeping the last record for duplicate ids
+        snapshot = {}
+        for builder, df in ((self._build_product_records, products_df), (self._build_service_records, services_df)):
+            ids, documents, metadatas = builder(df)
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                if doc_id in snapshot:
+                    self.logger.warning(f"Duplicate document id in catalog: {doc_id}")
+                snapshot[doc_id] = (document, metadata)
+        
+        # Current hashes stored in the collection
+        existing = self.collection.get(include=['metadatas'])
+        stored_hashes = {
+            doc_id: (metadata or {}).get('content_hash')
+            for doc_id, metadata in zip(existing['ids'], existing['metadatas'] or [])
+        }
+        
+        upsert_ids, upsert_documents, upsert_metadatas = [], [], []
+        for doc_id, (document, metadata) in snapshot.items():
+            stored_hash = stored_hashes.get(doc_id)
+            if stored_hash == metadata['content_hash']:
+                stats['unchanged'] += 1
+                continue
+            stats['updated' if doc_id in stored_hashes else 'added'] += 1
+            upsert_ids.append(doc_id)
+            upsert_documents.append(document)
+            upsert_metadatas.append(metadata)
+        
+        # The NumPy backend rewrites its matrix on every upsert, so send one batch
+        batch_size = self.SYNC_BATCH_SIZE if self.backend == 'chroma' else max(len(upsert_ids), 1)
+        for start in range(0, len(upsert_ids), batch_size):
+            end = start + batch_size
+            self.collection.upsert(
+                ids=upsert_ids[start:end],
+                documents=upsert_documents[start:end],
+                metadatas=upsert_metadatas[start:end]
+            )
+        
+        # Never wipe the index because a catalog file failed to load
+        if snapshot:
+            removed_ids = [doc_id for doc_id in stored_hashes if doc_id not in snapshot]
+            if removed_ids:
+                self.collection.delete(ids=removed_ids)
+            stats['removed'] = len(removed_ids)
+        elif stored_hashes:
+            self.logger.warning("Catalog snapshot is empty, skipping deletion of stale documents")
+        
+        self._lexical_index = None
+        self.logger.info(
+            f"Synced collection: {stats['added']} added, {stats['updated']} updated, "
+            f"{stats['removed']} removed, {stats['unchanged']} unchanged"
+        )
+        return stats
+    
+    def initialize_database(self, products_df: 'pd.DataFrame', services_df: 'pd.DataFrame', force_rebuild: bool = False):
         """Initialize the database with products and services data."""
         try:
             current_count = self.collection.count()
             
-            if current_count == 0 or force_rebuild:
-                if force_rebuild and current_count > 0:
-                    # Clear existing data
-                    self.client.delete_collection(self.collection_name)
-                    self.collection = self.client.create_collection(
-                        name=self.collection_name,
-                        metadata={"hnsw:space": "cosine"}
-                    )
-                
-                # Add products and services
-                self.add_products_to_collection(products_df)
-                self.add_services_to_collection(services_df)
-                
-                self.logger.info("Database initialized successfully")
-            else:
-                self.logger.info(f"Database already initialized with {current_count} items")
-                
+            if force_rebuild and current_count > 0:
+                # Clear existing data
+                self._drop_collection()
+                self.collection = self._open_collection()
+            
+            # Re-embed only added or changed documents
+            self.sync_collection(products_df, services_df)
+            
+            self.logger.info("Database initialized successfully")
+        
         except Exception as e:
             self.logger.error(f"Error initializing database: {str(e)}")
     
+    def _drop_collection(self):
+        """Drop the collection and its stored embeddings."""
+        self._check_writable()
+        self._lexical_index = None
+        if self.backend == 'numpy':
+            self.collection.reset()
+        else:
+            self.client.delete_collection(self.collection_name)
+    
     def delete_collection(self):
         """Delete the collection."""
         try:
-            self.client.delete_collection(self.collection_name)
+            self._drop_collection()
             self.logger.info(f"Deleted collection: {self.collection_name}")
         except Exception as e:
             self.logger.error(f"Error deleting collection: {str(e)}")